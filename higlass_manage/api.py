@@ -0,0 +1,357 @@
+import docker
+import requests
+import sys
+
+from requests.adapters import HTTPAdapter
+
+from higlass_manage.common import forget_instance_info
+from higlass_manage.common import get_docker_client
+from higlass_manage.common import get_instance_info
+from higlass_manage.common import iter_tilesets
+from higlass_manage.common import StartError
+
+# the number of connections each instance's session keeps open
+HTTP_POOL_SIZE = 16
+
+
+class Instance:
+    """
+    A higlass instance, identified by its name.
+
+    Requests to the instance's server share a pooled ``requests.Session``
+    so that connections are reused across calls. Instances are obtained
+    from a ``Manager``, which holds the docker client they use.
+
+    Parameters:
+    ----------
+    manager: Manager
+        The manager this instance belongs to
+    hg_name: str
+        The name of the instance
+    """
+
+    def __init__(self, manager, hg_name="default"):
+        self.manager = manager
+        self.hg_name = hg_name
+        self.session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __repr__(self):
+        return "Instance({!r})".format(self.hg_name)
+
+    @property
+    def info(self):
+        """
+        The configuration of the instance's container (see
+        ``common.InstanceInfo``)
+        """
+        return get_instance_info(self.hg_name)
+
+    @property
+    def running(self):
+        # always inspect the container again, another process may have
+        # stopped or restarted it
+        try:
+            return get_instance_info(self.hg_name, max_age=0).running
+        except docker.errors.NotFound:
+            return False
+
+    @property
+    def port(self):
+        return self.info.port
+
+    @property
+    def api_url(self):
+        return "http://localhost:{}/api/v1".format(self.port)
+
+    def refresh(self):
+        """
+        Forget the container configuration read so far, e.g. after the
+        instance was restarted by another process.
+        """
+        forget_instance_info(self.hg_name)
+
+    def start(self, **kwargs):
+        """
+        Start (or restart) this instance. Takes the same options as
+        ``Manager.start``.
+        """
+        return self.manager.start(self.hg_name, **kwargs)
+
+    def stop(self, **kwargs):
+        """
+        Stop this instance. Takes the same options as ``Manager.stop``.
+        """
+        self.manager.stop(self.hg_name, **kwargs)
+
+    def ensure_running(self):
+        """
+        Start this instance using the images it last ran with if it
+        isn't running.
+        """
+        if not self.running:
+            print("HiGlass not running. Starting...")
+            self.start(pull="if-missing")
+
+        return self
+
+    def tilesets(self, **kwargs):
+        """
+        Iterate over the tilesets of this instance. Takes the same
+        filters as ``common.iter_tilesets``.
+        """
+        return iter_tilesets(self.port, session=self.session, **kwargs)
+
+    def ingest(
+        self,
+        filenames,
+        filetype=None,
+        datatype=None,
+        assembly=None,
+        name=None,
+        chromsizes_filename=None,
+        has_header=False,
+        uid=None,
+        no_upload=None,
+        project_name=None,
+        manifest=None,
+        jobs=1,
+        aggregation_cache=True,
+        zoomify=True,
+        zoomify_nproc=1,
+        zoomify_chunksize=None,
+        warm_up=False,
+    ):
+        """
+        Ingest one or more datasets into this instance, starting it if
+        necessary.
+
+        Parameters:
+        ----------
+        filenames: str or [str]
+            Files, directories or glob patterns to ingest
+        manifest: str
+            A file listing more files to ingest, one per line
+        jobs: int
+            The number of processes to use for aggregating bed and
+            bedpe files
+        zoomify: bool
+            Build multi-resolution versions of single-resolution
+            coolers using ``zoomify_nproc`` processes
+        warm_up: bool
+            Warm up the tile cache of the ingested tilesets
+
+        Returns:
+        --------
+        results: [(str, str)]
+            (filename, uid) pairs for every file. The uid is None for
+            files that could not be ingested.
+        """
+        from higlass_manage.ingest import ZOOMIFY_CHUNKSIZE
+        from higlass_manage.ingest import _ingest
+        from higlass_manage.ingest import _ingest_many
+        from higlass_manage.ingest import expand_filenames
+        from higlass_manage.ingest import read_manifest
+        from higlass_manage.warmup import warm_up_and_report
+
+        if isinstance(filenames, str):
+            filenames = [filenames]
+
+        if zoomify_chunksize is None:
+            zoomify_chunksize = ZOOMIFY_CHUNKSIZE
+
+        if not no_upload:
+            filenames = expand_filenames(filenames, manifest)
+        elif manifest is not None:
+            filenames = list(filenames) + read_manifest(manifest)
+
+        if len(filenames) == 0:
+            raise ValueError("No files to ingest")
+
+        if len(filenames) > 1 and (name is not None or uid is not None):
+            raise ValueError(
+                "The --name and --uid options can only be used when ingesting a single file"
+            )
+
+        self.ensure_running()
+
+        if len(filenames) > 1:
+            results = _ingest_many(
+                filenames,
+                self.hg_name,
+                filetype,
+                datatype,
+                assembly,
+                chromsizes_filename,
+                has_header,
+                no_upload,
+                project_name,
+                jobs,
+                aggregation_cache,
+                zoomify,
+                zoomify_nproc,
+                zoomify_chunksize,
+            )
+        else:
+            results = [
+                (
+                    filenames[0],
+                    _ingest(
+                        filenames[0],
+                        self.hg_name,
+                        filetype,
+                        datatype,
+                        assembly,
+                        name,
+                        chromsizes_filename,
+                        has_header,
+                        uid,
+                        no_upload,
+                        project_name,
+                        aggregation_cache,
+                        zoomify,
+                        zoomify_nproc,
+                        zoomify_chunksize,
+                    ),
+                )
+            ]
+
+        uids = [uid for (_, uid) in results if uid is not None]
+        if warm_up and uids:
+            warm_up_and_report(self.port, uids)
+
+        return results
+
+    def view(self, filename, **kwargs):
+        """
+        Create a viewconf showing a file, ingesting it first unless the
+        instance already has a tileset with the same contents. Takes the
+        same options as ``view._view``.
+
+        Returns:
+        --------
+        uid: str
+            The uid of the viewconf or None if it couldn't be created
+        """
+        from higlass_manage.view import _view
+
+        self.ensure_running()
+        return _view(filename, self.hg_name, session=self.session, **kwargs)
+
+    def viewconf_url(self, uid):
+        """
+        The address at which a viewconf can be opened in a browser
+        """
+        return "http://localhost:{port}/app/?config={uid}".format(
+            port=self.port, uid=uid
+        )
+
+    def close(self):
+        self.session.close()
+
+
+class Manager:
+    """
+    Start, stop and use higlass instances from Python using a single
+    docker client.
+
+    Instances are cached so that each one's session is reused::
+
+        with Manager() as manager:
+            instance = manager.start("test-hg", port=8123)
+            [(_, uid)] = instance.ingest("data.mcool")
+            print(instance.viewconf_url(instance.view("data.mcool")))
+    """
+
+    def __init__(self):
+        self.client = get_docker_client()
+        self.instances = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def instance(self, hg_name="default"):
+        """
+        Get the instance with a given name. It doesn't need to be
+        running.
+        """
+        if hg_name not in self.instances:
+            self.instances[hg_name] = Instance(self, hg_name)
+
+        return self.instances[hg_name]
+
+    def start(self, hg_name="default", **kwargs):
+        """
+        Start (or restart) an instance. Takes the same options as
+        ``start._start``.
+
+        Raises StartError if the instance couldn't be started.
+
+        Returns:
+        --------
+        instance: Instance
+            The started instance
+        """
+        from higlass_manage.start import _start
+
+        instance = self.instance(hg_name)
+
+        try:
+            _start(hg_name=hg_name, session=instance.session, **kwargs)
+        except (
+            docker.errors.DockerException,
+            requests.exceptions.ConnectionError,
+        ) as err:
+            sys.stderr.write("Error: {}\n".format(err))
+            raise StartError("Failed to start {}".format(hg_name)) from err
+
+        if not instance.running:
+            raise StartError("Failed to start {}".format(hg_name))
+
+        return instance
+
+    def stop(self, *hg_names, **kwargs):
+        """
+        Stop instances along with their Redis containers and networks.
+        Takes the same options as ``stop._stop``.
+        """
+        from higlass_manage.stop import _stop
+
+        _stop(hg_names, **kwargs)
+
+    def list_instances(self):
+        """
+        Describe the containers of the running instances (see
+        ``list.describe_container``).
+        """
+        from higlass_manage.list import describe_container
+        from higlass_manage.list import find_instances
+
+        return [
+            describe_container(role, hg_name, container.attrs)
+            for (role, hg_name, container) in find_instances()
+        ]
+
+    def ingest(self, filenames, hg_name="default", **kwargs):
+        """
+        Ingest datasets into an instance (see ``Instance.ingest``)
+        """
+        return self.instance(hg_name).ingest(filenames, **kwargs)
+
+    def view(self, filename, hg_name="default", **kwargs):
+        """
+        Create a viewconf showing a file (see ``Instance.view``)
+        """
+        return self.instance(hg_name).view(filename, **kwargs)
+
+    def close(self):
+        for instance in self.instances.values():
+            instance.close()
+
+        self.instances = {}
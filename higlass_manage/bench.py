@@ -0,0 +1,248 @@
+import click
+import docker
+import random
+import requests
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from higlass_manage.common import get_docker_client
+from higlass_manage.common import get_port
+from higlass_manage.common import hg_name_to_redis_name
+from higlass_manage.tiles import api_url
+from higlass_manage.tiles import fetch_tiles
+from higlass_manage.tiles import get_tileset_info
+from higlass_manage.tiles import viewport_tiles
+
+LATENCY_QUANTILES = [0.5, 0.95, 0.99]
+
+
+def generate_requests(tileset_info, num_requests, batch_size, zoom_levels, rng):
+    """
+    Generate a mix of tile requests across tilesets and zoom levels.
+
+    Each request asks for ``batch_size`` adjacent tiles of one tileset
+    at one zoom level, which is how the higlass client requests tiles.
+
+    Parameters:
+    ----------
+    tileset_info: dict
+        The tileset info of each tileset keyed by uid
+    num_requests: int
+        The number of requests to generate
+    batch_size: int
+        The number of tiles in each request
+    zoom_levels: [int]
+        The zoom levels to request tiles from. All zoom levels of each
+        tileset are used if this is None.
+
+    Returns:
+    --------
+    requests: [[str]]
+        The tile ids of each request
+    """
+    uids = sorted(tileset_info.keys())
+    tile_requests = []
+
+    for _ in range(num_requests):
+        uid = rng.choice(uids)
+        info = tileset_info[uid]
+        max_zoom = info.get("max_zoom", 0)
+
+        if zoom_levels:
+            zoom = rng.choice([z for z in zoom_levels if z <= max_zoom] or [max_zoom])
+        else:
+            zoom = rng.randint(0, max_zoom)
+
+        tile_requests.append(viewport_tiles(uid, info, zoom, batch_size, rng))
+
+    return tile_requests
+
+
+def run_requests(url, tile_requests, concurrency):
+    """
+    Send tile requests using ``concurrency`` threads.
+
+    Returns:
+    --------
+    (results, elapsed): ([(float, bool, int)], float)
+        The latency, success and size of each request and the total
+        time taken
+    """
+    local = threading.local()
+
+    def fetch(tile_ids):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+
+        return fetch_tiles(local.session, url, tile_ids)
+
+    t1 = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, tile_requests))
+
+    return (results, time.time() - t1)
+
+
+def flush_redis_cache(hg_name):
+    """
+    Empty the Redis tile cache of an instance.
+
+    Returns:
+    --------
+    flushed: bool
+        False if the instance doesn't use Redis or it couldn't be flushed
+    """
+    try:
+        redis_container = get_docker_client().containers.get(
+            hg_name_to_redis_name(hg_name)
+        )
+    except (docker.errors.DockerException, requests.exceptions.ConnectionError):
+        # the instance doesn't use Redis or docker isn't reachable
+        return False
+
+    (exit_code, output) = redis_container.exec_run("redis-cli FLUSHDB")
+    return exit_code == 0 and b"OK" in output
+
+
+def summarize(name, tile_requests, results, elapsed):
+    latencies = sorted(latency for (latency, ok, _) in results)
+    errors = len([ok for (_, ok, _) in results if not ok])
+    num_tiles = sum(len(tile_ids) for tile_ids in tile_requests)
+    num_bytes = sum(size for (_, _, size) in results)
+
+    quantiles = [
+        (
+            latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+            if latencies
+            else 0
+        )
+        for q in LATENCY_QUANTILES
+    ]
+
+    return [
+        name,
+        len(results),
+        num_tiles,
+        errors,
+        len(results) / elapsed if elapsed > 0 else 0,
+        num_tiles / elapsed if elapsed > 0 else 0,
+        num_bytes / 2**20 / elapsed if elapsed > 0 else 0,
+    ] + quantiles
+
+
+@click.command()
+@click.argument("hg_name", nargs=-1)
+@click.option(
+    "-u",
+    "--uid",
+    "uids",
+    multiple=True,
+    required=True,
+    help="The uid of a tileset to request tiles from (can be repeated)",
+)
+@click.option(
+    "--url",
+    default=None,
+    help="The API url of the server to benchmark (e.g. http://localhost:8989/api/v1). By default the url of the instance HG_NAME is used.",
+)
+@click.option(
+    "-n",
+    "--requests",
+    "num_requests",
+    default=200,
+    help="The number of requests to send",
+)
+@click.option(
+    "-c", "--concurrency", default=8, help="The number of requests to send at once"
+)
+@click.option(
+    "-b", "--batch-size", default=6, help="The number of tiles to request at once"
+)
+@click.option(
+    "-z",
+    "--zoom-level",
+    "zoom_levels",
+    multiple=True,
+    type=int,
+    help="Only request tiles from this zoom level (can be repeated)",
+)
+@click.option(
+    "--seed",
+    default=None,
+    type=int,
+    help="The seed used to generate requests. Use a different seed to request tiles which aren't cached yet.",
+)
+@click.option(
+    "--flush-cache",
+    is_flag=True,
+    default=False,
+    help="Empty the instance's Redis tile cache before the first pass so that it measures a cold cache",
+)
+def bench(
+    hg_name,
+    uids,
+    url,
+    num_requests,
+    concurrency,
+    batch_size,
+    zoom_levels,
+    seed,
+    flush_cache,
+):
+    """
+    Benchmark how fast an instance serves tiles.
+
+    A mix of tile requests is generated across the given tilesets and
+    their zoom levels and sent twice: first to whatever the cache holds
+    and then again, once the requested tiles have been cached. The first
+    pass is only reported as cold if the cache was flushed before it.
+    """
+    hg_name = hg_name[0] if hg_name else "default"
+
+    if url is None:
+        url = api_url(get_port(hg_name))
+
+    try:
+        tileset_info = get_tileset_info(requests.Session(), url, uids)
+    except requests.exceptions.RequestException as ex:
+        sys.stderr.write("Error retrieving tileset info: {}\n".format(ex))
+        return
+
+    missing = [uid for uid in uids if uid not in tileset_info]
+    if missing:
+        sys.stderr.write("Unknown tilesets: {}\n".format(", ".join(missing)))
+        return
+
+    rng = random.Random(seed)
+    tile_requests = generate_requests(
+        tileset_info, num_requests, batch_size, zoom_levels, rng
+    )
+
+    first = "first"
+    if flush_cache:
+        if flush_redis_cache(hg_name):
+            first = "cold"
+        else:
+            sys.stderr.write(
+                "Could not flush the Redis cache of {}, the first pass may use cached tiles\n".format(
+                    hg_name
+                )
+            )
+
+    rows = []
+    for name in [first, "warm"]:
+        (results, elapsed) = run_requests(url, tile_requests, concurrency)
+        rows.append(summarize(name, tile_requests, results, elapsed))
+
+    sys.stdout.write(
+        "cache\trequests\ttiles\terrors\treq/s\ttiles/s\tMB/s\tp50 ms\tp95 ms\tp99 ms\n"
+    )
+    for row in rows:
+        sys.stdout.write(
+            "{}\t{}\t{}\t{}\t{:.1f}\t{:.1f}\t{:.2f}\t{:.1f}\t{:.1f}\t{:.1f}\n".format(
+                *row
+            )
+        )
@@ -13,8 +13,6 @@ def browse(names):
     """
     Launch a web browser for a running instance
     """
-    client = docker.from_env()
-
     if len(names) == 0:
         names = ("default",)
 
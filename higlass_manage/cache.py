@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import os.path as op
+
+from higlass_manage.common import get_state_dir
+from higlass_manage.fingerprint import FINGERPRINT_DB, FingerprintIndex
+from higlass_manage.staging import reflink_or_copy
+
+# the default maximum size of the aggregation cache in bytes
+AGGREGATION_CACHE_SIZE = 10 * 2 ** 30
+
+
+class FileCache:
+    """
+    A content-addressed cache of files derived from other files, such
+    as the output of aggregating a bed file.
+
+    Entries are keyed by the checksum of the input file and the
+    parameters used to derive the output. The checksums are kept in a
+    fingerprint index in the cache directory so that input files are
+    only hashed again when they change. Once the cache grows beyond its
+    maximum size, the least recently used entries are evicted.
+
+    Files are reflinked or copied into and out of the cache, never
+    hardlinked, so that writing to an output file in place can't change
+    a cached entry.
+
+    Parameters:
+    ----------
+    cache_dir: str
+        The directory to store cached files in
+    max_size: int
+        The maximum total size of the cached files in bytes
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        if not op.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, filename, params):
+        """
+        Compute the cache key for deriving a file from ``filename`` with
+        the given (json serializable) parameters.
+        """
+        with FingerprintIndex(self.cache_dir) as index:
+            checksum = index.md5(filename)
+
+        contents = json.dumps({"input": checksum, "params": params}, sort_keys=True)
+
+        return hashlib.sha256(contents.encode("utf8")).hexdigest()
+
+    def get(self, key, output_file):
+        """
+        Place the cached file for ``key`` at ``output_file``.
+
+        Returns:
+        --------
+        found: bool
+            False if there is no cached file for this key
+        """
+        path = op.join(self.cache_dir, key)
+
+        if not op.exists(path):
+            return False
+
+        # mark the entry as recently used
+        os.utime(path)
+
+        if op.exists(output_file):
+            os.remove(output_file)
+
+        reflink_or_copy(path, output_file)
+        return True
+
+    def put(self, key, output_file):
+        """
+        Store a derived file in the cache and evict old entries if the
+        cache is too large.
+        """
+        path = op.join(self.cache_dir, key)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+
+        reflink_or_copy(output_file, temp_path)
+        os.replace(temp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is no
+        larger than its maximum size.
+        """
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".tmp") or filename.startswith(FINGERPRINT_DB):
+                continue
+
+            path = op.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # evicted by another process
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for (_, size, _) in entries)
+
+        for (_, size, path) in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total_size -= size
+
+
+def get_aggregation_cache():
+    """
+    Return the cache of aggregated files. Its maximum size in bytes can
+    be set using the HIGLASS_MANAGE_AGGREGATION_CACHE_SIZE environment
+    variable.
+    """
+    max_size = int(
+        os.environ.get("HIGLASS_MANAGE_AGGREGATION_CACHE_SIZE", AGGREGATION_CACHE_SIZE)
+    )
+
+    return FileCache(op.join(get_state_dir(), "aggregations"), max_size)
@@ -1,17 +1,35 @@
 import click
+import importlib
 
-from higlass_manage.ingest import ingest
-from higlass_manage.list import tilesets, instances
-from higlass_manage.start import start
-from higlass_manage.stop import stop
-from higlass_manage.shell import shell
-from higlass_manage.view import view
-from higlass_manage.update_viewconfs import update_viewconfs
-from higlass_manage.logs import logs
 from higlass_manage import __version__
 
-import higlass_manage.create as hmce
-import higlass_manage.delete as hmde
+
+class LazyGroup(click.Group):
+    """
+    A command group whose subcommands are only imported when they are
+    used, so that running one command doesn't pay for importing the
+    dependencies of all the others (e.g. clodius for ingest).
+
+    Parameters:
+    ----------
+    lazy_commands: dict
+        The location of each subcommand as "module:attribute", keyed by
+        the subcommand's name
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if name not in self.lazy_commands:
+            return super().get_command(ctx, name)
+
+        (module_name, attribute) = self.lazy_commands[name].split(":")
+        return getattr(importlib.import_module(module_name), attribute)
 
 
 @click.command()
@@ -19,32 +37,49 @@ def version():
     print(__version__)
 
 
-@click.group()
+@click.group(
+    cls=LazyGroup,
+    lazy_commands={
+        "tilesets": "higlass_manage.list:tilesets",
+        "instances": "higlass_manage.list:instances",
+    },
+)
 def list():
     pass
 
 
-list.add_command(tilesets)
-list.add_command(instances)
-
-
-@click.group()
+@click.group(
+    cls=LazyGroup, lazy_commands={"superuser": "higlass_manage.create:superuser"}
+)
 def create():
     pass
 
 
-create.add_command(hmce.superuser)
-
-
-@click.group()
+@click.group(
+    cls=LazyGroup, lazy_commands={"superuser": "higlass_manage.delete:superuser"}
+)
 def delete():
     pass
 
 
-delete.add_command(hmde.superuser)
-
-
-@click.group()
+@click.group(
+    cls=LazyGroup,
+    lazy_commands={
+        "ingest": "higlass_manage.ingest:ingest",
+        "start": "higlass_manage.start:start",
+        "stop": "higlass_manage.stop:stop",
+        "shell": "higlass_manage.shell:shell",
+        "view": "higlass_manage.view:view",
+        "update-viewconfs": "higlass_manage.update_viewconfs:update_viewconfs",
+        "logs": "higlass_manage.logs:logs",
+        "up": "higlass_manage.fleet:up",
+        "down": "higlass_manage.fleet:down",
+        "metrics": "higlass_manage.metrics:metrics",
+        "bench": "higlass_manage.bench:bench",
+        "warmup": "higlass_manage.warmup:warmup",
+        "watch": "higlass_manage.watch:watch",
+    },
+)
 def cli():
     pass
 
@@ -52,11 +87,4 @@ def cli():
 cli.add_command(create)
 cli.add_command(delete)
 cli.add_command(list)
-cli.add_command(ingest)
-cli.add_command(start)
-cli.add_command(stop)
-cli.add_command(shell)
-cli.add_command(view)
-cli.add_command(update_viewconfs)
-cli.add_command(logs)
 cli.add_command(version)
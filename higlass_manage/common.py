@@ -1,25 +1,137 @@
 import docker
 import hashlib
+import json
 import os
 import os.path as op
+import requests
 import slugid
+import socket
 import sys
+import time
+
+from docker.utils.socket import STDOUT, frames_iter
+from higlass_manage.staging import stage_file
 
 CONTAINER_PREFIX = "higlass-manage-container"
 NETWORK_PREFIX = "higlass-manage-network"
 REDIS_PREFIX = "higlass-manage-redis"
 REDIS_CONF = "/usr/local/etc/redis/redis.conf"
 SQLITEDB = "db.sqlite3"
-
-
-def md5(fname):
+DEFAULT_MEDIA_ROOT = "/data/media"
+TILESETS_PAGE_SIZE = 1000
+STATE_DIR = "~/.higlass-manage"
+# containers started by higlass-manage are labelled with keys under this prefix
+LABEL_PREFIX = "higlass-manage"
+# bedGraph files, which may be gzipped, are recognized by these extensions
+BEDGRAPH_EXTENSIONS = (".bedgraph", ".bg", ".bdg")
+# tilesets registered in one batch are committed in transactions of this size
+REGISTER_CHUNK_SIZE = 200
+# output lines of the batch registration process which report a result
+REGISTER_RESULT_PREFIX = "higlass-manage-result "
+# registers the tilesets described by json lines on stdin using the server's
+# ingest_tileset command. Every tileset gets a savepoint so that one failure
+# doesn't roll back the rest of its chunk and results are only reported once
+# their chunk has been committed. The script is run by ``manage.py shell``,
+# which may execute it with separate globals and locals, so it must not use
+# functions, classes or comprehensions.
+REGISTER_SCRIPT = """
+import json
+import sys
+from django.core.management import call_command
+from django.db import transaction
+
+entries = []
+for line in sys.stdin:
+    if line.strip():
+        entries.append(json.loads(line))
+
+for start in range(0, len(entries), {chunk_size}):
+    results = []
+    with transaction.atomic():
+        for index in range(start, min(start + {chunk_size}, len(entries))):
+            try:
+                with transaction.atomic():
+                    call_command("ingest_tileset", **entries[index])
+                results.append({{"index": index, "uid": entries[index]["uid"]}})
+            except (Exception, SystemExit) as ex:
+                results.append({{"index": index, "error": repr(ex)}})
+    for result in results:
+        sys.stdout.write("{prefix}" + json.dumps(result) + "\\n")
+    sys.stdout.flush()
+"""
+
+
+def md5(fname, chunk_size=2 ** 20):
     hash_md5 = hashlib.md5()
     with open(fname, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(chunk_size), b""):
             hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
 
+def get_state_dir():
+    """
+    Return the directory where higlass-manage keeps information that is
+    shared between invocations, creating it if necessary. It can be
+    changed using the HIGLASS_MANAGE_HOME environment variable.
+    """
+    state_dir = op.expanduser(os.environ.get("HIGLASS_MANAGE_HOME", STATE_DIR))
+
+    if not op.exists(state_dir):
+        os.makedirs(state_dir, exist_ok=True)
+
+    return state_dir
+
+
+def read_state_file(filename):
+    """
+    Load a json file from the state directory, returning an empty
+    dictionary if it doesn't exist.
+    """
+    path = op.join(get_state_dir(), filename)
+
+    if not op.exists(path):
+        return {}
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_state_file(filename, data):
+    """
+    Atomically replace a json file in the state directory.
+    """
+    path = op.join(get_state_dir(), filename)
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+
+    os.replace(temp_path, path)
+
+
+def instance_labels(hg_name, role, port, data_dir):
+    """
+    The labels attached to a container of an instance, which let
+    instances be found without inspecting every container on the host.
+
+    Parameters:
+    ----------
+    role: str
+        "higlass" or "redis"
+    port: int
+        The port the container is reachable on
+    data_dir: str
+        The host directory holding the container's data
+    """
+    return {
+        "{}.name".format(LABEL_PREFIX): hg_name,
+        "{}.role".format(LABEL_PREFIX): role,
+        "{}.port".format(LABEL_PREFIX): str(port),
+        "{}.data-dir".format(LABEL_PREFIX): data_dir,
+    }
+
+
 def hg_name_to_container_name(hg_name):
     return "{}-{}".format(CONTAINER_PREFIX, hg_name)
 
@@ -32,14 +144,129 @@ def hg_name_to_redis_name(hg_name):
     return "{}-{}".format(REDIS_PREFIX, hg_name)
 
 
-def get_port(hg_name):
-    client = docker.from_env()
+# how long the configuration of an instance's container is reused, in
+# seconds, so that long-running processes notice containers which were
+# restarted, removed or replaced by another process
+INSTANCE_INFO_TTL = 5
+
+_docker_client = None
+# (time of the inspection, InstanceInfo) for every instance
+_instance_infos = {}
 
-    container_name = hg_name_to_container_name(hg_name)
-    config = client.api.inspect_container(container_name)
-    port = config["HostConfig"]["PortBindings"]["80/tcp"][0]["HostPort"]
 
-    return port
+def get_docker_client():
+    """
+    Return a docker client which is shared by everything that runs
+    as part of the same command.
+    """
+    global _docker_client
+
+    if _docker_client is None:
+        _docker_client = docker.from_env()
+
+    return _docker_client
+
+
+class InstanceInfo:
+    """
+    The configuration of a higlass container as returned by
+    ``docker inspect``.
+
+    Use ``get_instance_info`` to obtain one so that a container isn't
+    inspected over and over again.
+
+    Parameters:
+    ----------
+    hg_name: str
+        The name of the higlass instance
+    config: dict
+        The output of inspecting the instance's container
+    """
+
+    def __init__(self, hg_name, config):
+        self.hg_name = hg_name
+        self.config = config
+
+    @property
+    def running(self):
+        return self.config["State"]["Running"]
+
+    @property
+    def port(self):
+        return self.config["HostConfig"]["PortBindings"]["80/tcp"][0]["HostPort"]
+
+    @property
+    def env(self):
+        """
+        The container's environment as a list of "NAME=value" strings
+        """
+        return self.config["Config"]["Env"]
+
+    @property
+    def mounts(self):
+        """
+        A dictionary mapping mount destinations in the container to
+        their sources on the host
+        """
+        return {m["Destination"]: m["Source"] for m in self.config["Mounts"]}
+
+    @property
+    def temp_dir(self):
+        return self.mounts.get("/tmp")
+
+    @property
+    def data_dir(self):
+        return self.mounts.get("/data")
+
+    @property
+    def media_dir(self):
+        """
+        The host directory which is mounted as the server's media root
+        and the media root in the container, or None if the media root
+        isn't mounted from the host
+        """
+        media_root = DEFAULT_MEDIA_ROOT
+        for variable in self.env:
+            if variable.startswith("HIGLASS_MEDIA_ROOT="):
+                media_root = variable.split("=", 1)[1]
+
+        for (destination, source) in self.mounts.items():
+            if media_root == destination or media_root.startswith(destination + "/"):
+                return (source + media_root[len(destination) :], media_root)
+
+        return None
+
+
+def get_instance_info(hg_name, max_age=INSTANCE_INFO_TTL):
+    """
+    Inspect the container of a higlass instance, reusing the result of
+    a previous inspection if it is less than ``max_age`` seconds old.
+
+    Raises docker.errors.NotFound if the container doesn't exist.
+    """
+    now = time.time()
+    cached = _instance_infos.get(hg_name)
+
+    if cached is None or now - cached[0] >= max_age:
+        container_name = hg_name_to_container_name(hg_name)
+        config = get_docker_client().api.inspect_container(container_name)
+
+        cached = (now, InstanceInfo(hg_name, config))
+        _instance_infos[hg_name] = cached
+
+    return cached[1]
+
+
+def forget_instance_info(hg_name):
+    """
+    Drop the cached configuration of an instance after its container
+    has been started, stopped or replaced.
+    """
+    _instance_infos.pop(hg_name, None)
+
+
+def get_port(hg_name):
+    return get_instance_info(hg_name).port
 
 
 def get_site_url(hg_name, _SITE_URL="SITE_URL"):
@@ -52,13 +279,10 @@ def get_site_url(hg_name, _SITE_URL="SITE_URL"):
     Yields "localhost" when no SITE_URL entries
     detected.
     """
-
-    client = docker.from_env()
-
     container_name = hg_name_to_container_name(hg_name)
-    config = client.api.inspect_container(container_name)
+    env = get_instance_info(hg_name).env
 
-    site_url_entries = [s for s in config["Config"]["Env"] if _SITE_URL in s]
+    site_url_entries = [s for s in env if _SITE_URL in s]
     # if there is no SITE_URL entry yield "localhost"
     if not site_url_entries:
         return "http://localhost"
@@ -74,6 +298,92 @@ def get_site_url(hg_name, _SITE_URL="SITE_URL"):
         return site_url
 
 
+def iter_tilesets(
+    port,
+    session=None,
+    page_size=TILESETS_PAGE_SIZE,
+    name=None,
+    filetype=None,
+    datatype=None,
+    project=None,
+    timeout=10,
+):
+    """
+    Iterate over the tilesets of a running instance, fetching them from
+    the tilesets API one page at a time.
+
+    The filters are passed on to the server. Because not every version
+    of higlass-server understands all of them, they are also applied to
+    the returned tilesets.
+
+    Parameters:
+    ----------
+    port: str
+        The port that the instance is running on
+    session: requests.Session
+        The session used to send requests. A new one is created if this
+        is None.
+    page_size: int
+        The number of tilesets to request at once
+    name: str
+        Only return tilesets whose name contains this string
+    filetype: str
+        Only return tilesets with this filetype
+    datatype: str
+        Only return tilesets with this datatype
+    project: str
+        Only return tilesets belonging to this project
+
+    Returns:
+    --------
+    tilesets: generator of dict
+        The tileset records returned by the server
+    """
+    if session is None:
+        session = requests.Session()
+
+    url = "http://localhost:{}/api/v1/tilesets/".format(port)
+    params = {"limit": page_size, "offset": 0}
+
+    if name is not None:
+        params["ac"] = name
+    if filetype is not None:
+        params["t"] = filetype
+    if datatype is not None:
+        params["dt"] = datatype
+    if project is not None:
+        params["project"] = project
+
+    while True:
+        ret = session.get(url, params=params, timeout=timeout)
+        ret.raise_for_status()
+
+        page = ret.json()
+
+        for tileset in page["results"]:
+            if name is not None and name not in tileset.get("name", ""):
+                continue
+            if filetype is not None and tileset.get("filetype") != filetype:
+                continue
+            if datatype is not None and tileset.get("datatype") != datatype:
+                continue
+            if project is not None and tileset.get("project_name", project) != project:
+                continue
+
+            yield tileset
+
+        # the next page link is built from the server's own idea of its
+        # address (which differs behind proxies or port mappings), so it is
+        # only used to tell whether there are more pages. Servers that
+        # don't paginate return everything in one response.
+        params["offset"] += len(page["results"])
+
+        if not page["results"] or page.get("next") is None:
+            break
+        if "count" in page and params["offset"] >= page["count"]:
+            break
+
+
 def fill_filetype_and_datatype(filename, filetype, datatype):
     """
     If no filetype or datatype are provided, add them
@@ -177,10 +487,24 @@ def infer_filetype(filename):
         return "hitile"
     elif ext.lower() == ".beddb":
         return "beddb"
+    elif is_bedgraph(filename):
+        return "bedgraph"
 
     return None
 
 
+def is_bedgraph(filename):
+    """
+    Check whether a file is named like a (possibly gzipped) bedGraph file
+    """
+    (base, ext) = op.splitext(filename.lower())
+
+    if ext == ".gz":
+        ext = op.splitext(base)[1]
+
+    return ext in BEDGRAPH_EXTENSIONS
+
+
 def infer_datatype(filetype):
     if filetype == "cooler":
         return "matrix"
@@ -192,6 +516,46 @@ def infer_datatype(filetype):
         return "vector"
     if filetype == "beddb":
         return "bedlike"
+    if filetype == "bedgraph":
+        return "vector"
+
+
+def stage_import(hg_name, filepath):
+    """
+    Make a file available to an instance's container so that it can be
+    ingested.
+
+    Returns:
+    --------
+    (filename, no_upload): (str, bool)
+        The name of the file in the instance's temp directory (mounted at
+        /tmp) or, if the file is already in the media directory, its path
+        in the container and True
+    """
+    temp_dir = get_temp_dir(hg_name)
+    if not op.exists(temp_dir):
+        os.makedirs(temp_dir)
+
+    filename = op.split(filepath)[1]
+    to_import_path = op.join(temp_dir, filename)
+
+    if to_import_path != filepath:
+        # if this file already exists in the temporary dir
+        # remove it
+        if op.exists(to_import_path):
+            print("Removing existing file in temporary dir:", to_import_path)
+            os.remove(to_import_path)
+
+        (strategy, staged_path) = stage_file(
+            filepath, to_import_path, get_instance_info(hg_name).media_dir
+        )
+
+        if strategy == "in-place":
+            # the file is already in the media directory so the
+            # server can use it where it is
+            return (staged_path, True)
+
+    return (filename, False)
 
 
 def import_file(
@@ -199,21 +563,7 @@ def import_file(
 ):
     # get this container's temporary directory
     if not no_upload:
-        temp_dir = get_temp_dir(hg_name)
-        if not op.exists(temp_dir):
-            os.makedirs(temp_dir)
-
-        filename = op.split(filepath)[1]
-        to_import_path = op.join(temp_dir, filename)
-
-        if to_import_path != filepath:
-            # if this file already exists in the temporary dir
-            # remove it
-            if op.exists(to_import_path):
-                print("Removing existing file in temporary dir:", to_import_path)
-                os.remove(to_import_path)
-
-            os.link(filepath, to_import_path)
+        (filename, no_upload) = stage_import(hg_name, filepath)
     else:
         filename = filepath
 
@@ -225,7 +575,7 @@ def import_file(
 
     print("name_text: {}".format(name_text))
 
-    client = docker.from_env()
+    client = get_docker_client()
     print("hg_name:", hg_name)
     container_name = hg_name_to_container_name(hg_name)
     container = client.containers.get(container_name)
@@ -264,30 +614,144 @@ def import_file(
     return uid
 
 
-def get_temp_dir(hg_name):
-    client = docker.from_env()
+def tileset_entry(
+    filename, filetype, datatype, assembly, name, uid, no_upload, project_name
+):
+    """
+    The options of the server's ingest_tileset command for a staged file
+    (see ``stage_import``), as used by ``register_tilesets``. A uid is
+    generated if none is given.
+    """
+    entry = {
+        "filename": filename if no_upload else "/tmp/{}".format(filename),
+        "filetype": filetype,
+        "datatype": datatype,
+        "uid": uid if uid is not None else slugid.nice(),
+        "no_upload": bool(no_upload),
+    }
+
+    # options which aren't given are left to the command's defaults
+    for (key, value) in [
+        ("coordSystem", assembly),
+        ("name", name),
+        ("project_name", project_name),
+    ]:
+        if value is not None:
+            entry[key] = value
+
+    return entry
+
+
+def register_tilesets(hg_name, entries, chunk_size=REGISTER_CHUNK_SIZE):
+    """
+    Register several tilesets with an instance using a single process in
+    its container, so that Python and Django are only started once
+    rather than once per tileset.
+
+    The entries are sent to the process over stdin and are registered in
+    transactions of ``chunk_size`` tilesets. Results are generated as the
+    process reports them.
+
+    Parameters:
+    ----------
+    entries: [dict]
+        The options of the ingest_tileset command for each tileset (see
+        ``tileset_entry``)
+    chunk_size: int
+        The number of tilesets to register in each transaction
+
+    Returns:
+    --------
+    results: generator of (int, str, str)
+        (index, uid, error) for every entry, where uid is None and error
+        describes the problem if the tileset couldn't be registered
+    """
+    if not entries:
+        return
+
+    client = get_docker_client()
     container_name = hg_name_to_container_name(hg_name)
-    config = client.api.inspect_container(container_name)
+    script = REGISTER_SCRIPT.format(
+        chunk_size=chunk_size, prefix=REGISTER_RESULT_PREFIX
+    )
+
+    try:
+        exec_id = client.api.exec_create(
+            container_name,
+            ["python", "higlass-server/manage.py", "shell", "--command", script],
+            stdin=True,
+        )["Id"]
+        sock = client.api.exec_start(exec_id, socket=True)
+    except docker.errors.APIError as ex:
+        for index in range(len(entries)):
+            yield (index, None, str(ex))
+        return
+
+    raw_socket = getattr(sock, "_sock", sock)
+
+    manifest = "".join(json.dumps(entry) + "\n" for entry in entries)
+    raw_socket.sendall(manifest.encode("utf8"))
+    # let the process know that the manifest is complete
+    raw_socket.shutdown(socket.SHUT_WR)
+
+    reported = set()
+    (remainder, errors) = (b"", [])
+
+    try:
+        for (stream, data) in frames_iter(sock, tty=False):
+            if stream != STDOUT:
+                errors.append(data)
+                continue
+
+            lines = (remainder + data).split(b"\n")
+            remainder = lines.pop()
+
+            for line in lines:
+                line = line.decode("utf8", "replace")
+
+                if not line.startswith(REGISTER_RESULT_PREFIX):
+                    continue
+
+                result = json.loads(line[len(REGISTER_RESULT_PREFIX) :])
+                reported.add(result["index"])
+                yield (result["index"], result.get("uid"), result.get("error"))
+    finally:
+        sock.close()
+
+    if len(reported) < len(entries):
+        exit_code = client.api.exec_inspect(exec_id)["ExitCode"]
+        error = "the registration process exited with code {}: {}".format(
+            exit_code, b"".join(errors).decode("utf8", "replace")[-1000:].strip()
+        )
+
+        for index in range(len(entries)):
+            if index not in reported:
+                yield (index, None, error)
 
-    print("state", config["State"]["Running"])
 
-    if config["State"]["Running"] != True:
+def get_temp_dir(hg_name):
+    info = get_instance_info(hg_name)
+
+    print("state", info.running)
+
+    if info.running != True:
         raise HiGlassNotRunningException()
 
-    for mount in config["Mounts"]:
-        if mount["Destination"] == "/tmp":
-            return mount["Source"]
+    return info.temp_dir
 
 
 def get_data_dir(hg_name):
-    client = docker.from_env()
-    container_name = hg_name_to_container_name(hg_name)
-    config = client.api.inspect_container(container_name)
-
-    for mount in config["Mounts"]:
-        if mount["Destination"] == "/data":
-            return mount["Source"]
+    return get_instance_info(hg_name).data_dir
 
 
 class HiGlassNotRunningException(Exception):
     pass
+
+
+class StartError(Exception):
+    """
+    Raised when an instance couldn't be started. The reason has already
+    been reported on stderr.
+    """
+
+    pass
@@ -0,0 +1,251 @@
+import hashlib
+import mmap
+import os
+import os.path as op
+import sqlite3
+
+from higlass_manage.common import md5
+
+FINGERPRINT_DB = "higlass-manage-fingerprints.sqlite3"
+
+# the number and size of the blocks read to compute a sampled digest
+SAMPLE_COUNT = 16
+SAMPLE_SIZE = 2 ** 20
+
+
+def sampled_digest(fname, sample_count=SAMPLE_COUNT, sample_size=SAMPLE_SIZE):
+    """
+    Compute a cheap digest of a file from its size and a set of blocks
+    sampled from its head, its tail and evenly strided positions in
+    between. Files which are no larger than the sampled blocks are
+    hashed completely. A single sample only covers the head.
+
+    Two files with different sampled digests are guaranteed to be
+    different. Files with the same sampled digest still need to have
+    their full checksums compared.
+
+    Parameters:
+    ----------
+    fname: str
+        The file to fingerprint
+    sample_count: int
+        The number of blocks to read, at least 1
+    sample_size: int
+        The size of each block in bytes
+
+    Returns:
+    --------
+    digest: str
+        The hex digest of the sampled blocks
+    """
+    if sample_count < 1:
+        raise ValueError("sample_count must be at least 1")
+
+    size = os.stat(fname).st_size
+    hash_md5 = hashlib.md5(str(size).encode("utf8"))
+
+    with open(fname, "rb") as f:
+        if size <= sample_count * sample_size:
+            for chunk in iter(lambda: f.read(sample_size), b""):
+                hash_md5.update(chunk)
+        else:
+            stride = (size - sample_size) // max(sample_count - 1, 1)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for i in range(sample_count):
+                    offset = i * stride
+                    hash_md5.update(m[offset : offset + sample_size])
+
+    return hash_md5.hexdigest()
+
+
+class FingerprintIndex:
+    """
+    A persistent index of file checksums stored in the data directory
+    of a higlass instance.
+
+    Checksums of files are keyed by (path, size, mtime, inode) so that
+    a file is only hashed again when it changes. Checksums of ingested
+    tilesets are keyed by their uuid, as are the checksums of the files
+    that tilesets were derived from (e.g. the bedGraph file a hitile
+    tileset was converted from).
+
+    Parameters:
+    ----------
+    data_dir: str
+        The data directory of the higlass instance
+    """
+
+    def __init__(self, data_dir):
+        self.db_path = op.join(data_dir, FINGERPRINT_DB)
+        self.conn = sqlite3.connect(self.db_path)
+
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime INTEGER,
+                    inode INTEGER,
+                    md5 TEXT,
+                    sampled TEXT
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tilesets (
+                    uuid TEXT PRIMARY KEY,
+                    md5 TEXT
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sources (
+                    uuid TEXT PRIMARY KEY,
+                    md5 TEXT
+                )
+                """
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _digest(self, path, column, digest_function):
+        path = op.realpath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+        row = self.conn.execute(
+            "SELECT md5, sampled FROM files "
+            "WHERE path=? AND size=? AND mtime=? AND inode=?",
+            key,
+        ).fetchone()
+
+        digests = {"md5": None, "sampled": None}
+        if row is not None:
+            digests["md5"], digests["sampled"] = row
+
+            if digests[column] is not None:
+                return digests[column]
+
+        digests[column] = digest_function(path)
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                key + (digests["md5"], digests["sampled"]),
+            )
+
+        return digests[column]
+
+    def md5(self, path):
+        """
+        Return the md5 checksum of a file, computing it only if the
+        file isn't in the index or has changed since it was indexed.
+        """
+        return self._digest(path, "md5", md5)
+
+    def sampled_digest(self, path):
+        """
+        Return the sampled digest of a file, computing it only if the
+        file isn't in the index or has changed since it was indexed.
+        """
+        return self._digest(path, "sampled", sampled_digest)
+
+    def tileset_md5(self, uuid):
+        """
+        Return the md5 checksum recorded for a tileset or None if there
+        isn't one.
+        """
+        row = self.conn.execute(
+            "SELECT md5 FROM tilesets WHERE uuid=?", (uuid,)
+        ).fetchone()
+
+        return None if row is None else row[0]
+
+    def add_tileset(self, uuid, checksum):
+        """
+        Record the md5 checksum of an ingested tileset.
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tilesets VALUES (?, ?)", (uuid, checksum)
+            )
+
+    def source_md5(self, uuid):
+        """
+        Return the md5 checksum of the file a tileset was derived from or
+        None if it was ingested as is.
+        """
+        row = self.conn.execute(
+            "SELECT md5 FROM sources WHERE uuid=?", (uuid,)
+        ).fetchone()
+
+        return None if row is None else row[0]
+
+    def add_source(self, uuid, checksum):
+        """
+        Record the md5 checksum of the file a tileset was derived from.
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?)", (uuid, checksum)
+            )
+
+    def same_contents(self, tileset_path, filename, uuid=None):
+        """
+        Check whether a tileset file and a local file have the same
+        contents, or whether the tileset was derived from the local file.
+
+        Files with different sizes are rejected without being read.
+        Otherwise their sampled digests are compared and full checksums
+        are only computed (or looked up) when those match.
+
+        Parameters:
+        ----------
+        tileset_path: str
+            The location of the tileset's file
+        filename: str
+            The local file
+        uuid: str
+            The uuid of the tileset, used to look up and record its
+            checksum
+
+        Returns:
+        --------
+        same: bool
+            True if both files have the same contents
+        """
+        source_checksum = self.source_md5(uuid) if uuid is not None else None
+
+        if source_checksum is not None:
+            return source_checksum == self.md5(filename)
+
+        if op.exists(tileset_path):
+            if os.stat(tileset_path).st_size != os.stat(filename).st_size:
+                return False
+
+            if self.sampled_digest(tileset_path) != self.sampled_digest(filename):
+                return False
+
+        checksum1 = self.tileset_md5(uuid) if uuid is not None else None
+
+        if checksum1 is None:
+            if not op.exists(tileset_path):
+                return False
+
+            checksum1 = self.md5(tileset_path)
+
+            if uuid is not None:
+                self.add_tileset(uuid, checksum1)
+
+        return checksum1 == self.md5(filename)
@@ -0,0 +1,188 @@
+import click
+import inspect
+import json
+import os.path as op
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from higlass_manage.common import forget_instance_info
+from higlass_manage.common import get_docker_client
+from higlass_manage.redis_config import rebalance_maxmemory
+from higlass_manage.start import _start
+from higlass_manage.stop import _stop
+
+# manifest entries which contain paths relative to the manifest
+PATH_OPTIONS = [
+    "temp_dir",
+    "data_dir",
+    "media_dir",
+    "redis_dir",
+    "default_track_options",
+]
+
+
+def read_fleet_manifest(manifest):
+    """
+    Read the instance definitions from a fleet manifest.
+
+    The manifest is a json file containing a list of instances, each of
+    which has a "name" and any of the options accepted by ``_start``
+    (e.g. "port", "data_dir", "media_dir", "use_redis", "workers").
+    Options shared by all instances can be placed in "defaults":
+
+        {
+            "defaults": {"version": "v0.6.9", "pull": "if-missing"},
+            "instances": [
+                {"name": "a", "port": 8001, "data_dir": "a/hg-data"},
+                {"name": "b", "port": 8002, "data_dir": "b/hg-data", "use_redis": true}
+            ]
+        }
+
+    Relative paths are interpreted relative to the manifest's location.
+
+    Returns:
+    --------
+    instances: [dict]
+        The keyword arguments to pass to ``_start`` for each instance
+    """
+    with open(manifest, "r") as f:
+        fleet = json.load(f)
+
+    manifest_dir = op.dirname(op.abspath(manifest))
+    start_options = inspect.signature(_start).parameters
+
+    instances = []
+    for definition in fleet["instances"]:
+        options = dict(fleet.get("defaults", {}))
+        options.update(definition)
+        options["hg_name"] = options.pop("name")
+
+        for option in options:
+            if option not in start_options:
+                raise ValueError(
+                    "Unknown option for instance {}: {}".format(
+                        options["hg_name"], option
+                    )
+                )
+
+        for option in PATH_OPTIONS:
+            if options.get(option) is not None:
+                options[option] = op.join(manifest_dir, op.expanduser(options[option]))
+
+        instances.append(options)
+
+    return instances
+
+
+def _run_all(function, items, jobs):
+    """
+    Call ``function`` on every item using a pool of ``jobs`` threads.
+
+    Returns:
+    --------
+    results: [(str, float)]
+        The status ("ok" or an error message) and elapsed time for each item
+    """
+
+    def run(item):
+        t1 = time.time()
+        try:
+            function(item)
+            status = "ok"
+        except SystemExit:
+            status = "failed"
+        except Exception as ex:
+            status = "failed: {}".format(ex)
+
+        return (status, time.time() - t1)
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        return list(executor.map(run, items))
+
+
+def _print_summary(rows, elapsed):
+    sys.stdout.write(
+        "{:<24}\t{:<8}\t{:>8}\t{}\n".format("name", "port", "time", "status")
+    )
+
+    for name, port, status, seconds in rows:
+        sys.stdout.write(
+            "{:<24}\t{:<8}\t{:>7.1f}s\t{}\n".format(name, str(port), seconds, status)
+        )
+
+    failed = len([row for row in rows if row[2] != "ok"])
+    sys.stdout.write(
+        "{} instances, {} failed, {:.1f}s total\n".format(len(rows), failed, elapsed)
+    )
+
+
+@click.command()
+@click.argument("manifest")
+@click.option(
+    "-j",
+    "--jobs",
+    default=4,
+    type=int,
+    help="The number of instances to start at the same time",
+)
+def up(manifest, jobs):
+    """
+    Start all of the instances defined in a fleet manifest
+    """
+    instances = read_fleet_manifest(manifest)
+
+    t1 = time.time()
+    results = _run_all(lambda options: _start(**options), instances, jobs)
+
+    for options in instances:
+        forget_instance_info(options["hg_name"])
+
+    # instances started at the same time may have been sized before
+    # seeing each other, so split the memory once all of them are running
+    if any(options.get("use_redis") for options in instances):
+        rebalance_maxmemory(get_docker_client())
+
+    _print_summary(
+        [
+            (options["hg_name"], options.get("port", 8989), status, seconds)
+            for (options, (status, seconds)) in zip(instances, results)
+        ],
+        time.time() - t1,
+    )
+
+
+@click.command()
+@click.argument("manifest")
+@click.option(
+    "-j",
+    "--jobs",
+    default=4,
+    type=int,
+    help="The number of instances to stop at the same time",
+)
+def down(manifest, jobs):
+    """
+    Stop all of the instances defined in a fleet manifest
+    """
+    instances = read_fleet_manifest(manifest)
+
+    t1 = time.time()
+    results = _run_all(lambda options: _stop([options["hg_name"]]), instances, jobs)
+
+    for options in instances:
+        forget_instance_info(options["hg_name"])
+
+    # the Redis instances that are still running can use the memory
+    # freed by the stopped ones
+    if any(options.get("use_redis") for options in instances):
+        rebalance_maxmemory(get_docker_client())
+
+    _print_summary(
+        [
+            (options["hg_name"], options.get("port", 8989), status, seconds)
+            for (options, (status, seconds)) in zip(instances, results)
+        ],
+        time.time() - t1,
+    )
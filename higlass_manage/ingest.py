@@ -1,17 +1,46 @@
 import click
 import clodius.cli.aggregate as cca
+import glob
+import gzip
 import ntpath
+import os
 import os.path as op
 import sys
+import threading
+import time
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Pool
+
+from higlass_manage.cache import get_aggregation_cache
 from higlass_manage.common import fill_filetype_and_datatype
 from higlass_manage.common import import_file
+from higlass_manage.common import register_tilesets
+from higlass_manage.common import stage_import
+from higlass_manage.common import tileset_entry
+from higlass_manage.common import get_data_dir
 from higlass_manage.common import get_temp_dir
+from higlass_manage.common import md5
+from higlass_manage.fingerprint import FingerprintIndex
 from higlass_manage.start import _start
 
+# the number of pixels processed at once when zoomifying coolers
+ZOOMIFY_CHUNKSIZE = 10000000
+# coolers are zoomified until the whole genome fits in a tile this wide
+HIGLASS_TILE_DIM = 256
+# bedGraph files are tiled this many values (a power of two multiple of the
+# tile size) at a time, which bounds the memory used to convert them
+BEDGRAPH_TILE_SIZE = 1024
+BEDGRAPH_CHUNK_SIZE = 12
+# how often to report the progress of a bedGraph conversion, in seconds
+PROGRESS_INTERVAL = 5
+# clodius reads bedGraph files through sys.stdin to let us count the rows,
+# so conversions in different threads have to take turns
+_stdin_lock = threading.Lock()
+
 
 @click.command()
-@click.argument("filename")
+@click.argument("filenames", nargs=-1)
 @click.option(
     "--hg-name",
     default="default",
@@ -37,21 +66,61 @@ from higlass_manage.start import _start
 @click.option(
     "--chromsizes-filename",
     default=None,
-    help="A set of chromosome sizes to use for bed and bedpe files",
+    help="A set of chromosome sizes to use for bed, bedpe and bedGraph files",
 )
 @click.option(
     "--has-header",
     default=False,
     is_flag=True,
-    help="Does the input file have column header information (only relevant for bed or bedpe files)",
+    help="Does the input file have column header information (only relevant for bed, bedpe or bedGraph files)",
 )
 @click.option(
     "--project-name",
     default=None,
     help="Group this tileset with others by specifying a project name",
 )
+@click.option(
+    "--manifest",
+    default=None,
+    help="A file listing the files to ingest, one per line",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=int,
+    help="The number of processes to use for aggregating bed and bedpe files",
+)
+@click.option(
+    "--aggregation-cache/--no-aggregation-cache",
+    default=True,
+    help="Reuse the output of previous aggregations of the same bed or bedpe file",
+)
+@click.option(
+    "--zoomify/--no-zoomify",
+    default=True,
+    help="Build a multi-resolution .mcool file from single-resolution .cool files",
+)
+@click.option(
+    "--zoomify-nproc",
+    default=1,
+    type=int,
+    help="The number of processes to use for zoomifying a cooler",
+)
+@click.option(
+    "--zoomify-chunksize",
+    default=ZOOMIFY_CHUNKSIZE,
+    type=int,
+    help="The number of pixels to process at once when zoomifying a cooler",
+)
+@click.option(
+    "--warm-up",
+    default=False,
+    is_flag=True,
+    help="Warm up the tile cache of the ingested tilesets",
+)
 def ingest(
-    filename,
+    filenames,
     hg_name,
     filetype=None,
     datatype=None,
@@ -62,23 +131,46 @@ def ingest(
     uid=None,
     no_upload=None,
     project_name=None,
+    manifest=None,
+    jobs=1,
+    aggregation_cache=True,
+    zoomify=True,
+    zoomify_nproc=1,
+    zoomify_chunksize=ZOOMIFY_CHUNKSIZE,
+    warm_up=False,
 ):
     """
-    Ingest a dataset
+    Ingest one or more datasets
+
+    FILENAMES can be files, directories or glob patterns. Additional
+    files can be listed in a manifest using the --manifest option.
     """
-    _ingest(
-        filename,
-        hg_name,
-        filetype,
-        datatype,
-        assembly,
-        name,
-        chromsizes_filename,
-        has_header,
-        uid,
-        no_upload,
-        project_name,
-    )
+    from higlass_manage.api import Manager, StartError
+
+    try:
+        Manager().instance(hg_name).ingest(
+            filenames,
+            filetype=filetype,
+            datatype=datatype,
+            assembly=assembly,
+            name=name,
+            chromsizes_filename=chromsizes_filename,
+            has_header=has_header,
+            uid=uid,
+            no_upload=no_upload,
+            project_name=project_name,
+            manifest=manifest,
+            jobs=jobs,
+            aggregation_cache=aggregation_cache,
+            zoomify=zoomify,
+            zoomify_nproc=zoomify_nproc,
+            zoomify_chunksize=zoomify_chunksize,
+            warm_up=warm_up,
+        )
+    except ValueError as ex:
+        print(ex, file=sys.stderr)
+    except StartError:
+        sys.exit(-1)
 
 
 def _ingest(
@@ -93,13 +185,17 @@ def _ingest(
     uid=None,
     no_upload=None,
     project_name=None,
+    aggregation_cache=True,
+    zoomify=True,
+    zoomify_nproc=1,
+    zoomify_chunksize=ZOOMIFY_CHUNKSIZE,
 ):
 
     try:
         get_temp_dir(hg_name)
     except Exception:
         print("HiGlass not running. Starting...")
-        _start(hg_name=hg_name)
+        _start(hg_name=hg_name, pull="if-missing")
 
     if not no_upload and (not op.exists(filename) and not op.islink(filename)):
         print("File not found:", filename, file=sys.stderr)
@@ -117,9 +213,13 @@ def _ingest(
         has_header,
         no_upload,
         temp_dir,
+        aggregation_cache,
+        zoomify,
+        zoomify_nproc,
+        zoomify_chunksize,
     )
 
-    return import_file(
+    uid = import_file(
         hg_name,
         to_import,
         filetype,
@@ -131,9 +231,312 @@ def _ingest(
         project_name,
     )
 
+    if uid is not None and not no_upload:
+        index_tileset(hg_name, uid, filename, to_import)
+
+    return uid
+
+
+def _ingest_many(
+    filenames,
+    hg_name,
+    filetype=None,
+    datatype=None,
+    assembly=None,
+    chromsizes_filename=None,
+    has_header=False,
+    no_upload=None,
+    project_name=None,
+    jobs=1,
+    aggregation_cache=True,
+    zoomify=True,
+    zoomify_nproc=1,
+    zoomify_chunksize=ZOOMIFY_CHUNKSIZE,
+):
+    """
+    Ingest several datasets into one instance. The aggregation of bed and
+    bedpe files is spread over a pool of worker processes and aggregated
+    files are staged as soon as they are ready. All of the tilesets are
+    then registered by a single process in the instance's container.
+
+    Parameters:
+    ----------
+    filenames: [str]
+        The files to ingest
+    jobs: int
+        The maximum number of aggregation processes to run at once
+    aggregation_cache: bool
+        Reuse previously aggregated versions of bed and bedpe files and
+        zoomified versions of coolers
+    zoomify: bool
+        Build multi-resolution versions of single-resolution coolers
+
+    Returns:
+    --------
+    results: [(str, str)]
+        (filename, uid) pairs for every file. The uid is None for files
+        that could not be ingested.
+    """
+    try:
+        get_temp_dir(hg_name)
+    except Exception:
+        print("HiGlass not running. Starting...")
+        _start(hg_name=hg_name, pull="if-missing")
+
+    temp_dir = get_temp_dir(hg_name)
+
+    results = []
+    # the tileset_entry and (filename, aggregated file) of every file
+    # that is ready to be registered
+    (entries, aggregated_files) = ([], [])
+    total_bytes = 0
+    t1 = time.time()
+
+    with ProcessPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = {}
+
+        for filename in filenames:
+            if not no_upload and (not op.exists(filename) and not op.islink(filename)):
+                print("File not found:", filename, file=sys.stderr)
+                results.append((filename, None))
+                continue
+
+            (file_filetype, file_datatype) = fill_filetype_and_datatype(
+                filename, filetype, datatype
+            )
+
+            if file_filetype is None:
+                results.append((filename, None))
+                continue
+
+            future = executor.submit(
+                _timed_aggregate_file,
+                filename,
+                file_filetype,
+                assembly,
+                chromsizes_filename,
+                has_header,
+                no_upload,
+                temp_dir,
+                aggregation_cache,
+                zoomify,
+                zoomify_nproc,
+                zoomify_chunksize,
+            )
+            futures[future] = (filename, file_datatype)
+
+        for future in as_completed(futures):
+            (filename, file_datatype) = futures[future]
+
+            try:
+                (aggregated, aggregate_time) = future.result()
+            except Exception as ex:
+                print("Error aggregating {}: {}".format(filename, ex), file=sys.stderr)
+                results.append((filename, None))
+                continue
+
+            if aggregated is None:
+                results.append((filename, None))
+                continue
+
+            (to_import, file_filetype) = aggregated
+
+            if no_upload:
+                (staged, file_no_upload) = (to_import, True)
+            else:
+                (staged, file_no_upload) = stage_import(hg_name, to_import)
+                total_bytes += op.getsize(filename)
+
+            entries.append(
+                tileset_entry(
+                    staged,
+                    file_filetype,
+                    file_datatype,
+                    assembly,
+                    None,
+                    None,
+                    file_no_upload,
+                    project_name,
+                )
+            )
+            aggregated_files.append((filename, to_import))
+
+            # files which don't need aggregating are imported as they are
+            if to_import != filename:
+                print("Aggregated {} in {:.2f}s".format(filename, aggregate_time))
+
+    # register all of the tilesets using a single process in the container
+    t2 = time.time()
+    registered = list(register_tilesets(hg_name, entries))
+
+    if entries:
+        print(
+            "Registered {} tilesets in {:.2f}s".format(len(entries), time.time() - t2)
+        )
+
+    for (index, uid, error) in registered:
+        (filename, to_import) = aggregated_files[index]
+
+        if uid is None:
+            print("Error registering {}: {}".format(filename, error), file=sys.stderr)
+        else:
+            print("Ingested {} (uid: {})".format(filename, uid))
+
+            if not no_upload:
+                index_tileset(hg_name, uid, filename, to_import)
+
+        results.append((filename, uid))
+
+    elapsed = time.time() - t1
+    ingested = len([uid for (_, uid) in results if uid is not None])
+
+    print(
+        "Ingested {} of {} files in {:.2f}s ({:.2f} files/s, {:.2f} MB/s)".format(
+            ingested,
+            len(results),
+            elapsed,
+            ingested / elapsed if elapsed > 0 else 0,
+            total_bytes / 2 ** 20 / elapsed if elapsed > 0 else 0,
+        )
+    )
+
+    for (filename, uid) in results:
+        if uid is None:
+            print("Failed to ingest:", filename, file=sys.stderr)
+
+    return results
+
+
+def index_tileset(hg_name, uid, filename, to_import):
+    """
+    Record the checksum of an ingested file in the instance's
+    fingerprint index so that it doesn't need to be computed again
+    when the file is viewed. Files that were aggregated, converted or
+    zoomified before being ingested are also indexed by the checksum of
+    the original file so that viewing it again reuses the tileset.
+
+    Parameters:
+    ----------
+    hg_name: str
+        The name of the higlass instance
+    uid: str
+        The uid of the ingested tileset
+    filename: str
+        The file that was passed to ingest
+    to_import: str
+        The file that was imported into the instance
+    """
+    with FingerprintIndex(get_data_dir(hg_name)) as index:
+        index.add_tileset(uid, index.md5(to_import))
+
+        if op.realpath(to_import) != op.realpath(filename):
+            index.add_source(uid, index.md5(filename))
+
+
+def read_manifest(manifest):
+    """
+    Read a list of filenames from a manifest file. Blank lines and lines
+    starting with '#' are ignored and relative paths are interpreted
+    relative to the location of the manifest.
+    """
+    manifest_dir = op.dirname(op.abspath(manifest))
+    filenames = []
+
+    with open(manifest, "r") as f:
+        for line in f:
+            line = line.strip()
+
+            if not line or line.startswith("#"):
+                continue
+
+            filenames.append(op.join(manifest_dir, op.expanduser(line)))
+
+    return filenames
+
+
+def expand_filenames(filenames, manifest=None):
+    """
+    Expand directories and glob patterns into the list of files that
+    they contain and append the entries of an optional manifest.
+    """
+    if manifest is not None:
+        filenames = list(filenames) + read_manifest(manifest)
+
+    expanded = []
+    for filename in filenames:
+        if op.isdir(filename):
+            expanded += sorted(
+                op.join(filename, f)
+                for f in os.listdir(filename)
+                if not f.startswith(".") and op.isfile(op.join(filename, f))
+            )
+        elif not op.exists(filename) and any(c in filename for c in "*?["):
+            # existing files are taken literally even if their names
+            # contain glob characters
+            expanded += sorted(glob.glob(filename))
+        else:
+            expanded.append(filename)
+
+    return expanded
+
+
+def _timed_aggregate_file(*args):
+    t1 = time.time()
+    aggregated = aggregate_file(*args)
+
+    return (aggregated, time.time() - t1)
+
+
+def _cached_aggregate(aggregate, filename, output_file, params, use_cache):
+    """
+    Call ``aggregate`` to create ``output_file`` from ``filename`` unless
+    the same file has already been aggregated with the same parameters,
+    in which case the cached output is used instead.
+    """
+    if not use_cache:
+        aggregate()
+        return
+
+    cache = get_aggregation_cache()
+    key = cache.key(filename, params)
+
+    if cache.get(key, output_file):
+        print("Using cached aggregation of {}".format(filename))
+        return
+
+    aggregate()
+    cache.put(key, output_file)
+
+
+def aggregation_params(filetype, assembly, chromsizes_filename, has_header):
+    """
+    The parameters used to aggregate bed and bedpe files. Together with
+    the checksum of the input file they identify an aggregated file in
+    the aggregation cache.
+    """
+    return {
+        "filetype": filetype,
+        "assembly": assembly,
+        "chromsizes": md5(chromsizes_filename) if chromsizes_filename else None,
+        "has_header": has_header,
+        "importance_column": "random",
+        "max_per_tile": 50,
+        "tile_size": 1024,
+    }
+
 
 def aggregate_file(
-    filename, filetype, assembly, chromsizes_filename, has_header, no_upload, tmp_dir
+    filename,
+    filetype,
+    assembly,
+    chromsizes_filename,
+    has_header,
+    no_upload,
+    tmp_dir,
+    use_cache=True,
+    zoomify=True,
+    zoomify_nproc=1,
+    zoomify_chunksize=ZOOMIFY_CHUNKSIZE,
 ):
     if filetype == "bedfile":
         if no_upload:
@@ -150,20 +553,27 @@ def aggregate_file(
             return
 
         output_file = op.join(tmp_dir, ntpath.basename(filename) + ".beddb")
+        params = aggregation_params(filetype, assembly, chromsizes_filename, has_header)
 
         print("Aggregating bedfile")
-        cca._bedfile(
+        _cached_aggregate(
+            lambda: cca._bedfile(
+                filename,
+                output_file,
+                assembly,
+                importance_column=params["importance_column"],
+                has_header=has_header,
+                chromosome=None,
+                max_per_tile=params["max_per_tile"],
+                delimiter=None,
+                chromsizes_filename=chromsizes_filename,
+                offset=0,
+                tile_size=params["tile_size"],
+            ),
             filename,
             output_file,
-            assembly,
-            importance_column="random",
-            has_header=has_header,
-            chromosome=None,
-            max_per_tile=50,
-            delimiter=None,
-            chromsizes_filename=chromsizes_filename,
-            offset=0,
-            tile_size=1024,
+            params,
+            use_cache,
         )
 
         to_import = output_file
@@ -185,18 +595,25 @@ def aggregate_file(
             return
 
         output_file = op.join(tmp_dir, filename + ".bed2ddb")
+        params = aggregation_params(filetype, assembly, chromsizes_filename, has_header)
 
         print("Aggregating bedpe (output_file: {}".format(output_file))
-        cca._bedpe(
+        _cached_aggregate(
+            lambda: cca._bedpe(
+                filename,
+                output_file,
+                assembly,
+                importance_column=params["importance_column"],
+                has_header=has_header,
+                chromosome=None,
+                max_per_tile=params["max_per_tile"],
+                chromsizes_filename=chromsizes_filename,
+                tile_size=params["tile_size"],
+            ),
             filename,
             output_file,
-            assembly,
-            importance_column="random",
-            has_header=has_header,
-            chromosome=None,
-            max_per_tile=50,
-            chromsizes_filename=chromsizes_filename,
-            tile_size=1024,
+            params,
+            use_cache,
         )
 
         to_import = output_file
@@ -204,5 +621,261 @@ def aggregate_file(
         # because we aggregated the file, the new filetype is beddb
         filetype = "bed2ddb"
         return (to_import, filetype)
+    elif filetype == "bedgraph":
+        if no_upload:
+            raise Exception(
+                "bedGraph files need to be converted and cannot be linked. Consider not using the --no-upload option"
+            )
+
+        if assembly is None and chromsizes_filename is None:
+            print(
+                "An assembly or set of chromosome sizes is required when importing bedGraph files. Please specify one or the other using the --assembly or --chromsizes-filename parameters",
+                file=sys.stderr,
+            )
+            return
+
+        name = ntpath.basename(filename)
+        if name.lower().endswith(".gz"):
+            name = name[: -len(".gz")]
+
+        output_file = op.join(tmp_dir, op.splitext(name)[0] + ".hitile")
+        params = {
+            "filetype": filetype,
+            "assembly": assembly,
+            "chromsizes": md5(chromsizes_filename) if chromsizes_filename else None,
+            "has_header": has_header,
+            "tile_size": BEDGRAPH_TILE_SIZE,
+            "zoom_step": 8,
+        }
+
+        print("Converting bedGraph (output_file: {})".format(output_file))
+        _cached_aggregate(
+            lambda: convert_bedgraph(
+                filename, output_file, params, chromsizes_filename
+            ),
+            filename,
+            output_file,
+            params,
+            use_cache,
+        )
+
+        return (output_file, "hitile")
+    elif filetype == "cooler" and zoomify and is_single_resolution_cooler(filename):
+        if no_upload:
+            print(
+                "Not zoomifying {} because it is already in the media directory".format(
+                    filename
+                ),
+                file=sys.stderr,
+            )
+            return (filename, filetype)
+
+        output_file = op.join(
+            tmp_dir, op.splitext(ntpath.basename(filename))[0] + ".mcool"
+        )
+        params = zoomify_params(filename)
+
+        if params is None:
+            print(
+                "Not zoomifying {} because its bins have variable sizes".format(
+                    filename
+                ),
+                file=sys.stderr,
+            )
+            return (filename, filetype)
+
+        print("Zoomifying cooler (output_file: {})".format(output_file))
+        _cached_aggregate(
+            lambda: zoomify_cooler(
+                filename, output_file, params, zoomify_nproc, zoomify_chunksize
+            ),
+            filename,
+            output_file,
+            params,
+            use_cache,
+        )
+
+        return (output_file, filetype)
     else:
         return (filename, filetype)
+
+
+class RowCounter:
+    """
+    Wrap a file, counting the lines read from it and reporting how many
+    are read per second on stderr.
+    """
+
+    def __init__(self, f, label, interval=PROGRESS_INTERVAL):
+        self.f = f
+        self.label = label
+        self.interval = interval
+        self.rows = 0
+        self.start_time = time.time()
+        self.last_report = self.start_time
+
+    def __iter__(self):
+        for line in self.f:
+            self.rows += 1
+
+            if self.rows % 10000 == 0:
+                now = time.time()
+
+                if now - self.last_report >= self.interval:
+                    self.last_report = now
+                    self.report(now)
+
+            yield line
+
+    def readline(self):
+        self.rows += 1
+        return self.f.readline()
+
+    def report(self, now=None):
+        elapsed = (now or time.time()) - self.start_time
+        sys.stderr.write(
+            "{}: {} rows in {:.1f}s ({:.0f} rows/s)\n".format(
+                self.label,
+                self.rows,
+                elapsed,
+                self.rows / elapsed if elapsed > 0 else 0,
+            )
+        )
+
+    def close(self):
+        self.f.close()
+
+
+def convert_bedgraph(filename, output_file, params, chromsizes_filename=None):
+    """
+    Convert a (possibly gzipped) bedGraph file into a hitile file using
+    clodius. The file is read one line at a time and tiled in chunks of
+    a fixed number of values, so memory use doesn't depend on its size.
+    """
+    opener = gzip.open if filename.lower().endswith(".gz") else open
+    rows = RowCounter(opener(filename, "rt"), ntpath.basename(filename))
+
+    with _stdin_lock:
+        stdin = sys.stdin
+        sys.stdin = rows
+
+        try:
+            cca._bedgraph(
+                "-",
+                output_file,
+                # clodius stores the assembly in the file's metadata
+                params["assembly"] or "",
+                chrom_col=1,
+                from_pos_col=2,
+                to_pos_col=3,
+                value_col=4,
+                has_header=params["has_header"],
+                chromosome=None,
+                tile_size=params["tile_size"],
+                chunk_size=BEDGRAPH_CHUNK_SIZE,
+                method="sum",
+                nan_value=None,
+                transform="none",
+                count_nan=False,
+                closed_interval=False,
+                chromsizes_filename=chromsizes_filename,
+                zoom_step=params["zoom_step"],
+            )
+        finally:
+            sys.stdin = stdin
+            rows.close()
+
+    rows.report()
+
+
+def is_single_resolution_cooler(filename):
+    """
+    Check whether a file is a cooler with a single resolution, rather
+    than a multi-resolution (.mcool) file.
+    """
+    import cooler
+
+    try:
+        return cooler.fileops.list_coolers(filename) == ["/"]
+    except Exception:
+        return False
+
+
+def zoomify_params(filename, tile_dim=HIGLASS_TILE_DIM):
+    """
+    The parameters used to zoomify a single-resolution cooler. Together
+    with the checksum of the input file they identify a zoomified file in
+    the aggregation cache.
+
+    The resolutions double from the cooler's resolution until the whole
+    genome fits in a single tile. Coolers which were balanced have every
+    resolution balanced too.
+
+    Returns:
+    --------
+    params: dict
+        The resolutions and whether to balance them or None if the
+        cooler doesn't have a fixed bin size
+    """
+    import cooler
+
+    clr = cooler.Cooler(filename)
+
+    if not clr.binsize:
+        return None
+
+    genome_length = int(clr.chromsizes.sum())
+    resolutions = [int(clr.binsize)]
+
+    while genome_length / resolutions[-1] > tile_dim:
+        resolutions.append(resolutions[-1] * 2)
+
+    return {
+        "filetype": "cooler",
+        "resolutions": resolutions,
+        "balance": "weight" in clr.bins().columns,
+    }
+
+
+def zoomify_cooler(filename, output_file, params, nproc=1, chunksize=ZOOMIFY_CHUNKSIZE):
+    """
+    Build a multi-resolution cooler from a single-resolution one using
+    ``nproc`` processes.
+    """
+    import cooler
+
+    t1 = time.time()
+
+    # zoomify_cooler truncates an existing output file in place, which
+    # would also change any other links to it
+    if op.exists(output_file):
+        os.remove(output_file)
+
+    cooler.zoomify_cooler(
+        filename, output_file, params["resolutions"], chunksize, nproc=nproc
+    )
+
+    if params["balance"]:
+        pool = Pool(nproc) if nproc > 1 else None
+
+        try:
+            # the base resolution keeps the weights of the input cooler
+            for resolution in params["resolutions"][1:]:
+                clr = cooler.Cooler(
+                    "{}::resolutions/{}".format(output_file, resolution)
+                )
+                cooler.balance_cooler(
+                    clr,
+                    chunksize=chunksize,
+                    map=map if pool is None else pool.map,
+                    store=True,
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+
+    print(
+        "Zoomified {} to {} resolutions in {:.2f}s".format(
+            filename, len(params["resolutions"]), time.time() - t1
+        )
+    )
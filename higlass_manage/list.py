@@ -1,11 +1,19 @@
 import sys
 import click
-import docker
 import json
+import re
 import requests
 
-from higlass_manage.common import get_port
-from higlass_manage.common import CONTAINER_PREFIX, REDIS_PREFIX
+from higlass_manage.common import CONTAINER_PREFIX
+from higlass_manage.common import LABEL_PREFIX
+from higlass_manage.common import REDIS_PREFIX
+from higlass_manage.common import TILESETS_PAGE_SIZE
+from higlass_manage.common import get_docker_client
+
+TILESET_FIELDS = ["uuid", "filetype", "datatype", "coordSystem", "name"]
+# the container status reported by docker, e.g. "Up 3 hours (healthy)"
+HEALTH_PATTERN = re.compile(r"\((healthy|unhealthy|health: starting)\)")
+UPTIME_PATTERN = re.compile(r"^Up (.+?)(?: \(.*\))?$")
 
 
 @click.command()
@@ -14,64 +22,190 @@ from higlass_manage.common import CONTAINER_PREFIX, REDIS_PREFIX
     default="default",
     help="The name of the higlass container to import this file to",
 )
-def tilesets(hg_name):
+@click.option(
+    "--name", default=None, help="Only list tilesets whose name contains this string"
+)
+@click.option("--filetype", default=None, help="Only list tilesets of this filetype")
+@click.option("--datatype", default=None, help="Only list tilesets of this datatype")
+@click.option(
+    "--project", default=None, help="Only list tilesets belonging to this project"
+)
+@click.option(
+    "--format",
+    "output_format",
+    default="table",
+    type=click.Choice(["table", "tsv", "jsonl"]),
+    help="The output format (jsonl outputs the full tileset records)",
+)
+@click.option(
+    "--page-size",
+    default=TILESETS_PAGE_SIZE,
+    type=int,
+    help="The number of tilesets to request from the server at once",
+)
+def tilesets(hg_name, name, filetype, datatype, project, output_format, page_size):
     """
     List the datasets in an instance
     """
-    port = get_port(hg_name)
+    from higlass_manage.api import Manager
 
-    # use a really high limit to avoid paging
-    url = "http://localhost:{}/api/v1/tilesets/?limit=10000".format(port)
-    ret = requests.get(url)
+    instance = Manager().instance(hg_name)
 
-    if ret.status_code != 200:
-        sys.stderr.write("Error retrieving tilesets: {}".format(ret))
-        return
+    if output_format == "tsv":
+        sys.stdout.write("{}\n".format("\t".join(TILESET_FIELDS)))
 
-    j = json.loads(ret.content.decode("utf8"))
-    for result in j["results"]:
-        sys.stdout.write(
-            "{}\n".format(
-                " | ".join(
-                    [
-                        result["uuid"],
-                        result["filetype"],
-                        result["datatype"],
-                        result["coordSystem"],
-                        result["name"],
-                    ]
+    try:
+        for result in instance.tilesets(
+            page_size=page_size,
+            name=name,
+            filetype=filetype,
+            datatype=datatype,
+            project=project,
+        ):
+            if output_format == "jsonl":
+                sys.stdout.write("{}\n".format(json.dumps(result)))
+            else:
+                separator = "\t" if output_format == "tsv" else " | "
+                sys.stdout.write(
+                    "{}\n".format(
+                        separator.join([str(result[f]) for f in TILESET_FIELDS])
+                    )
                 )
+            sys.stdout.flush()
+    except requests.exceptions.RequestException as ex:
+        sys.stderr.write("Error retrieving tilesets: {}\n".format(ex))
+
+
+def find_instances():
+    """
+    Find the running higlass and Redis containers managed by
+    higlass-manage, using a docker API call filtered on the labels
+    attached by ``_start``. Containers started by earlier versions don't
+    have labels and are found by their names instead. Containers aren't
+    inspected, so the ``attrs`` of the returned containers hold the
+    summary returned by the listing (Id, Labels, Status, Mounts, ...).
+
+    Returns:
+    --------
+    instances: [(str, str, docker.models.containers.Container)]
+        (role, hg_name, container) for every container where role is
+        either "higlass" or "redis"
+    """
+    client = get_docker_client()
+    instances = []
+    labelled = set()
+
+    for summary in client.api.containers(
+        filters={"label": "{}.name".format(LABEL_PREFIX)}
+    ):
+        labels = summary["Labels"]
+        instances.append(
+            (
+                labels["{}.role".format(LABEL_PREFIX)],
+                labels["{}.name".format(LABEL_PREFIX)],
+                client.containers.prepare_model(summary),
             )
         )
+        labelled.add(summary["Id"])
+
+    for summary in client.api.containers(
+        filters={"name": [CONTAINER_PREFIX, REDIS_PREFIX]}
+    ):
+        if summary["Id"] in labelled:
+            continue
+
+        name = summary["Names"][0].lstrip("/")
+
+        for (role, prefix) in [("higlass", CONTAINER_PREFIX), ("redis", REDIS_PREFIX)]:
+            if name.startswith(prefix + "-"):
+                instances.append(
+                    (
+                        role,
+                        name[len(prefix) + 1 :],
+                        client.containers.prepare_model(summary),
+                    )
+                )
+
+    return instances
+
+
+def describe_container(role, hg_name, summary):
+    """
+    Describe a container from the summary returned when listing
+    containers.
+
+    Returns:
+    --------
+    description: dict
+        The role, instance name, port, data directory, mounts, status,
+        health and uptime of the container
+    """
+    labels = summary.get("Labels") or {}
+    status = summary.get("Status", "")
+    health = HEALTH_PATTERN.search(status)
+    uptime = UPTIME_PATTERN.match(status)
+    mounts = {m["Destination"]: m["Source"] for m in summary.get("Mounts", [])}
+
+    # containers started by earlier versions don't have labels
+    port = labels.get("{}.port".format(LABEL_PREFIX))
+    if port is None:
+        public_ports = [
+            p["PublicPort"] for p in summary.get("Ports", []) if "PublicPort" in p
+        ]
+        port = str(public_ports[0]) if public_ports else None
+
+    return {
+        "role": role,
+        "name": hg_name,
+        "port": port,
+        "data_dir": labels.get("{}.data-dir".format(LABEL_PREFIX), mounts.get("/data")),
+        "mounts": mounts,
+        "id": summary["Id"],
+        "image": summary.get("Image"),
+        "state": summary.get("State"),
+        "status": status,
+        "health": health.group(1) if health else None,
+        "uptime": uptime.group(1) if uptime else None,
+        "created": summary.get("Created"),
+    }
 
 
 @click.command()
-def instances():
+@click.option(
+    "--format",
+    "output_format",
+    default="table",
+    type=click.Choice(["table", "json"]),
+    help="The output format",
+)
+def instances(output_format):
     """
     List running instances
     """
-    client = docker.from_env()
-
-    for container in client.containers.list():
-        name = container.name
-        if name.find(CONTAINER_PREFIX) == 0:
-            hm_name = name[len(CONTAINER_PREFIX) + 1 :]
-            config = client.api.inspect_container(container.name)
-            directories = " ".join(
-                [
-                    "{}:{}".format(m["Source"], m["Destination"])
-                    for m in config["Mounts"]
-                ]
-            )
-            port = config["HostConfig"]["PortBindings"]["80/tcp"][0]["HostPort"]
-            sys.stdout.write("higlass\t{}\t{}\t{}\n".format(hm_name, directories, port))
-        if name.find(REDIS_PREFIX) == 0:
-            redis_name = name[len(REDIS_PREFIX) + 1 :]
-            redis_config = client.api.inspect_container(container.name)
-            redis_directories = " ".join(
-                [
-                    "{}:{}".format(m["Source"], m["Destination"])
-                    for m in redis_config["Mounts"]
-                ]
+    from higlass_manage.api import Manager
+
+    descriptions = Manager().list_instances()
+
+    if output_format == "json":
+        sys.stdout.write(json.dumps(descriptions, indent=2) + "\n")
+        return
+
+    for description in descriptions:
+        directories = " ".join(
+            [
+                "{}:{}".format(source, destination)
+                for (destination, source) in description["mounts"].items()
+            ]
+        )
+        port = description["port"] if description["role"] == "higlass" else "."
+
+        sys.stdout.write(
+            "{}\t{}\t{}\t{}\t{}\t{}\n".format(
+                description["role"],
+                description["name"],
+                directories,
+                port,
+                description["health"] or "-",
+                description["uptime"] or "-",
             )
-            sys.stdout.write("redis\t{}\t{}\t.\n".format(redis_name, redis_directories))
+        )
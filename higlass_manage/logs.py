@@ -1,23 +1,465 @@
+import bz2
 import click
+import collections
+import copy
+import datetime
+import glob
+import gzip
+import logging
+import lzma
+import os
 import os.path as op
+import re
+import sys
+import time
 
 from higlass_manage.common import get_data_dir
 
+# how much to read at once when reading a log backwards from its end
+TAIL_BLOCK_SIZE = 64 * 2 ** 10
+# how often to check a followed log for new lines, in seconds
+FOLLOW_INTERVAL = 0.5
+# rotated log segments with these extensions are decompressed on the fly
+COMPRESSED_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+# timestamps written by the server's loggers and by uWSGI, e.g.
+#   [17/Oct/2026 08:00:00] ERROR [django.request:152] Internal Server Error
+#   2026-10-17 08:00:00,123 ERROR ...
+#   [pid: 12|app: 0|req: 5/9] 172.17.0.1 () {...} [Sat Oct 17 08:00:00 2026] GET ...
+TIMESTAMP_FORMATS = [
+    (re.compile(r"^\[(\d{2}/\w{3}/\d{4} \d{2}:\d{2}:\d{2})\]"), "%d/%b/%Y %H:%M:%S"),
+    (re.compile(r"^(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})"), "%Y-%m-%d %H:%M:%S"),
+    (
+        re.compile(r"^\[pid: .*?\[(\w{3} \w{3} +\d{1,2} \d{2}:\d{2}:\d{2} \d{4})\]"),
+        "%a %b %d %H:%M:%S %Y",
+    ),
+]
+LEVEL_PATTERN = re.compile(r"\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b")
+RELATIVE_TIME_PATTERN = re.compile(r"^(\d+)([smhd])$")
+RELATIVE_TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def get_log_path(hg_name):
+    """
+    The location of the server log of an instance on the host
+    """
+    return op.join(get_data_dir(hg_name), "log", "hgs.log")
+
+
+def get_log_segments(log_path):
+    """
+    The segments of a log, oldest first: rotated segments (e.g.
+    hgs.log.1, hgs.log.2.gz) ordered by modification time, followed by
+    the current log.
+    """
+    rotated = [
+        path for path in glob.glob(glob.escape(log_path) + "[.-]*") if op.isfile(path)
+    ]
+    rotated.sort(key=op.getmtime)
+
+    if op.exists(log_path):
+        rotated.append(log_path)
+
+    return rotated
+
+
+def open_segment(path):
+    (_, ext) = op.splitext(path)
+    return COMPRESSED_OPENERS.get(ext, open)(path, "rb")
+
+
+def parse_timestamp(line):
+    """
+    Parse the timestamp at the start of a log line.
+
+    Returns:
+    --------
+    timestamp: datetime.datetime
+        The time the line was logged or None if it doesn't start with a
+        timestamp (e.g. the lines of a traceback)
+    """
+    for (pattern, date_format) in TIMESTAMP_FORMATS:
+        match = pattern.match(line)
+
+        if match is not None:
+            try:
+                return datetime.datetime.strptime(" ".join(match.groups()), date_format)
+            except ValueError:
+                return None
+
+    return None
+
+
+def is_entry_start(line):
+    """
+    Check whether a log line starts with a timestamp, without parsing it
+    """
+    return any(pattern.match(line) for (pattern, _) in TIMESTAMP_FORMATS)
+
+
+def parse_since(since):
+    """
+    Parse a time given as a date (2026-10-17), a date and time
+    (2026-10-17 08:00[:00]) or relative to now (30s, 10m, 2h, 1d).
+    """
+    match = RELATIVE_TIME_PATTERN.match(since)
+
+    if match is not None:
+        seconds = int(match.group(1)) * RELATIVE_TIME_UNITS[match.group(2)]
+        return datetime.datetime.now() - datetime.timedelta(seconds=seconds)
+
+    for date_format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]:
+        try:
+            return datetime.datetime.strptime(since.replace("T", " "), date_format)
+        except ValueError:
+            pass
+
+    raise click.BadParameter(
+        "expected a date, a date and time or a relative time such as 10m",
+        param_hint="--since",
+    )
+
+
+class LogFilter:
+    """
+    Select log entries by time, level and a regular expression.
+
+    An entry is a line starting with a timestamp together with the lines
+    without one that follow it (e.g. a traceback).
+
+    Parameters:
+    ----------
+    since: datetime.datetime
+        Only keep entries logged at or after this time
+    level: str
+        Only keep entries logged at this level or above
+    pattern: str
+        Only keep entries containing a match of this regular expression
+    """
+
+    def __init__(self, since=None, level=None, pattern=None):
+        self.since = since
+        self.level = None if level is None else logging.getLevelName(level)
+        self.pattern = None if pattern is None else re.compile(pattern)
+
+    @property
+    def active(self):
+        return (self.since, self.level, self.pattern) != (None, None, None)
+
+    def matches(self, entry):
+        if self.since is not None:
+            timestamp = parse_timestamp(entry[0])
+
+            if timestamp is None or timestamp < self.since:
+                return False
+
+        if self.level is not None:
+            match = LEVEL_PATTERN.search(entry[0])
+
+            if match is None or logging.getLevelName(match.group(1)) < self.level:
+                return False
+
+        if self.pattern is not None:
+            return any(self.pattern.search(line) for line in entry)
+
+        return True
+
+
+def iter_entries(lines):
+    """
+    Group lines into log entries.
+    """
+    entry = []
+
+    for line in lines:
+        if entry and is_entry_start(line):
+            yield entry
+            entry = []
+
+        entry.append(line)
+
+    if entry:
+        yield entry
+
+
+def iter_entries_reversed(lines):
+    """
+    Group lines read from the end of a log backwards into log entries,
+    yielding the last entry first.
+    """
+    continuation = []
+
+    for line in lines:
+        continuation.append(line)
+
+        if is_entry_start(line):
+            yield continuation[::-1]
+            continuation = []
+
+    if continuation:
+        yield continuation[::-1]
+
+
+def read_lines_reversed(f, block_size=TAIL_BLOCK_SIZE):
+    """
+    Read the lines of a file backwards, starting at its end, by seeking
+    back one block at a time. Empty lines are kept, so the first N lines
+    are the same as the output of ``tail -n N``.
+    """
+    f.seek(0, os.SEEK_END)
+    size = position = f.tell()
+    remainder = b""
+
+    while position > 0:
+        read_size = min(block_size, position)
+        position -= read_size
+        f.seek(position)
+
+        lines = (f.read(read_size) + remainder).split(b"\n")
+        # the first line may continue in the previous block
+        remainder = lines.pop(0)
+
+        if position + read_size == size and lines and lines[-1] == b"":
+            # the newline ending the file doesn't start another line
+            lines.pop()
+
+        for line in reversed(lines):
+            yield line.decode("utf8", "replace") + "\n"
+
+    if size > 0:
+        yield remainder.decode("utf8", "replace") + "\n"
+
+
+def seek_to_time(f, since, block_size=TAIL_BLOCK_SIZE):
+    """
+    Move to (shortly before) the first line of a log written at or after
+    ``since`` using a binary search over the file's timestamps.
+    """
+    f.seek(0, os.SEEK_END)
+    (low, high) = (0, f.tell())
+
+    while high - low > block_size:
+        middle = (low + high) // 2
+        f.seek(middle)
+        # skip the partial line we landed in
+        f.readline()
+
+        timestamp = None
+        while timestamp is None and f.tell() < high:
+            line = f.readline()
+
+            if not line:
+                break
+
+            timestamp = parse_timestamp(line.decode("utf8", "replace"))
+
+        if timestamp is not None and timestamp < since:
+            low = middle
+        else:
+            high = middle
+
+    f.seek(low)
+    if low > 0:
+        f.readline()
+
+
+def read_lines(f):
+    for line in f:
+        yield line.decode("utf8", "replace")
+
+
+def tail_entries(segments, count, log_filter):
+    """
+    Find the last ``count`` entries matching a filter, reading the
+    segments of a log backwards from their end and only opening older
+    segments if the newer ones don't contain enough entries.
+
+    Compressed segments can't be read backwards so they are read in
+    full.
+    """
+    entries = []
+
+    for path in reversed(segments):
+        if len(entries) >= count:
+            break
+
+        if log_filter.since is not None and (
+            datetime.datetime.fromtimestamp(op.getmtime(path)) < log_filter.since
+        ):
+            break
+
+        with open_segment(path) as f:
+            if op.splitext(path)[1] in COMPRESSED_OPENERS:
+                matching = collections.deque(maxlen=count - len(entries))
+                for entry in iter_entries(read_lines(f)):
+                    if log_filter.matches(entry):
+                        matching.append(entry)
+
+                entries += reversed(matching)
+            else:
+                for entry in iter_entries_reversed(read_lines_reversed(f)):
+                    if log_filter.matches(entry):
+                        entries.append(entry)
+
+                        if len(entries) >= count:
+                            break
+
+    return entries[::-1]
+
+
+def iter_matching_entries(segments, log_filter):
+    """
+    Generate the entries of every segment of a log which match a filter,
+    oldest first. Segments last modified before the filter's start time
+    are skipped and a binary search is used to find where to start
+    reading the first uncompressed segment.
+    """
+    for path in segments:
+        if log_filter.since is not None and (
+            datetime.datetime.fromtimestamp(op.getmtime(path)) < log_filter.since
+        ):
+            continue
+
+        with open_segment(path) as f:
+            if log_filter.since is not None and (
+                op.splitext(path)[1] not in COMPRESSED_OPENERS
+            ):
+                seek_to_time(f, log_filter.since)
+
+            if not log_filter.active:
+                for line in read_lines(f):
+                    yield [line]
+                continue
+
+            for entry in iter_entries(read_lines(f)):
+                if log_filter.matches(entry):
+                    yield entry
+
+                    if log_filter.since is not None:
+                        # the log is written in order so the entries which
+                        # follow don't need their timestamps checked
+                        log_filter = copy.copy(log_filter)
+                        log_filter.since = None
+
+
+def follow(log_path, log_filter, interval=FOLLOW_INTERVAL, out=sys.stdout):
+    """
+    Print lines appended to a log as they are written, starting from its
+    current end. The log is reopened from the start if it is rotated or
+    truncated.
+
+    Without a filter every line is printed. Otherwise lines without a
+    timestamp are printed if the entry they belong to matched the filter.
+    """
+    if op.exists(log_path):
+        stat = os.stat(log_path)
+        (inode, offset) = (stat.st_ino, stat.st_size)
+    else:
+        (inode, offset) = (None, 0)
+
+    (remainder, keep) = (b"", not log_filter.active)
+
+    while True:
+        time.sleep(interval)
+
+        try:
+            stat = os.stat(log_path)
+        except FileNotFoundError:
+            continue
+
+        if stat.st_ino != inode or stat.st_size < offset:
+            (inode, offset, remainder) = (stat.st_ino, 0, b"")
+
+        if stat.st_size == offset:
+            continue
+
+        with open(log_path, "rb") as f:
+            f.seek(offset)
+            data = remainder + f.read(stat.st_size - offset)
+            offset = f.tell()
+
+        # leave an incomplete last line for the next check
+        end = data.rfind(b"\n") + 1
+        remainder = data[end:]
+
+        for line in data[:end].decode("utf8", "replace").splitlines(True):
+            if log_filter.active and is_entry_start(line):
+                keep = log_filter.matches([line])
+
+            if keep:
+                out.write(line)
+
+        out.flush()
+
 
 @click.command()
 @click.argument("hg_name", nargs=-1)
-def logs(hg_name):
+@click.option(
+    "-n",
+    "--tail",
+    default=None,
+    type=int,
+    help="Only show the last N log entries (a message and any traceback following it)",
+)
+@click.option(
+    "-f",
+    "--follow",
+    "follow_log",
+    default=False,
+    is_flag=True,
+    help="Keep printing new log lines as they are written",
+)
+@click.option(
+    "--since",
+    default=None,
+    help="Only show entries logged since this time (e.g. 2026-10-17 08:00 or 2h)",
+)
+@click.option(
+    "--level",
+    default=None,
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]),
+    help="Only show entries logged at this level or above",
+)
+@click.option(
+    "--grep",
+    "pattern",
+    default=None,
+    help="Only show entries matching this regular expression",
+)
+def logs(hg_name, tail, follow_log, since, level, pattern):
     """
     Return the error log for this container
+
+    Rotated segments of the log (including gzip, bz2 and xz compressed
+    ones) are read as well, oldest first.
     """
     if len(hg_name) == 0:
         hg_name = "default"
     else:
         hg_name = hg_name[0]
 
-    data_dir = get_data_dir(hg_name)
-    log_location = op.join(data_dir, "log", "hgs.log")
+    log_location = get_log_path(hg_name)
+    segments = get_log_segments(log_location)
+
+    if not segments:
+        sys.stderr.write("Log not found: {}\n".format(log_location))
+        return
+
+    log_filter = LogFilter(
+        since=None if since is None else parse_since(since),
+        level=level,
+        pattern=pattern,
+    )
+
+    if tail is not None:
+        entries = tail_entries(segments, tail, log_filter)
+    else:
+        entries = iter_matching_entries(segments, log_filter)
+
+    for entry in entries:
+        sys.stdout.write("".join(entry))
 
-    with open(log_location, "r") as f:
-        for line in f:
-            print(line, end="")
+    if follow_log:
+        try:
+            follow(log_location, log_filter)
+        except KeyboardInterrupt:
+            pass
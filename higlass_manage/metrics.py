@@ -0,0 +1,362 @@
+import click
+import json
+import os
+import os.path as op
+import re
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from higlass_manage.list import find_instances
+from higlass_manage.logs import get_log_path
+
+# how much of an existing log to read the first time an instance is seen
+INITIAL_LOG_BYTES = 16 * 2 ** 20
+# request lines logged by uWSGI, e.g.
+# [pid: 12|app: 0|req: 5/9] 172.17.0.1 () {40 vars in 700 bytes} [...]
+#   GET /api/v1/tiles/?d=abc.0.0.0 => generated 1208 bytes in 12 msecs (HTTP/1.1 200) ...
+REQUEST_PATTERN = re.compile(
+    r"\b(?:GET|POST|PUT|DELETE|HEAD) (/\S*) => generated \d+ bytes in (\d+) msecs"
+)
+LATENCY_QUANTILES = [0.5, 0.95, 0.99]
+# the number of containers whose statistics are sampled at the same time
+STATS_THREADS = 8
+REDIS_INFO_FIELDS = [
+    "used_memory",
+    "maxmemory",
+    "keyspace_hits",
+    "keyspace_misses",
+    "evicted_keys",
+    "expired_keys",
+    "connected_clients",
+]
+# the type and description of each metric family in the Prometheus output
+METRIC_FAMILIES = {
+    "container_cpu_percent": ("gauge", "CPU usage of the container in percent"),
+    "container_cpu_seconds_total": (
+        "counter",
+        "CPU time used by the container in seconds",
+    ),
+    "container_memory_usage_bytes": ("gauge", "Memory used by the container"),
+    "container_memory_limit_bytes": ("gauge", "Memory limit of the container"),
+    "container_io_read_bytes_total": ("counter", "Bytes read from block devices"),
+    "container_io_write_bytes_total": ("counter", "Bytes written to block devices"),
+    "container_network_receive_bytes_total": (
+        "counter",
+        "Bytes received over the network",
+    ),
+    "container_network_transmit_bytes_total": (
+        "counter",
+        "Bytes sent over the network",
+    ),
+    "redis_used_memory": ("gauge", "Memory used by Redis in bytes"),
+    "redis_maxmemory": ("gauge", "Memory limit of Redis in bytes"),
+    "redis_keyspace_hits": ("counter", "Successful key lookups in Redis"),
+    "redis_keyspace_misses": ("counter", "Failed key lookups in Redis"),
+    "redis_evicted_keys": ("counter", "Keys evicted because of maxmemory"),
+    "redis_expired_keys": ("counter", "Keys removed when they expired"),
+    "redis_connected_clients": ("gauge", "Clients connected to Redis"),
+    "redis_hit_ratio": ("gauge", "Share of Redis key lookups which were hits"),
+    "request_latency_seconds": (
+        "summary",
+        "Latency of the requests to each API endpoint",
+    ),
+}
+
+
+def container_metrics(container):
+    """
+    CPU, memory, block IO and network statistics of a container from a
+    single sample of the docker stats stream.
+
+    Returns:
+    --------
+    metrics: dict
+        Metric names and their values
+    """
+    stats = container.stats(stream=False)
+    metrics = {}
+
+    cpu = stats.get("cpu_stats", {})
+    precpu = stats.get("precpu_stats", {})
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get(
+        "cpu_usage", {}
+    ).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online_cpus = cpu.get("online_cpus", 1)
+
+    metrics["cpu_percent"] = (
+        100.0 * cpu_delta / system_delta * online_cpus if system_delta > 0 else 0.0
+    )
+    metrics["cpu_seconds_total"] = cpu.get("cpu_usage", {}).get("total_usage", 0) / 1e9
+
+    memory = stats.get("memory_stats", {})
+    metrics["memory_usage_bytes"] = memory.get("usage", 0)
+    metrics["memory_limit_bytes"] = memory.get("limit", 0)
+
+    io_read = io_write = 0
+    for entry in (stats.get("blkio_stats", {}) or {}).get(
+        "io_service_bytes_recursive"
+    ) or []:
+        if entry["op"].lower() == "read":
+            io_read += entry["value"]
+        elif entry["op"].lower() == "write":
+            io_write += entry["value"]
+
+    metrics["io_read_bytes_total"] = io_read
+    metrics["io_write_bytes_total"] = io_write
+
+    networks = (stats.get("networks") or {}).values()
+    metrics["network_receive_bytes_total"] = sum(n["rx_bytes"] for n in networks)
+    metrics["network_transmit_bytes_total"] = sum(n["tx_bytes"] for n in networks)
+
+    return metrics
+
+
+def redis_metrics(redis_container):
+    """
+    Cache statistics from the INFO command of a Redis container.
+    """
+    (exit_code, output) = redis_container.exec_run("redis-cli INFO")
+
+    if exit_code != 0:
+        return {}
+
+    info = {}
+    for line in output.decode("utf8").splitlines():
+        if ":" in line and not line.startswith("#"):
+            (key, value) = line.split(":", 1)
+            info[key] = value.strip()
+
+    metrics = {}
+    for field in REDIS_INFO_FIELDS:
+        if field in info:
+            metrics[field] = float(info[field])
+
+    hits = metrics.get("keyspace_hits", 0)
+    misses = metrics.get("keyspace_misses", 0)
+    metrics["hit_ratio"] = hits / (hits + misses) if hits + misses > 0 else 0.0
+
+    return metrics
+
+
+def quantile(values, q):
+    """
+    The q-th quantile of a sorted list of values (nearest rank)
+    """
+    if not values:
+        return 0.0
+
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LogLatencies:
+    """
+    Request latencies parsed from the server logs of instances.
+
+    Every call to ``collect`` only reads the part of a log written since
+    the previous call. The first time an instance is seen, only the
+    end of its log is read.
+    """
+
+    def __init__(self):
+        self.offsets = {}
+        # the number and total latency of the requests seen so far for
+        # each instance and endpoint
+        self.totals = {}
+
+    def collect(self, hg_name):
+        """
+        Parse the requests logged by an instance since the last call.
+
+        Returns:
+        --------
+        latencies: dict
+            For each API endpoint, the number of requests and the mean
+            and quantiles of their latencies in seconds, and the number
+            and total latency of all of the requests seen so far
+        """
+        log_path = get_log_path(hg_name)
+
+        if not op.exists(log_path):
+            return {}
+
+        size = op.getsize(log_path)
+        offset = self.offsets.get(hg_name, max(0, size - INITIAL_LOG_BYTES))
+        if offset > size:
+            # the log was rotated or truncated
+            offset = 0
+
+        durations = {}
+        with open(log_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+
+        # leave incomplete lines for the next call
+        end = data.rfind(b"\n") + 1
+        self.offsets[hg_name] = offset + end
+
+        for line in data[:end].decode("utf8", "replace").splitlines():
+            match = REQUEST_PATTERN.search(line)
+            if match is None:
+                continue
+
+            endpoint = match.group(1).split("?")[0]
+            durations.setdefault(endpoint, []).append(int(match.group(2)) / 1000)
+
+        totals = self.totals.setdefault(hg_name, {})
+        latencies = {}
+        for (endpoint, values) in durations.items():
+            values.sort()
+            (total_count, total_seconds) = totals.get(endpoint, (0, 0.0))
+            totals[endpoint] = (total_count + len(values), total_seconds + sum(values))
+
+            latencies[endpoint] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "quantiles": {str(q): quantile(values, q) for q in LATENCY_QUANTILES},
+                "total_count": totals[endpoint][0],
+                "total_seconds": totals[endpoint][1],
+            }
+
+        return latencies
+
+
+def collect_metrics(log_latencies):
+    """
+    Collect metrics for every running instance.
+
+    Returns:
+    --------
+    metrics: dict
+        Metrics for each instance keyed by instance name
+    """
+    metrics = {}
+
+    def sample(found):
+        (role, _, container) = found
+        sampled = {role: container_metrics(container)}
+
+        if role == "redis":
+            sampled["redis_cache"] = redis_metrics(container)
+
+        return sampled
+
+    # docker takes a couple of seconds to sample the statistics of each
+    # container, so the containers are sampled at the same time
+    instances = list(find_instances())
+    with ThreadPoolExecutor(max_workers=STATS_THREADS) as executor:
+        samples = list(executor.map(sample, instances))
+
+    for ((role, hg_name, _), sampled) in zip(instances, samples):
+        instance = metrics.setdefault(hg_name, {})
+        instance.update(sampled)
+
+        if role != "redis":
+            instance["requests"] = log_latencies.collect(hg_name)
+
+    return metrics
+
+
+def format_prometheus(metrics):
+    """
+    Format collected metrics using the Prometheus text exposition format.
+    The samples of each metric family are grouped under its HELP and TYPE
+    lines.
+    """
+    # the samples of each metric family in the order they were first seen
+    families = {}
+
+    def add(family, labels, value, suffix=""):
+        label_text = ",".join(
+            '{}="{}"'.format(k, str(v).replace('"', '\\"'))
+            for (k, v) in sorted(labels.items())
+        )
+        families.setdefault(family, []).append(
+            "higlass_{}{}{{{}}} {}".format(family, suffix, label_text, value)
+        )
+
+    for (hg_name, instance) in sorted(metrics.items()):
+        for role in ["higlass", "redis"]:
+            for (name, value) in sorted(instance.get(role, {}).items()):
+                add("container_" + name, {"instance": hg_name, "role": role}, value)
+
+        for (name, value) in sorted(instance.get("redis_cache", {}).items()):
+            add("redis_" + name, {"instance": hg_name}, value)
+
+        for (endpoint, latency) in sorted(instance.get("requests", {}).items()):
+            labels = {"instance": hg_name, "endpoint": endpoint}
+            for (q, value) in sorted(latency["quantiles"].items()):
+                add("request_latency_seconds", dict(labels, quantile=q), value)
+            add("request_latency_seconds", labels, latency["total_count"], "_count")
+            add("request_latency_seconds", labels, latency["total_seconds"], "_sum")
+
+    lines = []
+    for (family, samples) in families.items():
+        (metric_type, description) = METRIC_FAMILIES.get(family, ("untyped", None))
+
+        if description is not None:
+            lines.append("# HELP higlass_{} {}".format(family, description))
+        lines.append("# TYPE higlass_{} {}".format(family, metric_type))
+        lines += samples
+
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(text, output):
+    if output is None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+
+    # replace the file atomically so that readers never see a partial file
+    temp_output = "{}.{}.tmp".format(output, os.getpid())
+    with open(temp_output, "w") as f:
+        f.write(text)
+    os.replace(temp_output, output)
+
+
+@click.command()
+@click.option(
+    "--format",
+    "output_format",
+    default="prometheus",
+    type=click.Choice(["prometheus", "json"]),
+    help="The format to write metrics in",
+)
+@click.option(
+    "--output",
+    default=None,
+    help="The file to write metrics to (e.g. for the Prometheus node exporter's textfile collector). Metrics are written to stdout if this isn't provided.",
+)
+@click.option(
+    "--interval",
+    default=None,
+    type=float,
+    help="Collect metrics every INTERVAL seconds until interrupted instead of once",
+)
+def metrics(output_format, output, interval):
+    """
+    Collect resource usage, Redis cache and request latency metrics for
+    all running instances.
+
+    Request latencies are parsed from the server logs. On every
+    collection they cover the requests logged since the previous one.
+    """
+    log_latencies = LogLatencies()
+
+    while True:
+        collected = collect_metrics(log_latencies)
+
+        if output_format == "json":
+            text = json.dumps({"timestamp": time.time(), "instances": collected}) + "\n"
+        else:
+            text = format_prometheus(collected)
+
+        write_metrics(text, output)
+
+        if interval is None:
+            break
+
+        time.sleep(interval)
@@ -0,0 +1,239 @@
+import os
+import os.path as op
+import re
+import sys
+import time
+
+from higlass_manage.common import LABEL_PREFIX
+from higlass_manage.common import REDIS_PREFIX
+
+# the share of the host's memory that all Redis instances together may use
+REDIS_MEMORY_FRACTION = 0.5
+# the label holding the memory fraction of Redis containers whose maxmemory
+# is sized automatically, so that they can be resized as instances come and go
+MEMORY_FRACTION_LABEL = "{}.redis-memory-fraction".format(LABEL_PREFIX)
+
+EVICTION_POLICIES = [
+    "allkeys-lru",
+    "allkeys-lfu",
+    "allkeys-random",
+    "volatile-lru",
+    "volatile-lfu",
+    "volatile-random",
+    "volatile-ttl",
+    "noeviction",
+]
+
+# cgroup v2 and v1 memory limits of the current process
+CGROUP_MEMORY_LIMITS = [
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+]
+
+# configuration directives which are generated rather than taken from the template
+GENERATED_DIRECTIVES = [
+    "maxmemory",
+    "maxmemory-policy",
+    "lfu-log-factor",
+    "lfu-decay-time",
+    "save",
+    "appendonly",
+]
+
+MEMORY_UNITS = {
+    "": 1,
+    "b": 1,
+    "k": 1000,
+    "kb": 1024,
+    "m": 1000 ** 2,
+    "mb": 1024 ** 2,
+    "g": 1000 ** 3,
+    "gb": 1024 ** 3,
+}
+
+
+def parse_memory(value):
+    """
+    Convert a memory size using Redis' units (e.g. "8gb", "500mb" or
+    "1000000") to a number of bytes.
+    """
+    match = re.match(r"^\s*(\d+)\s*([a-z]*)\s*$", str(value).lower())
+
+    if match is None or match.group(2) not in MEMORY_UNITS:
+        raise ValueError("Invalid memory size: {}".format(value))
+
+    return int(match.group(1)) * MEMORY_UNITS[match.group(2)]
+
+
+def get_memory_limit():
+    """
+    The amount of memory available on this host in bytes: the physical
+    memory or the cgroup memory limit if one is set and it is lower.
+    """
+    limit = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+    for path in CGROUP_MEMORY_LIMITS:
+        try:
+            with open(path, "r") as f:
+                value = f.read().strip()
+        except (IOError, OSError):
+            continue
+
+        if value.isdigit():
+            limit = min(limit, int(value))
+
+    return limit
+
+
+def count_redis_instances(client, hg_name):
+    """
+    The number of Redis-backed instances on this host including the
+    instance ``hg_name``, whether or not it is running yet.
+    """
+    # the low-level call lists containers without inspecting each of them
+    redis_names = set(
+        container["Names"][0].lstrip("/")
+        for container in client.api.containers(filters={"name": REDIS_PREFIX})
+    )
+    redis_names.add("{}-{}".format(REDIS_PREFIX, hg_name))
+
+    return len(redis_names)
+
+
+def auto_maxmemory(num_instances, fraction=REDIS_MEMORY_FRACTION):
+    """
+    Split ``fraction`` of the host's memory evenly between ``num_instances``
+    Redis instances.
+    """
+    return int(get_memory_limit() * fraction / max(num_instances, 1))
+
+
+def rebalance_maxmemory(client):
+    """
+    Split the memory between the running Redis instances again, e.g.
+    after an instance was started. Every automatically sized instance
+    gets ``auto_maxmemory`` of the current number of instances, which is
+    applied with ``CONFIG SET`` so that it doesn't need to be restarted.
+
+    Instances whose maxmemory was given explicitly are left alone.
+
+    Returns:
+    --------
+    resized: [(str, int)]
+        (container name, maxmemory) for every instance that was resized
+    """
+    containers = client.containers.list(filters={"label": MEMORY_FRACTION_LABEL})
+    num_instances = len(
+        client.api.containers(filters={"name": REDIS_PREFIX}, quiet=True)
+    )
+
+    resized = []
+    for container in containers:
+        try:
+            fraction = float(container.labels[MEMORY_FRACTION_LABEL])
+        except ValueError:
+            continue
+
+        maxmemory = auto_maxmemory(num_instances, fraction)
+        (exit_code, output) = container.exec_run(
+            "redis-cli CONFIG SET maxmemory {}".format(maxmemory)
+        )
+
+        if exit_code != 0 or b"OK" not in output:
+            sys.stderr.write(
+                "Warning: Could not resize Redis {}: {}\n".format(
+                    container.name, output.decode("utf8").strip()
+                )
+            )
+            continue
+
+        resized.append((container.name, maxmemory))
+
+    return resized
+
+
+def redis_settings(
+    maxmemory,
+    maxmemory_policy="allkeys-lru",
+    lfu_log_factor=None,
+    lfu_decay_time=None,
+    persistence=True,
+):
+    """
+    The Redis configuration directives controlling memory use, eviction
+    and persistence.
+
+    Returns:
+    --------
+    settings: [(str, str)]
+        (directive, value) pairs
+    """
+    settings = [
+        ("maxmemory", str(maxmemory)),
+        ("maxmemory-policy", maxmemory_policy),
+    ]
+
+    if lfu_log_factor is not None:
+        settings.append(("lfu-log-factor", str(lfu_log_factor)))
+    if lfu_decay_time is not None:
+        settings.append(("lfu-decay-time", str(lfu_decay_time)))
+
+    if not persistence:
+        settings.append(("save", '""'))
+        settings.append(("appendonly", "no"))
+
+    return settings
+
+
+def write_redis_conf(template, output_file, settings):
+    """
+    Write a Redis configuration file consisting of the directives from
+    ``template`` which aren't generated followed by ``settings``.
+    """
+    with open(template, "r") as f:
+        lines = [
+            line.rstrip("\n")
+            for line in f
+            if line.split()[:1] == []
+            or line.split()[0].lower() not in GENERATED_DIRECTIVES
+        ]
+
+    lines += ["{} {}".format(directive, value) for (directive, value) in settings]
+
+    with open(output_file, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def check_redis_config(redis_container, settings, attempts=10):
+    """
+    Compare the configuration of a running Redis container with the
+    requested settings.
+
+    Returns:
+    --------
+    mismatches: [(str, str, str)]
+        (directive, requested value, running value) for every directive
+        whose running value differs from the requested one
+    """
+    for _ in range(attempts):
+        (exit_code, output) = redis_container.exec_run("redis-cli ping")
+        if exit_code == 0 and b"PONG" in output:
+            break
+        time.sleep(0.5)
+
+    mismatches = []
+    for (directive, value) in settings:
+        (exit_code, output) = redis_container.exec_run(
+            "redis-cli CONFIG GET {}".format(directive)
+        )
+        lines = output.decode("utf8").splitlines()
+        running = lines[1] if exit_code == 0 and len(lines) > 1 else None
+
+        requested = "" if value == '""' else value
+        if directive == "maxmemory":
+            requested = str(parse_memory(requested))
+
+        if running != requested:
+            mismatches.append((directive, requested, running))
+
+    return mismatches
@@ -1,8 +1,7 @@
 import click
-import docker
 import subprocess as sp
 
-from higlass_manage.common import hg_name_to_container_name
+from higlass_manage.common import get_docker_client, hg_name_to_container_name
 
 
 @click.command()
@@ -16,7 +15,7 @@ def shell(hg_name):
     else:
         hg_name = hg_name[0]
 
-    client = docker.from_env()
+    client = get_docker_client()
     container_name = hg_name_to_container_name(hg_name)
     container = client.containers.get(container_name)
 
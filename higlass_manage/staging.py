@@ -0,0 +1,187 @@
+import os
+import os.path as op
+import sys
+import time
+
+# ioctl request which clones a file using copy-on-write (FICLONE)
+FICLONE = 0x40049409
+# how much to copy at once when a file has to be copied
+COPY_CHUNK_SIZE = 64 * 2 ** 20
+# how often to report progress while copying, in seconds
+PROGRESS_INTERVAL = 1
+
+
+def stage_file(filepath, to_import_path, media_dir=None):
+    """
+    Make a file available to a higlass container for ingestion, using
+    the cheapest strategy that works:
+
+    1. hardlink: link the file into the instance's temp directory
+    2. reflink: clone it into the temp directory using copy-on-write
+    3. in-place: if the file is already inside the directory mounted as
+       the instance's media root, let the server use it where it is
+    4. copy: copy it into the temp directory, using copy_file_range
+       where available, reporting progress along the way
+
+    The strategy used and how long it took are printed.
+
+    Parameters:
+    ----------
+    filepath: str
+        The file to stage
+    to_import_path: str
+        Where the file should be placed in the instance's temp directory
+    media_dir: (str, str)
+        The host directory mounted as the instance's media root and the
+        media root in the container (can be None)
+
+    Returns:
+    --------
+    (strategy, path): (str, str)
+        The name of the strategy used and the path of the staged file.
+        For the in-place strategy this is the file's path inside the
+        container and it should be ingested without uploading it.
+    """
+    t1 = time.time()
+    size = op.getsize(filepath)
+
+    (strategy, path) = _stage_file(filepath, to_import_path, media_dir)
+
+    elapsed = time.time() - t1
+    print(
+        "Staged {} using {} ({:.1f} MB in {:.2f}s)".format(
+            filepath, strategy, size / 2 ** 20, elapsed
+        )
+    )
+
+    return (strategy, path)
+
+
+def _stage_file(filepath, to_import_path, media_dir):
+    try:
+        os.link(filepath, to_import_path)
+        return ("hardlink", to_import_path)
+    except OSError:
+        pass
+
+    try:
+        reflink(filepath, to_import_path)
+        return ("reflink", to_import_path)
+    except OSError:
+        pass
+
+    if media_dir is not None:
+        (host_media_dir, container_media_dir) = media_dir
+        host_media_dir = op.realpath(host_media_dir)
+        real_filepath = op.realpath(filepath)
+
+        if real_filepath.startswith(host_media_dir + os.sep):
+            relative_path = op.relpath(real_filepath, host_media_dir)
+            return ("in-place", op.join(container_media_dir, relative_path))
+
+    strategy = copy_file(filepath, to_import_path)
+    return (strategy, to_import_path)
+
+
+def reflink_or_copy(src, dst):
+    """
+    Place a copy of a file at ``dst`` using a reflink or, if that isn't
+    supported, by copying it. Unlike a hardlink, the copy doesn't change
+    when the original is later written to in place.
+
+    Returns:
+    --------
+    strategy: str
+        The name of the strategy used
+    """
+    try:
+        reflink(src, dst)
+        return "reflink"
+    except OSError:
+        pass
+
+    return copy_file(src, dst)
+
+
+def reflink(src, dst):
+    """
+    Clone a file using a copy-on-write reflink. Raises OSError if the
+    filesystem doesn't support it or the files are on different
+    filesystems.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if op.exists(dst):
+            os.remove(dst)
+        raise
+
+
+def copy_file(src, dst, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Copy a file in chunks, reporting the progress and throughput. The
+    data is copied in the kernel using copy_file_range when possible.
+    Raises OSError if fewer bytes than the size of the source could be
+    copied.
+
+    Returns:
+    --------
+    strategy: str
+        "copy_file_range" or "copy" depending on how the data was copied
+    """
+    size = op.getsize(src)
+    use_copy_file_range = hasattr(os, "copy_file_range")
+    copied = 0
+
+    t1 = time.time()
+    last_report = t1
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        while copied < size:
+            if use_copy_file_range:
+                try:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), chunk_size)
+                except OSError:
+                    # both file positions have advanced by the amount
+                    # copied so far so we can carry on with regular reads
+                    use_copy_file_range = False
+                    fsrc.seek(copied)
+                    fdst.seek(copied)
+                    continue
+            else:
+                n = fdst.write(fsrc.read(chunk_size))
+
+            if n == 0:
+                if use_copy_file_range:
+                    # some filesystems report that nothing could be copied
+                    # in the kernel, so copy the rest with regular reads
+                    use_copy_file_range = False
+                    fsrc.seek(copied)
+                    fdst.seek(copied)
+                    continue
+
+                break
+
+            copied += n
+
+            now = time.time()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                sys.stderr.write(
+                    "Copied {:.1f} of {:.1f} MB ({:.1f} MB/s)\n".format(
+                        copied / 2 ** 20, size / 2 ** 20, copied / 2 ** 20 / (now - t1)
+                    )
+                )
+
+    if copied < size:
+        # the source was truncated while it was being copied
+        os.remove(dst)
+        raise OSError("Only copied {} of {} bytes of {}".format(copied, size, src))
+
+    return "copy_file_range" if use_copy_file_range else "copy"
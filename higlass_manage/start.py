@@ -1,11 +1,15 @@
 import click
 import docker
+import hashlib
 import json
 import os
 import os.path as op
 import requests
+import re
+import shlex
 import slugid
 import sys
+import threading
 import time
 
 from higlass_manage.common import (
@@ -13,7 +17,47 @@ from higlass_manage.common import (
     NETWORK_PREFIX,
     REDIS_PREFIX,
     REDIS_CONF,
+    StartError,
+    forget_instance_info,
+    get_docker_client,
+    instance_labels,
+    read_state_file,
+    write_state_file,
 )
+from higlass_manage.redis_config import (
+    EVICTION_POLICIES,
+    MEMORY_FRACTION_LABEL,
+    REDIS_MEMORY_FRACTION,
+    auto_maxmemory,
+    check_redis_config,
+    count_redis_instances,
+    parse_memory,
+    rebalance_maxmemory,
+    redis_settings,
+    write_redis_conf,
+)
+from higlass_manage.warmup import (
+    WARM_UP_TIME_BUDGET,
+    WARM_UP_ZOOM_LEVELS,
+    warm_up_and_report,
+)
+
+# how long to wait for a newly started server to respond
+STARTUP_TIMEOUT = 300
+# the longest interval between two readiness checks
+MAX_READINESS_BACKOFF = 2
+# when to pull images from the registry
+PULL_POLICIES = ["always", "if-missing", "never"]
+# the images used by each instance are recorded in this state file
+IMAGES_STATE_FILE = "images.json"
+# images with patched javascript assets are stored in this repository
+PATCHED_IMAGE_REPOSITORY = "higlass-manage-patched"
+# change this whenever the patches applied by _patch_commands change
+PATCH_VERSION = 1
+# serializes updates of the images state file when starting instances concurrently
+_images_lock = threading.Lock()
+# container log lines which indicate that the server may be ready
+READY_LOG_PATTERN = re.compile(r"WSGI app \d+ .* ready|spawned uWSGI worker")
 
 
 @click.command()
@@ -113,6 +157,69 @@ from higlass_manage.common import (
 @click.option(
     "--redis-port", default=6379, help="The port to use for the Redis image", type=int
 )
+@click.option(
+    "--redis-maxmemory",
+    default="auto",
+    help='The maximum amount of memory Redis may use (e.g. "4gb"). "auto" splits a share of the host\'s memory between all Redis-backed instances.',
+    type=str,
+)
+@click.option(
+    "--redis-memory-fraction",
+    default=REDIS_MEMORY_FRACTION,
+    help="The share of the host's memory used by all Redis instances together when --redis-maxmemory is auto",
+    type=float,
+)
+@click.option(
+    "--redis-maxmemory-policy",
+    default="allkeys-lru",
+    help="The policy Redis uses to evict keys when it reaches its maximum memory",
+    type=click.Choice(EVICTION_POLICIES),
+)
+@click.option(
+    "--redis-lfu-log-factor",
+    default=None,
+    help="The Redis LFU counter logarithm factor (only used by LFU eviction policies)",
+    type=int,
+)
+@click.option(
+    "--redis-lfu-decay-time",
+    default=None,
+    help="The Redis LFU counter decay time in minutes (only used by LFU eviction policies)",
+    type=int,
+)
+@click.option(
+    "--redis-persistence/--no-redis-persistence",
+    default=True,
+    help="Periodically save the Redis cache to disk",
+)
+@click.option(
+    "--pull",
+    default="always",
+    type=click.Choice(PULL_POLICIES),
+    help="When to pull images from the registry. With if-missing and never, the image recorded for this instance or a local image with the requested tag is used.",
+)
+@click.option(
+    "--startup-timeout",
+    default=STARTUP_TIMEOUT,
+    help="The number of seconds to wait for the server to respond before giving up",
+    type=float,
+)
+@click.option(
+    "--warm-up",
+    multiple=True,
+    help="Warm up the tile cache of a tileset before announcing the instance (can be repeated, use 'all' for every tileset)",
+)
+@click.option(
+    "--warm-up-zoom-levels",
+    default=WARM_UP_ZOOM_LEVELS,
+    help="The number of lowest resolution zoom levels to warm up",
+)
+@click.option(
+    "--warm-up-time-budget",
+    default=WARM_UP_TIME_BUDGET,
+    type=float,
+    help="The maximum number of seconds to spend warming up the cache",
+)
 def start(
     temp_dir,
     data_dir,
@@ -130,25 +237,369 @@ def start(
     redis_repository,
     redis_tag,
     redis_port,
+    redis_maxmemory,
+    redis_memory_fraction,
+    redis_maxmemory_policy,
+    redis_lfu_log_factor,
+    redis_lfu_decay_time,
+    redis_persistence,
+    pull,
+    startup_timeout,
+    warm_up,
+    warm_up_zoom_levels,
+    warm_up_time_budget,
 ):
-    _start(
-        temp_dir,
-        data_dir,
-        version,
-        port,
-        hg_name,
-        site_url,
-        media_dir,
-        public_data,
-        default_track_options,
-        workers,
-        use_redis,
-        redis_dir,
-        hg_repository,
-        redis_repository,
-        redis_tag,
-        redis_port,
+    from higlass_manage.api import Manager
+
+    try:
+        Manager().start(
+            hg_name,
+            temp_dir=temp_dir,
+            data_dir=data_dir,
+            version=version,
+            port=port,
+            site_url=site_url,
+            media_dir=media_dir,
+            public_data=public_data,
+            default_track_options=default_track_options,
+            workers=workers,
+            use_redis=use_redis,
+            redis_dir=redis_dir,
+            hg_repository=hg_repository,
+            redis_repository=redis_repository,
+            redis_tag=redis_tag,
+            redis_port=redis_port,
+            redis_maxmemory=redis_maxmemory,
+            redis_memory_fraction=redis_memory_fraction,
+            redis_maxmemory_policy=redis_maxmemory_policy,
+            redis_lfu_log_factor=redis_lfu_log_factor,
+            redis_lfu_decay_time=redis_lfu_decay_time,
+            redis_persistence=redis_persistence,
+            pull=pull,
+            startup_timeout=startup_timeout,
+            warm_up=warm_up,
+            warm_up_zoom_levels=warm_up_zoom_levels,
+            warm_up_time_budget=warm_up_time_budget,
+        )
+    except StartError:
+        sys.exit(-1)
+
+
+class PhaseTimer:
+    """
+    Record how long each phase of a multi-step operation takes.
+    """
+
+    def __init__(self):
+        self.timings = []
+        self.start_time = time.time()
+        self.phase_start = self.start_time
+
+    def mark(self, phase):
+        """
+        Record that a phase ended now. The phase is taken to have
+        started when the previous one ended.
+        """
+        now = time.time()
+        self.timings.append((phase, now - self.phase_start))
+        self.phase_start = now
+
+    def report(self, out=sys.stderr):
+        for (phase, elapsed) in self.timings:
+            out.write("  {:<24} {:8.2f}s\n".format(phase, elapsed))
+        out.write("  {:<24} {:8.2f}s\n".format("total", time.time() - self.start_time))
+
+
+def _resolve_image(client, hg_name, role, repository, tag, pull="always"):
+    """
+    Find the image to use for one of an instance's containers and
+    record it so that later starts can reuse it.
+
+    Parameters:
+    ----------
+    client: docker.DockerClient
+        The docker client
+    hg_name: str
+        The name of the higlass instance
+    role: str
+        The role of the container ("higlass" or "redis")
+    repository: str
+        The repository of the image
+    tag: str
+        The tag of the image
+    pull: str
+        One of PULL_POLICIES. With "if-missing" and "never" the image
+        recorded for this instance or a local image with the same tag
+        is used without contacting the registry. With "if-missing" the
+        image is pulled if there is no such image.
+
+    Returns:
+    --------
+    image: docker.models.images.Image
+        The image. Raises docker.errors.ImageNotFound if the policy is
+        "never" and the image isn't available locally.
+    """
+    reference = "{}:{}".format(repository, tag)
+    images = read_state_file(IMAGES_STATE_FILE)
+    image = None
+
+    if pull != "always":
+        recorded = images.get(hg_name, {}).get(role)
+
+        try:
+            if recorded is not None and recorded["reference"] == reference:
+                image = client.images.get(recorded["id"])
+            else:
+                image = client.images.get(reference)
+        except docker.errors.ImageNotFound:
+            if pull == "never":
+                raise
+
+    if image is None:
+        sys.stderr.write("Pulling {}\n".format(reference))
+        sys.stderr.flush()
+        image = client.images.pull(repository, tag=tag)
+        sys.stderr.write("done\n")
+        sys.stderr.flush()
+    else:
+        sys.stderr.write("Using local image {} ({})\n".format(reference, image.id))
+
+    with _images_lock:
+        # re-read the state in case another instance was started in the meantime
+        images = read_state_file(IMAGES_STATE_FILE)
+        images.setdefault(hg_name, {})[role] = {
+            "reference": reference,
+            "id": image.id,
+            "digests": image.attrs.get("RepoDigests", []),
+        }
+        write_state_file(IMAGES_STATE_FILE, images)
+
+    return image
+
+
+def _patch_commands(public_data, default_options_json):
+    """
+    The shell commands used to patch the javascript bundle of the
+    higlass client.
+
+    Parameters:
+    ----------
+    public_data: bool
+        If False, make the client load the "default_local" viewconf
+        instead of the default one
+    default_options_json: dict
+        Default track options to add to the client (can be None)
+
+    Returns:
+    --------
+    commands: [str]
+        Commands to run from the image's working directory
+    """
+    main_js = "higlass-app/static/js/main.*.chunk.js"
+    precache_manifest = "higlass-app/precache-manifest.*.js"
+    commands = []
+
+    if not public_data or default_options_json is not None:
+        # we're going to be changing the higlass js file so first we copy it to a location
+        # with a new hash
+        commands.append(
+            "cp {} higlass-app/static/js/main.{}.chunk.js".format(
+                main_js, slugid.nice()
+            )
+        )
+
+    if not public_data:
+        commands.append(
+            "sed -i {} {}".format(shlex.quote('s/"default"/"default_local"/g'), main_js)
+        )
+
+    if default_options_json is not None:
+        sed_expression = "s/assign({{}},this.props.options/assign({{defaultOptions: {} }},this.props.options/g".format(
+            json.dumps(default_options_json)
+        )
+        commands.append("sed -i {} {}".format(shlex.quote(sed_expression), main_js))
+
+    commands.append(
+        "sed -i {} {}".format(
+            shlex.quote("s/main.*.chunk.js/main.invalid.chunk.js/g"), precache_manifest
+        )
     )
+    commands.append(
+        "sed -i {} {}".format(
+            shlex.quote("s/index.html/index_invalidated_by_higlass_manage/g"),
+            precache_manifest,
+        )
+    )
+
+    return commands
+
+
+def _patched_image(client, base_image, public_data, default_options_json):
+    """
+    Return an image derived from ``base_image`` whose javascript assets
+    have been patched according to the given options.
+
+    Patched images are tagged with a hash of the base image id and the
+    options so that they are only built once and reused by subsequent
+    starts. This way the server never serves a partially patched bundle.
+
+    Raises docker.errors.ContainerError if the assets can't be patched.
+    """
+    options = {
+        "base_image": base_image.id,
+        "public_data": public_data,
+        "default_track_options": default_options_json,
+        "patch_version": PATCH_VERSION,
+    }
+    key = hashlib.sha256(
+        json.dumps(options, sort_keys=True).encode("utf8")
+    ).hexdigest()[:24]
+    reference = "{}:{}".format(PATCHED_IMAGE_REPOSITORY, key)
+
+    try:
+        image = client.images.get(reference)
+        sys.stderr.write("Using patched image {}\n".format(reference))
+        return image
+    except docker.errors.ImageNotFound:
+        pass
+
+    sys.stderr.write("Building patched image {}\n".format(reference))
+    script = " && ".join(_patch_commands(public_data, default_options_json))
+    container = client.containers.run(
+        base_image, entrypoint=["bash", "-c", script], detach=True
+    )
+
+    try:
+        result = container.wait()
+
+        if result["StatusCode"] != 0:
+            raise docker.errors.ContainerError(
+                container,
+                result["StatusCode"],
+                script,
+                base_image,
+                container.logs(stdout=False, stderr=True),
+            )
+
+        # restore the entrypoint and command of the base image
+        config = base_image.attrs["Config"]
+        image = container.commit(
+            repository=PATCHED_IMAGE_REPOSITORY,
+            tag=key,
+            changes=[
+                "ENTRYPOINT {}".format(json.dumps(config.get("Entrypoint") or [])),
+                "CMD {}".format(json.dumps(config.get("Cmd") or [])),
+            ],
+        )
+    finally:
+        container.remove()
+
+    return image
+
+
+def _wait_for_server(container, port, timeout=STARTUP_TIMEOUT, session=None):
+    """
+    Wait for the higlass server in a newly started container to respond.
+
+    The container's log output is followed in a background thread and
+    the server is checked as soon as a line indicating that it may be
+    ready appears. In between, it is polled with an exponential backoff.
+
+    Parameters:
+    ----------
+    container: docker.models.containers.Container
+        The higlass container
+    port: int
+        The port that the server is exposed on
+    timeout: float
+        The number of seconds to wait before giving up
+    session: requests.Session
+        The session used to check the server. A new one is created if
+        this is None.
+
+    Returns:
+    --------
+    (req, exited): (requests.Response, bool)
+        The response to the first successful request for the default
+        viewconf or None if the server didn't become ready in time or
+        the container exited, and whether the container exited.
+    """
+    url = "http://localhost:{}/api/v1/viewconfs/?d=default".format(port)
+    if session is None:
+        session = requests.Session()
+
+    log_event = threading.Event()
+    exited = threading.Event()
+    stopped = threading.Event()
+
+    try:
+        log_stream = container.logs(stream=True, follow=True)
+    except Exception:
+        # fall back to polling if the logs can't be followed
+        log_stream = None
+
+    def follow_logs():
+        try:
+            for line in log_stream:
+                if READY_LOG_PATTERN.search(line.decode("utf8", "replace")):
+                    log_event.set()
+        except Exception:
+            return
+
+        # the log stream only ends when the container stops or when we
+        # stop following it
+        if not stopped.is_set():
+            exited.set()
+            log_event.set()
+
+    follower = None
+    if log_stream is not None:
+        follower = threading.Thread(target=follow_logs, daemon=True)
+        follower.start()
+
+    deadline = time.time() + timeout
+    delay = 0.1
+    status = None
+    req = None
+
+    sys.stderr.write("Waiting for the server to start...\n")
+
+    try:
+        while not exited.is_set():
+            try:
+                ret = session.get(url, timeout=5)
+
+                if ret.status_code == 200:
+                    req = ret
+                    break
+
+                if ret.status_code != status:
+                    status = ret.status_code
+                    sys.stderr.write(
+                        "Non 200 status code returned ({}), waiting...\n".format(status)
+                    )
+            except requests.exceptions.ConnectionError:
+                pass
+            except requests.exceptions.Timeout:
+                pass
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            log_event.wait(min(delay, remaining))
+            log_event.clear()
+            delay = min(delay * 2, MAX_READINESS_BACKOFF)
+    finally:
+        # stop following the logs so that neither the thread nor its
+        # connection outlive the wait
+        stopped.set()
+
+        if log_stream is not None:
+            log_stream.close()
+            follower.join(timeout=1)
+
+    return (req, exited.is_set())
 
 
 def _start(
@@ -168,13 +619,30 @@ def _start(
     redis_repository="redis",
     redis_tag="5.0.3-alpine",
     redis_port=6379,
+    redis_maxmemory="auto",
+    redis_memory_fraction=REDIS_MEMORY_FRACTION,
+    redis_maxmemory_policy="allkeys-lru",
+    redis_lfu_log_factor=None,
+    redis_lfu_decay_time=None,
+    redis_persistence=True,
+    pull="always",
+    startup_timeout=STARTUP_TIMEOUT,
+    warm_up=None,
+    warm_up_zoom_levels=WARM_UP_ZOOM_LEVELS,
+    warm_up_time_budget=WARM_UP_TIME_BUDGET,
+    session=None,
 ):
     """
     Start a HiGlass instance
+
+    Requests to the new server are sent using ``session`` if one is
+    given. Raises StartError if the instance couldn't be started.
     """
+    timer = PhaseTimer()
     hg_container_name = "{}-{}".format(CONTAINER_PREFIX, hg_name)
 
-    client = docker.from_env()
+    client = get_docker_client()
+    forget_instance_info(hg_name)
 
     try:
         hg_container = client.containers.get(hg_container_name)
@@ -189,7 +657,9 @@ def _start(
         sys.stderr.write(
             "Error connecting to the Docker daemon, make sure it is started and you are logged in.\n"
         )
-        return
+        raise StartError("Failed to start {}".format(hg_name))
+
+    timer.mark("stop previous")
 
     if use_redis:
         network_name = "{}-{}".format(NETWORK_PREFIX, hg_name)
@@ -208,7 +678,7 @@ def _start(
             sys.stderr.write(
                 "Error: Could not access Docker network list to remove existing network.\n"
             )
-            sys.exit(-1)
+            raise StartError("Failed to start {}".format(hg_name))
 
         try:
             # https://docker-py.readthedocs.io/en/stable/networks.html
@@ -217,7 +687,7 @@ def _start(
             sys.stderr.write(
                 "Error: Could not access Docker network ({}).\n".format(err)
             )
-            sys.exit(-1)
+            raise StartError("Failed to start {}".format(hg_name))
 
         # clear up any running Redis container
         try:
@@ -231,14 +701,19 @@ def _start(
             sys.stderr.write(
                 "Error: Error connecting to the Docker daemon, make sure it is started and you are logged in.\n"
             )
-            sys.exit(-1)
+            raise StartError("Failed to start {}".format(hg_name))
 
-        # pull Redis image
-        sys.stderr.write("Pulling {}:{}\n".format(redis_repository, redis_tag))
-        sys.stderr.flush()
-        redis_image = client.images.pull(redis_repository, tag=redis_tag)
-        sys.stderr.write("done\n")
-        sys.stderr.flush()
+        try:
+            redis_image = _resolve_image(
+                client, hg_name, "redis", redis_repository, redis_tag, pull
+            )
+        except docker.errors.ImageNotFound as err:
+            sys.stderr.write(
+                "Error: Redis image is not available locally and --pull is never\n{}\n".format(
+                    err
+                )
+            )
+            raise StartError("Failed to start {}".format(hg_name))
 
         # set up Redis container settings and environment
         redis_dir = op.expanduser(redis_dir)
@@ -246,16 +721,53 @@ def _start(
         if not op.exists(redis_dir):
             os.makedirs(redis_dir)
 
-        redis_conf = os.path.join(
+        redis_conf_template = os.path.join(
             os.path.dirname(os.path.realpath(__file__)), "redis", "redis.conf"
         )
-        if not os.path.exists(redis_conf):
+        if not os.path.exists(redis_conf_template):
             sys.stderr.write(
                 "Error: Could not locate Redis configuration file [{}]\n".format(
-                    redis_conf
+                    redis_conf_template
                 )
             )
-            sys.exit(-1)
+            raise StartError("Failed to start {}".format(hg_name))
+
+        # generate this instance's configuration from the bundled one
+        if redis_maxmemory == "auto":
+            maxmemory = auto_maxmemory(
+                count_redis_instances(client, hg_name), redis_memory_fraction
+            )
+        else:
+            try:
+                maxmemory = parse_memory(redis_maxmemory)
+            except ValueError as err:
+                sys.stderr.write("Error: {}\n".format(err))
+                raise StartError("Failed to start {}".format(hg_name))
+
+        if "lfu" not in redis_maxmemory_policy and (
+            redis_lfu_log_factor is not None or redis_lfu_decay_time is not None
+        ):
+            sys.stderr.write(
+                "Warning: LFU settings have no effect with the {} policy\n".format(
+                    redis_maxmemory_policy
+                )
+            )
+
+        redis_conf_settings = redis_settings(
+            maxmemory,
+            redis_maxmemory_policy,
+            redis_lfu_log_factor,
+            redis_lfu_decay_time,
+            redis_persistence,
+        )
+        redis_conf = op.join(redis_dir, "redis-{}.conf".format(hg_name))
+        write_redis_conf(redis_conf_template, redis_conf, redis_conf_settings)
+
+        sys.stderr.write(
+            "Redis maxmemory: {:.2f} GB ({})\n".format(
+                maxmemory / 2 ** 30, redis_maxmemory_policy
+            )
+        )
 
         redis_volumes = {
             redis_dir: {"bind": "/data", "mode": "rw"},
@@ -263,6 +775,10 @@ def _start(
         }
 
         redis_command = "redis-server {}".format(REDIS_CONF)
+        redis_labels = instance_labels(hg_name, "redis", redis_port, redis_dir)
+
+        if redis_maxmemory == "auto":
+            redis_labels[MEMORY_FRACTION_LABEL] = str(redis_memory_fraction)
 
         try:
             # run Redis container
@@ -272,32 +788,71 @@ def _start(
                 name=redis_name,
                 network=network_name,
                 volumes=redis_volumes,
+                labels=redis_labels,
                 detach=True,
             )
         except docker.errors.ContainerError as err:
             sys.stderr.write(
                 "Error: Redis container could not be started\n{}\n".format(err)
             )
-            sys.exit(-1)
+            raise StartError("Failed to start {}".format(hg_name))
         except docker.errors.ImageNotFound as err:
             sys.stderr.write(
                 "Error: Redis container image could not be found\n{}\n".format(err)
             )
-            sys.exit(-1)
+            raise StartError("Failed to start {}".format(hg_name))
         except docker.errors.APIError as err:
             sys.stderr.write(
                 "Error: Redis container server ran into a fatal error\n{}\n".format(err)
             )
-            sys.exit(-1)
+            raise StartError("Failed to start {}".format(hg_name))
+
+        for (directive, requested, running) in check_redis_config(
+            redis_container, redis_conf_settings
+        ):
+            sys.stderr.write(
+                "Warning: Redis {} is {} but {} was requested\n".format(
+                    directive, running, requested
+                )
+            )
+
+        # the other instances were sized before this one existed
+        for (name, maxmemory) in rebalance_maxmemory(client):
+            sys.stderr.write(
+                "Redis maxmemory of {}: {:.2f} GB\n".format(name, maxmemory / 2 ** 30)
+            )
+
+        timer.mark("redis")
 
     if version == "local":
         hg_image = client.images.get("image-default")
     else:
-        sys.stderr.write("Pulling latest image... \n")
-        sys.stderr.flush()
-        hg_image = client.images.pull(hg_repository, version)
-        sys.stderr.write("done\n")
-        sys.stderr.flush()
+        try:
+            hg_image = _resolve_image(
+                client, hg_name, "higlass", hg_repository, version, pull
+            )
+        except docker.errors.ImageNotFound as err:
+            sys.stderr.write(
+                "Error: HiGlass image is not available locally and --pull is never\n{}\n".format(
+                    err
+                )
+            )
+            raise StartError("Failed to start {}".format(hg_name))
+
+    timer.mark("image resolution")
+
+    default_options_json = None
+    if default_track_options is not None:
+        with open(default_track_options, "r") as f:
+            default_options_json = json.load(f)
+
+    try:
+        hg_image = _patched_image(client, hg_image, public_data, default_options_json)
+    except docker.errors.ContainerError as err:
+        sys.stderr.write("Error: Could not patch the HiGlass assets\n{}\n".format(err))
+        raise StartError("Failed to start {}".format(hg_name))
+
+    timer.mark("asset patching")
 
     data_dir = op.expanduser(data_dir)
     temp_dir = op.expanduser(temp_dir)
@@ -337,6 +892,7 @@ def _start(
             volumes=hg_volumes,
             name=hg_container_name,
             environment=hg_environment,
+            labels=instance_labels(hg_name, "higlass", port, data_dir),
             detach=True,
         )
     else:
@@ -351,102 +907,65 @@ def _start(
             volumes=hg_volumes,
             name=hg_container_name,
             environment=hg_environment,
+            labels=instance_labels(hg_name, "higlass", port, data_dir),
             publish_all_ports=True,
             detach=True,
         )
 
     sys.stderr.write("Docker started: {}\n".format(hg_container_name))
+    timer.mark("container create")
 
-    started = False
-    counter = 1
-    while not started:
-        try:
-            sys.stderr.write("sending request {}\n".format(counter))
-            counter += 1
-            req = requests.get(
-                "http://localhost:{}/api/v1/viewconfs/?d=default".format(port),
-                timeout=5,
-            )
-            # sys.stderr.write("request returned {} {}\n".format(req.status_code, req.content))
+    # anything read about the instance while it was being replaced is stale
+    forget_instance_info(hg_name)
 
-            if req.status_code != 200:
-                sys.stderr.write(
-                    "Non 200 status code returned ({}), waiting...\n".format(
-                        req.status_code
-                    )
-                )
-                time.sleep(0.5)
-            else:
-                started = True
-        except requests.exceptions.ConnectionError:
-            sys.stderr.write("Waiting to start (tilesets)...\n")
-            time.sleep(0.5)
-        except requests.exceptions.ReadTimout:
-            sys.stderr.write("Request timed out\n")
-            time.sleep(0.5)
+    if session is None:
+        session = requests.Session()
 
-    sys.stderr.write("public_data: {}\n".format(public_data))
+    (req, exited) = _wait_for_server(hg_container, port, startup_timeout, session)
 
-    if not public_data or default_track_options is not None:
-        # we're going to be changing the higlass js file so first we copy it to a location
-        # with a new hash
-        new_hash = slugid.nice()
+    if exited:
+        sys.stderr.write(
+            "Error: The container exited before the server started. Check the output of 'higlass-manage logs {}'\n".format(
+                hg_name
+            )
+        )
+        raise StartError("Failed to start {}".format(hg_name))
 
-        sed_command = """bash -c 'cp higlass-app/static/js/main.*.chunk.js higlass-app/static/js/main.{}.chunk.js'""".format(
-            new_hash
+    if req is None:
+        sys.stderr.write(
+            "Error: The server didn't respond within {} seconds. Check the output of 'higlass-manage logs {}'\n".format(
+                startup_timeout, hg_name
+            )
         )
+        raise StartError("Failed to start {}".format(hg_name))
 
-        ret = hg_container.exec_run(sed_command)
+    timer.mark("server ready")
+
+    sys.stderr.write("public_data: {}\n".format(public_data))
 
     if not public_data:
         config = json.loads(req.content.decode("utf-8"))
         config["trackSourceServers"] = ["/api/v1"]
-        started = True
         # sys.stderr.write('config {}\n'.format(json.dumps(config, indent=2)))
         config = {"uid": "default_local", "viewconf": config}
 
         ret = hg_container.exec_run(
             """python higlass-server/manage.py shell --command="import tilesets.models as tm; o = tm.ViewConf.objects.get(uuid='default_local'); o.delete();" """
         )
-        ret = requests.post(
+        ret = session.post(
             "http://localhost:{}/api/v1/viewconfs/".format(port), json=config
         )
         sys.stderr.write("ret: {}\n".format(ret.content))
-        # ret = container.exec_run('echo "import tilesets.models as tm; tm.ViewConf.get(uuid={}default{}).delete()" | python higlass-server/manage.py shell'.format("'", "'"), tty=True)
-        ret = hg_container.exec_run(
-            """bash -c 'sed -i '"'"'s/"default"/"default_local"/g'"'"' higlass-app/static/js/main.*.chunk.js'""".format(
-                new_hash
-            )
+        timer.mark("default viewconf")
+
+    if warm_up:
+        warm_up_and_report(
+            port,
+            warm_up,
+            zoom_levels=warm_up_zoom_levels,
+            time_budget=warm_up_time_budget,
         )
-        sys.stderr.write("ret: {}\n".format(ret))
-
-    if default_track_options is not None:
-        with open(default_track_options, "r") as f:
-            default_options_json = json.load(f)
-
-            sed_command = """bash -c 'sed -i '"'"'s/assign({{}},this.props.options/assign({{defaultOptions: {} }},this.props.options/g'"'"' """.format(
-                json.dumps(default_options_json)
-            )
-            sed_command += " higlass-app/static/js/main.*.chunk.js'"
-            # sys.stderr.write("sed_command: {}\n".format(sed_command))
-
-            ret = hg_container.exec_run(sed_command)
-
-    # sys.stderr.write("ret: {}\n".format(ret))
-
-    sed_command = (
-        """bash -c 'sed -i '"'"'s/main.*.chunk.js/main.invalid.chunk.js/g'"'"' """
-    )
-    sed_command += " higlass-app/precache-manifest.*.js'"
-
-    ret = hg_container.exec_run(sed_command)
-    # sys.stderr.write("ret: {}\n".format(ret))
-
-    sed_command = """bash -c 'sed -i '"'"'s/index.html/index_invalidated_by_higlass_manage/g'"'"' """
-    sed_command += " higlass-app/precache-manifest.*.js'"
-
-    ret = hg_container.exec_run(sed_command)
-    # sys.stderr.write("ret: {}\n".format(ret))
-    sys.stderr.write("Replaced js file\n")
+        timer.mark("cache warm-up")
 
     sys.stderr.write("Started\n")
+    timer.report()
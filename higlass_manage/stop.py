@@ -2,7 +2,13 @@ import sys
 import click
 import docker
 
-from .common import CONTAINER_PREFIX, NETWORK_PREFIX, REDIS_PREFIX
+from .common import (
+    CONTAINER_PREFIX,
+    NETWORK_PREFIX,
+    REDIS_PREFIX,
+    forget_instance_info,
+    get_docker_client,
+)
 
 
 @click.command()
@@ -30,8 +36,13 @@ from .common import CONTAINER_PREFIX, NETWORK_PREFIX, REDIS_PREFIX
 def stop(
     names, remove_container, stop_redis, remove_network_bridge,
 ):
-    _stop(
-        names, remove_container, stop_redis, remove_network_bridge,
+    from higlass_manage.api import Manager
+
+    Manager().stop(
+        *names,
+        remove_container=remove_container,
+        stop_redis=stop_redis,
+        remove_network_bridge=remove_network_bridge,
     )
 
 
@@ -46,12 +57,14 @@ def _stop(
     containers/networks associated with a given higlass
     name.
     """
-    client = docker.from_env()
+    client = get_docker_client()
 
     if len(names) == 0:
         names = ("default",)
 
     for name in names:
+        forget_instance_info(name)
+
         # higlass container
         hm_name = "{}-{}".format(CONTAINER_PREFIX, name)
         try:
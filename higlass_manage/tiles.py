@@ -0,0 +1,165 @@
+import math
+import requests
+import time
+
+# the number of tilesets whose info is requested at once, which keeps the
+# query string of instances with many tilesets short enough to be accepted
+TILESET_INFO_CHUNK_SIZE = 50
+
+
+def api_url(port):
+    return "http://localhost:{}/api/v1".format(port)
+
+
+def get_tileset_info(
+    session, url, uids, timeout=10, chunk_size=TILESET_INFO_CHUNK_SIZE
+):
+    """
+    Fetch the tileset info for a set of tilesets, ``chunk_size`` tilesets
+    per request.
+
+    Parameters:
+    ----------
+    session: requests.Session
+        The session to send the requests with
+    url: str
+        The API url of the server (e.g. http://localhost:8989/api/v1)
+    uids: [str]
+        The uids of the tilesets
+
+    Returns:
+    --------
+    tileset_info: dict
+        The tileset info of each tileset keyed by uid. Tilesets which the
+        server doesn't know are missing.
+    """
+    uids = list(uids)
+    tileset_info = {}
+
+    for i in range(0, len(uids), chunk_size):
+        ret = session.get(
+            "{}/tileset_info/".format(url),
+            params={"d": uids[i : i + chunk_size]},
+            timeout=timeout,
+        )
+        ret.raise_for_status()
+
+        tileset_info.update(
+            (uid, info)
+            for (uid, info) in ret.json().items()
+            if isinstance(info, dict) and "error" not in info
+        )
+
+    return tileset_info
+
+
+def tileset_dimensions(info):
+    """
+    The number of dimensions of a tileset (1 for vector and bed-like
+    data, 2 for matrices and 2D annotations)
+    """
+    return len(info.get("min_pos", [0]))
+
+
+def tiles_per_dimension(info, zoom):
+    """
+    The number of tiles along each dimension that contain data at a
+    given zoom level.
+    """
+    num_tiles = 2**zoom
+
+    if "max_width" in info and "max_pos" in info and "min_pos" in info:
+        tile_width = info["max_width"] / num_tiles
+        extent = info["max_pos"][0] - info["min_pos"][0]
+        num_tiles = min(num_tiles, math.ceil(extent / tile_width))
+
+    return max(1, num_tiles)
+
+
+def zoom_level_tiles(uid, info, zoom):
+    """
+    The ids of all of a tileset's tiles at a zoom level
+    """
+    num_tiles = tiles_per_dimension(info, zoom)
+
+    if tileset_dimensions(info) == 1:
+        return ["{}.{}.{}".format(uid, zoom, x) for x in range(num_tiles)]
+
+    return [
+        "{}.{}.{}.{}".format(uid, zoom, x, y)
+        for x in range(num_tiles)
+        for y in range(num_tiles)
+    ]
+
+
+def region_tiles(uid, info, zoom, start, end):
+    """
+    The ids of a tileset's tiles at a zoom level which overlap the
+    region between the absolute genomic positions ``start`` and ``end``
+    (along both axes for 2D tilesets)
+    """
+    num_tiles = tiles_per_dimension(info, zoom)
+    tile_width = info.get("max_width", info.get("max_pos", [2**zoom])[0]) / 2**zoom
+
+    first = max(0, int(start // tile_width))
+    last = min(num_tiles - 1, int(end // tile_width))
+    positions = range(first, last + 1)
+
+    if tileset_dimensions(info) == 1:
+        return ["{}.{}.{}".format(uid, zoom, x) for x in positions]
+
+    return ["{}.{}.{}.{}".format(uid, zoom, x, y) for x in positions for y in positions]
+
+
+def viewport_tiles(uid, info, zoom, num_tiles, rng):
+    """
+    A randomly placed block of ``num_tiles`` adjacent tiles at a zoom
+    level, like the ones requested together by a browser showing the
+    tileset. Viewports of 2D tilesets are placed near the diagonal.
+
+    Parameters:
+    ----------
+    rng: random.Random
+        The random number generator used to place the viewport
+    """
+    tiles = tiles_per_dimension(info, zoom)
+
+    if tileset_dimensions(info) == 1:
+        width = min(num_tiles, tiles)
+        x = rng.randint(0, tiles - width)
+        return ["{}.{}.{}".format(uid, zoom, x + i) for i in range(width)]
+
+    width = min(int(math.ceil(math.sqrt(num_tiles))), tiles)
+    x = rng.randint(0, tiles - width)
+    y = min(max(0, x + rng.randint(-1, 1)), tiles - width)
+
+    return [
+        "{}.{}.{}.{}".format(uid, zoom, x + i, y + j)
+        for i in range(width)
+        for j in range(width)
+    ][:num_tiles]
+
+
+def fetch_tiles(session, url, tile_ids, timeout=60):
+    """
+    Request a set of tiles in a single request.
+
+    Returns:
+    --------
+    (elapsed, ok, size): (float, bool, int)
+        The time the request took in seconds, whether it succeeded and
+        the size of the response in bytes
+    """
+    t1 = time.time()
+
+    try:
+        ret = session.get(
+            "{}/tiles/".format(url), params={"d": list(tile_ids)}, timeout=timeout
+        )
+        ok = ret.status_code == 200
+        size = len(ret.content)
+    except requests.exceptions.RequestException:
+        ok = False
+        size = 0
+
+    return (time.time() - t1, ok, size)
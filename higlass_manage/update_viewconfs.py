@@ -1,19 +1,38 @@
 import sys
 import click
+import json
+import os
 import os.path as op
+import pathlib
 import sqlite3
-import shutil
+import time
 import docker
 
 from .common import (
     get_data_dir,
     get_site_url,
     get_port,
-    hg_name_to_container_name,
     SQLITEDB,
 )
 
-from .stop import _stop
+# how many database pages to copy per backup step
+BACKUP_PAGES_PER_STEP = 256
+# how long to pause between backup steps so that the server can use the database
+BACKUP_STEP_SLEEP = 0.005
+# how often a backup may start over because the database changed
+BACKUP_MAX_RESTARTS = 3
+# how many viewconfs to rewrite per transaction
+REWRITE_BATCH_SIZE = 500
+# viewconf fields which hold server urls; nothing else is rewritten
+URL_FIELDS = {
+    "server",
+    "trackSourceServers",
+    "exportViewUrl",
+    "autocompleteServer",
+    "chromInfoServer",
+    "chromInfoPath",
+    "url",
+}
 
 
 @click.command()
@@ -69,6 +88,44 @@ from .stop import _stop
     default=f"{SQLITEDB}.updated",
     type=str,
 )
+@click.option(
+    "--backup-pages",
+    help="number of database pages to copy per backup step.",
+    required=False,
+    default=BACKUP_PAGES_PER_STEP,
+    type=int,
+)
+@click.option(
+    "--backup-sleep",
+    help="seconds to pause between backup steps,"
+    " letting the running instance use the database.",
+    required=False,
+    default=BACKUP_STEP_SLEEP,
+    type=float,
+)
+@click.option(
+    "--mapping",
+    "mappings",
+    help="an additional origin=destination url pair to rewrite,"
+    " e.g. http://old.host.org:8989=https://new.host.org."
+    " Can be repeated.",
+    required=False,
+    multiple=True,
+)
+@click.option(
+    "--batch-size",
+    help="number of viewconfs to rewrite per transaction.",
+    required=False,
+    default=REWRITE_BATCH_SIZE,
+    type=int,
+)
+@click.option(
+    "--dry-run",
+    help="only report how many viewconfs would be updated,"
+    " without backing up or modifying the database.",
+    is_flag=True,
+    default=False,
+)
 def update_viewconfs(
     old_hg_name,
     old_site_url,
@@ -77,6 +134,11 @@ def update_viewconfs(
     new_site_url,
     new_port,
     db_backup_name,
+    backup_pages,
+    backup_sleep,
+    mappings,
+    batch_size,
+    dry_run,
 ):
     """Update stored viewconfs from one host to another
 
@@ -95,21 +157,25 @@ def update_viewconfs(
 
     if 'old-hg-name' is NOT provided
     then at least 'old-site-url'and 'old-data-dir'
-    are required. This scenario should be invoked
-    only when the container is not running, otherwise
-    integrity of the DB-backup can not be guaranteed.
+    are required.
 
     Post 80 is default http port and both
     new-port and old-port defaults to it,
     if not specified otherwise.
     site-url:80 is equivalent to site-url
 
+    Additional origin=destination pairs can be given
+    with --mapping and are all applied in one pass.
+    Only the url fields of viewconfs (e.g. server and
+    trackSourceServers) are rewritten.
+
     Script keeps existing database unchanged,
     but modifies a backed up version located
     in the same path as the original one.
 
-    Running higlass-container would be interrupted
-    during database backup.
+    The backup is made online, a few pages at a time,
+    so a running higlass-container keeps serving
+    requests while it is made.
 
     """
 
@@ -122,68 +188,74 @@ def update_viewconfs(
             old_data_dir = get_data_dir(old_hg_name)
         except docker.errors.NotFound as ex:
             sys.stderr.write(f"Instance not running: {old_hg_name}\n")
-    elif (old_site_url is None) or (old_data_dir is None):
+    elif old_data_dir is None or (old_site_url is None and not mappings):
         raise ValueError(
-            "old-site-url and old-data-dir must be provided,"
+            "old-site-url (or mapping) and old-data-dir must be provided,"
             " when instance is not running and no old-hg-name is provided\n"
         )
 
-    # define origin as site_url:port or site_url (when 80)
-    origin = old_site_url if (old_port == "80") else f"{old_site_url}:{old_port}"
+    try:
+        mappings = [parse_mapping(mapping) for mapping in mappings]
+    except ValueError as ex:
+        sys.stderr.write(f"{ex}\n")
+        sys.exit(-1)
 
-    # update viewconfs TO (DESTINATION):
-    # define destination as site_url:port or site_url (when 80)
-    destination = new_site_url if (new_port == "80") else f"{new_site_url}:{new_port}"
+    if old_site_url is not None:
+        # define origin as site_url:port or site_url (when 80)
+        origin = old_site_url if (old_port == "80") else f"{old_site_url}:{old_port}"
+
+        # update viewconfs TO (DESTINATION):
+        # define destination as site_url:port or site_url (when 80)
+        destination = (
+            new_site_url if (new_port == "80") else f"{new_site_url}:{new_port}"
+        )
+        mappings.insert(0, (origin, destination))
 
     # locate db.sqlite3 and name for the updated version:
     origin_db_path = op.join(old_data_dir, SQLITEDB)
     update_db_path = op.join(old_data_dir, db_backup_name)
 
-    # backup the database using simple copyfile, stop container before
-    if old_hg_name is not None:
-        _stop([old_hg_name,], False, False, False)
-    try:
-        shutil.copyfile(origin_db_path, update_db_path)
-    except (OSError, IOError):
-        sys.stderr.write(f"Failed to copy {origin_db_path} to {update_db_path}")
-        sys.exit(-1)
-    finally:
-        # restart container even if exception occurs:
-        if old_hg_name is not None:
-            sys.stderr.write(f"Restarting container {old_hg_name} ...\n")
-            sys.stderr.flush()
-            client = docker.from_env()
-            container_name = hg_name_to_container_name(old_hg_name)
-            client.containers.get(container_name).restart()
-    # alternatively database could be backed up using a "backup"-mechanism:
-    # CLI
-    #    res = subprocess.run(["sqlite3", origin_db_path, f".backup {update_db_path}"])
-    # Python API >= 3.7.0
-    #       conn = sqlite3.connect(origin_db_path)
-    #       conn.backup(update_db_path)
-    # check if it is indeed "atomic" and can be done on a "live" database .
-
-    # now modify the backed-up database "update_db_path" using sqlite3 API:
+    if dry_run:
+        # only read the live database, nothing needs to be backed up
+        db_path = sqlite_uri(origin_db_path, "ro")
+    else:
+        # backup the live database using the sqlite3 online backup API
+        try:
+            backup_database(origin_db_path, update_db_path, backup_pages, backup_sleep)
+        except sqlite3.Error as ex:
+            sys.stderr.write(
+                f"Failed to back up {origin_db_path} to {update_db_path}: {ex}\n"
+            )
+            sys.exit(-1)
+
+        # now modify the backed-up database "update_db_path" using sqlite3 API:
+        db_path = sqlite_uri(update_db_path)
+
     conn = None
     try:
-        conn = sqlite3.connect(update_db_path)
+        conn = sqlite3.connect(db_path, uri=True)
     except sqlite3.Error as e:
-        sys.stderr.write(f"Failed to connect to {update_db_path}\n")
+        sys.stderr.write(f"Failed to connect to {db_path}\n")
         sys.exit(-1)
 
-    # sql query to update viewconfs, by replacing origin -> destination
-    db_query = f"""
-            UPDATE tilesets_viewconf
-            SET viewconf = replace(viewconf,'{origin}','{destination}')
-            """
-    # exec sql query
-    with conn:
-        cur = conn.cursor()
-        cur.execute(db_query)
+    try:
+        stats = rewrite_viewconfs(conn, mappings, batch_size, dry_run)
+    finally:
+        conn.close()
+
+    for (origin, destination) in mappings:
+        sys.stderr.write(
+            f"{origin} -> {destination}: {stats['fields'][origin]} url fields\n"
+        )
+    sys.stderr.write(
+        f"{stats['rewritten']} of {stats['candidates']} candidate viewconfs"
+        f" {'would be' if dry_run else 'were'} updated"
+        f" ({stats['invalid']} could not be parsed)"
+        f" in {stats['elapsed']:.2f}s\n"
+    )
 
-    conn.close()
-    # todo: add some stats on - how many viewconfs
-    # were updated
+    if dry_run:
+        sys.exit(0)
 
     sys.stderr.write(
         f"Backed up version of the database {update_db_path}\n"
@@ -193,3 +265,281 @@ def update_viewconfs(
     )
     sys.stderr.flush()
     sys.exit(0)
+
+
+def parse_mapping(mapping):
+    """
+    Split an origin=destination url pair
+    """
+    (origin, sep, destination) = mapping.partition("=")
+
+    if not sep or not origin or not destination:
+        raise ValueError(f"Invalid mapping {mapping} (expected origin=destination)")
+
+    return (origin.rstrip("/"), destination.rstrip("/"))
+
+
+def rewrite_url(url, mappings):
+    """
+    Rewrite a url which starts with one of the mapped origins. The
+    origin has to be followed by the end of the url or a path, query
+    or fragment, so http://host:80 doesn't match http://host:8080.
+    Protocol-relative urls (//host/...) are matched against origins
+    with their scheme removed.
+
+    Returns:
+    --------
+    (url, origin): (str, str)
+        The rewritten url and the origin that matched, or the
+        unchanged url and None
+    """
+    for (origin, destination) in mappings:
+        candidates = [(origin, destination)]
+
+        if url.startswith("//") and "://" in origin:
+            candidates.append(
+                ("//" + origin.split("://", 1)[1], "//" + destination.split("://")[-1])
+            )
+
+        for (prefix, replacement) in candidates:
+            rest = url[len(prefix) :]
+
+            if url.startswith(prefix) and rest[:1] in ["", "/", "?", "#"]:
+                return (replacement + rest, origin)
+
+    return (url, None)
+
+
+def rewrite_viewconf(viewconf, mappings, counts):
+    """
+    Rewrite the url fields of a parsed viewconf in place.
+
+    Parameters:
+    ----------
+    viewconf: dict
+        The parsed viewconf
+    mappings: [(str, str)]
+        The origin and destination of each url mapping
+    counts: dict
+        The number of fields rewritten by each origin, updated in place
+
+    Returns:
+    --------
+    changed: bool
+        Whether any field was rewritten
+    """
+    changed = False
+
+    def rewrite(value):
+        nonlocal changed
+
+        if not isinstance(value, str):
+            return value
+
+        (rewritten, origin) = rewrite_url(value, mappings)
+        if origin is not None and rewritten != value:
+            counts[origin] += 1
+            changed = True
+
+        return rewritten
+
+    def walk(node):
+        if isinstance(node, dict):
+            for (key, value) in node.items():
+                if key in URL_FIELDS:
+                    if isinstance(value, list):
+                        node[key] = [rewrite(item) for item in value]
+                    else:
+                        node[key] = rewrite(value)
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(viewconf)
+    return changed
+
+
+def sqlite_uri(path, mode=None):
+    """
+    The URI of a sqlite database, with the characters of its path which
+    have a meaning in URIs (e.g. '?' and '#') escaped.
+    """
+    uri = pathlib.Path(op.abspath(path)).as_uri()
+
+    return uri if mode is None else f"{uri}?mode={mode}"
+
+
+def rewrite_viewconfs(conn, mappings, batch_size=REWRITE_BATCH_SIZE, dry_run=False):
+    """
+    Rewrite the url fields of the viewconfs stored in a database.
+
+    Only rows which contain one of the origins' hosts are read, using
+    instr() in the query, and only rows whose url fields change are
+    written. Updates are committed in batches of ``batch_size`` rows.
+
+    Parameters:
+    ----------
+    conn: sqlite3.Connection
+        The database to update
+    mappings: [(str, str)]
+        The origin and destination of each url mapping
+    dry_run: bool
+        Count the changes without writing them
+
+    Returns:
+    --------
+    stats: dict
+        The number of candidate rows, rewritten rows, rows which
+        couldn't be parsed, rewritten fields for each origin and the
+        time taken
+    """
+    t1 = time.time()
+    stats = {
+        "candidates": 0,
+        "rewritten": 0,
+        "invalid": 0,
+        "fields": {origin: 0 for (origin, _) in mappings},
+    }
+
+    # match the host of each origin so protocol-relative urls are found too
+    needles = [origin.split("://")[-1] for (origin, _) in mappings]
+    query = (
+        "SELECT rowid, viewconf FROM tilesets_viewconf WHERE rowid > ? AND ("
+        + " OR ".join(["instr(viewconf, ?) > 0"] * len(needles))
+        + ") ORDER BY rowid LIMIT ?"
+    )
+
+    last_rowid = -1
+    while needles:
+        rows = conn.execute(query, [last_rowid] + needles + [batch_size]).fetchall()
+
+        if not rows:
+            break
+
+        updates = []
+        for (rowid, viewconf) in rows:
+            try:
+                parsed = json.loads(viewconf)
+            except ValueError:
+                stats["invalid"] += 1
+                continue
+
+            if rewrite_viewconf(parsed, mappings, stats["fields"]):
+                updates.append((json.dumps(parsed, ensure_ascii=False), rowid))
+
+        stats["candidates"] += len(rows)
+        stats["rewritten"] += len(updates)
+        last_rowid = rows[-1][0]
+
+        if updates and not dry_run:
+            with conn:
+                conn.executemany(
+                    "UPDATE tilesets_viewconf SET viewconf = ? WHERE rowid = ?",
+                    updates,
+                )
+
+    stats["elapsed"] = time.time() - t1
+    return stats
+
+
+class BackupRestartedError(Exception):
+    pass
+
+
+def _backup(src, backup_db_path, pages, progress):
+    if op.exists(backup_db_path):
+        os.remove(backup_db_path)
+
+    dst = sqlite3.connect(backup_db_path)
+
+    try:
+        with dst:
+            src.backup(dst, pages=pages, progress=progress)
+    finally:
+        dst.close()
+
+
+def backup_database(
+    origin_db_path,
+    backup_db_path,
+    pages=BACKUP_PAGES_PER_STEP,
+    sleep=BACKUP_STEP_SLEEP,
+    max_restarts=BACKUP_MAX_RESTARTS,
+):
+    """
+    Make a consistent copy of a database that may be in use.
+
+    The database is copied ``pages`` pages at a time, pausing between
+    steps so that a running server can keep reading and writing it. If
+    the database is written to during the backup, sqlite restarts the
+    copy so that the result is always consistent. A database which
+    keeps being written to would never be copied this way, so after
+    ``max_restarts`` restarts it is copied in a single step instead,
+    briefly blocking writers.
+
+    Parameters:
+    ----------
+    origin_db_path: str
+        The database to back up
+    backup_db_path: str
+        Where to write the backup. An existing file is overwritten.
+    pages: int
+        The number of pages to copy per step
+    sleep: float
+        The number of seconds to pause between steps
+    max_restarts: int
+        How often the backup may start over before falling back to
+        copying the database in a single step
+
+    Returns:
+    --------
+    elapsed: float
+        The number of seconds the backup took
+    """
+    t1 = time.time()
+    state = {"last_report": 0, "copied": 0, "restarts": 0}
+
+    def progress(status, remaining, total):
+        now = time.time()
+        copied = total - remaining
+
+        if copied < state["copied"]:
+            # the database was written to and the backup started over
+            state["restarts"] += 1
+
+            if state["restarts"] > max_restarts:
+                raise BackupRestartedError()
+
+        state["copied"] = copied
+
+        if remaining == 0 or now - state["last_report"] >= 1:
+            state["last_report"] = now
+            sys.stderr.write(
+                f"Backed up {copied} of {total} pages"
+                f" ({100 * copied / max(total, 1):.0f}%)\n"
+            )
+            sys.stderr.flush()
+
+        time.sleep(sleep)
+
+    # open the origin read-only so that a missing database isn't created
+    src = sqlite3.connect(sqlite_uri(origin_db_path, "ro"), uri=True)
+
+    try:
+        try:
+            _backup(src, backup_db_path, pages, progress)
+        except BackupRestartedError:
+            sys.stderr.write(
+                "The database kept changing during the backup,"
+                " copying it in a single step\n"
+            )
+            _backup(src, backup_db_path, -1, None)
+    finally:
+        src.close()
+
+    elapsed = time.time() - t1
+    sys.stderr.write(f"Backed up {origin_db_path} in {elapsed:.2f}s\n")
+
+    return elapsed
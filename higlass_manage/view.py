@@ -9,12 +9,14 @@ import webbrowser
 
 from higlass_manage.common import fill_filetype_and_datatype
 from higlass_manage.common import get_port
+from higlass_manage.common import iter_tilesets
 from higlass_manage.common import get_data_dir
 from higlass_manage.common import get_temp_dir
-from higlass_manage.common import md5
 from higlass_manage.common import datatype_to_tracktype
+from higlass_manage.fingerprint import FingerprintIndex
 from higlass_manage.start import _start
 from higlass_manage.ingest import _ingest
+from higlass_manage.warmup import warm_up_and_report
 
 
 @click.command()
@@ -47,7 +49,13 @@ from higlass_manage.ingest import _ingest
 @click.option(
     "--chromsizes-filename",
     default=None,
-    help="A set of chromosome sizes to use for bed and bedpe files",
+    help="A set of chromosome sizes to use for bed, bedpe and bedGraph files",
+)
+@click.option(
+    "--warm-up",
+    default=False,
+    is_flag=True,
+    help="Warm up the tile cache of the tileset before opening it",
 )
 def view(
     filename,
@@ -59,6 +67,7 @@ def view(
     public_data,
     assembly,
     chromsizes_filename,
+    warm_up,
 ):
     """
     View a file in higlass.
@@ -74,11 +83,64 @@ def view(
     filename: string
         The name of the file to view
     """
+    from higlass_manage.api import Manager, StartError
+
+    instance = Manager().instance(hg_name)
+    try:
+        uid = instance.view(
+            filename,
+            filetype=filetype,
+            datatype=datatype,
+            tracktype=tracktype,
+            position=position,
+            public_data=public_data,
+            assembly=assembly,
+            chromsizes_filename=chromsizes_filename,
+            warm_up=warm_up,
+        )
+    except StartError:
+        sys.exit(-1)
+
+    if uid is None:
+        return
+
+    # make sure this test passes on Travis CI and doesn't try to open
+    # a terminal-based browser which doesn't return
+    if not os.environ.get("HAS_JOSH_K_SEAL_OF_APPROVAL"):
+        webbrowser.open(instance.viewconf_url(uid))
+
+
+def _view(
+    filename,
+    hg_name="default",
+    filetype=None,
+    datatype=None,
+    tracktype=None,
+    position=None,
+    public_data=True,
+    assembly=None,
+    chromsizes_filename=None,
+    warm_up=False,
+    session=None,
+):
+    """
+    Create a viewconf showing a file, ingesting the file first unless
+    the instance already has a tileset with the same contents.
+
+    Returns:
+    --------
+    uid: str
+        The uid of the new viewconf or None if the file couldn't be
+        ingested or the viewconf couldn't be created
+    """
+    if session is None:
+        session = requests.Session()
+
     try:
         temp_dir = get_temp_dir(hg_name)
         print("temp_dir:", temp_dir)
     except Exception:
-        _start(hg_name=hg_name)
+        _start(hg_name=hg_name, pull="if-missing")
 
     # check if we have a running instance
     # if not, start one
@@ -102,42 +164,40 @@ def view(
             "please specify them using the command line options",
             file=sys.stderr,
         )
-        return
+        return None
 
     try:
-        MAX_TILESETS = 100000
-        req = requests.get(
-            "http://localhost:{}/api/v1/tilesets/?limit={}".format(port, MAX_TILESETS),
-            timeout=10,
-        )
+        data_dir = get_data_dir(hg_name)
+        import_filename = ntpath.basename(filename)
 
-        tilesets = json.loads(req.content)
+        # converted files are named after the original without its
+        # compression extension (e.g. data.bedGraph.gz -> data.hitile)
+        if import_filename.lower().endswith(".gz"):
+            import_filename = import_filename[: -len(".gz")]
 
-        for tileset in tilesets["results"]:
-            import_filename = op.splitext(ntpath.basename(filename))[0]
-            tileset_filename = ntpath.basename(tileset["datafile"])
+        import_filename = op.splitext(import_filename)[0]
 
-            subpath_index = tileset["datafile"].find("/tilesets/")
-            subpath = tileset["datafile"][subpath_index + len("/tilesets/") :]
+        with FingerprintIndex(data_dir) as index:
+            for tileset in iter_tilesets(port, session=session):
+                tileset_filename = ntpath.basename(tileset["datafile"])
 
-            data_dir = get_data_dir(hg_name)
-            tileset_path = op.join(data_dir, subpath)
+                subpath_index = tileset["datafile"].find("/tilesets/")
+                subpath = tileset["datafile"][subpath_index + len("/tilesets/") :]
 
-            # print("import_filename", import_filename)
-            # print("tileset_filename", tileset_filename)
+                tileset_path = op.join(data_dir, subpath)
 
-            if tileset_filename.find(import_filename) >= 0:
-                # same filenames, make sure they're actually the same file
-                # by comparing checksums
-                checksum1 = md5(tileset_path)
-                checksum2 = md5(filename)
+                # print("import_filename", import_filename)
+                # print("tileset_filename", tileset_filename)
 
-                if checksum1 == checksum2:
-                    uuid = tileset["uuid"]
-                    break
-    except requests.exceptions.ConnectionError:
+                if tileset_filename.find(import_filename) >= 0:
+                    # same filenames, make sure they're actually the same file
+                    # by comparing sizes and checksums
+                    if index.same_contents(tileset_path, filename, tileset["uuid"]):
+                        uuid = tileset["uuid"]
+                        break
+    except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError):
         print("Error getting a list of existing tilesets", file=sys.stderr)
-        return
+        return None
 
     if uuid is None:
         # we haven't found a matching tileset so we need to ingest this one
@@ -152,7 +212,10 @@ def view(
 
     if uuid is None:
         # couldn't ingest the file
-        return
+        return None
+
+    if warm_up:
+        warm_up_and_report(port, [uuid])
 
     import higlass as hg
 
@@ -164,7 +227,7 @@ def view(
 
         if tracktype is None:
             print("ERROR: Unknown track type for the given datatype:", datatype)
-            return
+            return None
 
     tileset = hg.remote(
         uid=uuid,
@@ -179,19 +242,12 @@ def view(
         conf["trackSourceServers"] += ["http://higlass.io/api/v1/"]
 
     # uplaod the viewconf
-    res = requests.post(
+    res = session.post(
         "http://localhost:{}/api/v1/viewconfs/".format(port), json={"viewconf": conf}
     )
 
     if res.status_code != 200:
-        print("Error posting viewconf:", res.status, res.content)
-        return
-
-    uid = json.loads(res.content)["uid"]
+        print("Error posting viewconf:", res.status_code, res.content)
+        return None
 
-    # make sure this test passes on Travis CI and doesn't try to open
-    # a terminal-based browser which doesn't return
-    if not os.environ.get("HAS_JOSH_K_SEAL_OF_APPROVAL"):
-        webbrowser.open(
-            "http://localhost:{port}/app/?config={uid}".format(port=port, uid=uid)
-        )
+    return json.loads(res.content)["uid"]
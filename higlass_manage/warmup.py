@@ -0,0 +1,302 @@
+import click
+import re
+import requests
+import sys
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from higlass_manage.common import get_port
+from higlass_manage.common import iter_tilesets
+from higlass_manage.tiles import api_url
+from higlass_manage.tiles import fetch_tiles
+from higlass_manage.tiles import get_tileset_info
+from higlass_manage.tiles import region_tiles
+from higlass_manage.tiles import zoom_level_tiles
+
+# how many of the lowest resolution zoom levels to warm up by default
+WARM_UP_ZOOM_LEVELS = 4
+# how long to spend warming up by default, in seconds
+WARM_UP_TIME_BUDGET = 60
+WARM_UP_CONCURRENCY = 8
+WARM_UP_BATCH_SIZE = 8
+
+REGION_PATTERN = re.compile(
+    r"^(?:(?P<chrom>[^:]+):)?(?P<start>[\d,]+)-(?P<end>[\d,]+)$"
+)
+
+
+def parse_region(region):
+    """
+    Parse a region given as chrom:start-end or as absolute genome
+    coordinates start-end.
+
+    Returns:
+    --------
+    (chrom, start, end): (str, int, int)
+        The chromosome (None for absolute coordinates) and the bounds
+        of the region
+    """
+    match = REGION_PATTERN.match(region)
+
+    if match is None:
+        raise ValueError(
+            "Invalid region {} (expected chrom:start-end or start-end)".format(region)
+        )
+
+    return (
+        match.group("chrom"),
+        int(match.group("start").replace(",", "")),
+        int(match.group("end").replace(",", "")),
+    )
+
+
+def get_chrom_offset(session, url, uid, chrom, timeout=10):
+    """
+    Look up the absolute position at which a chromosome starts in the
+    coordinate system of a tileset.
+    """
+    ret = session.get(
+        "{}/chrom-sizes/".format(url), params={"id": uid}, timeout=timeout
+    )
+    ret.raise_for_status()
+
+    offset = 0
+    for line in ret.text.strip().split("\n"):
+        parts = line.split("\t")
+
+        if parts[0] == chrom:
+            return offset
+
+        offset += int(parts[1])
+
+    raise ValueError("Chromosome {} not found in tileset {}".format(chrom, uid))
+
+
+def warm_up_batches(tileset_info, zoom_levels, regions, batch_size):
+    """
+    Generate the batches of tiles to request, starting with the lowest
+    resolution zoom level of every tileset so that the most expensive
+    tiles are cached first if the budget runs out.
+
+    Parameters:
+    ----------
+    tileset_info: dict
+        The tileset info of each tileset keyed by uid
+    zoom_levels: int
+        The number of zoom levels to warm up
+    regions: dict
+        The absolute (start, end) region to warm up for each tileset or
+        None to warm up whole zoom levels
+    batch_size: int
+        The number of tiles to request at once
+    """
+    max_zoom = max(info.get("max_zoom", 0) for info in tileset_info.values())
+
+    for zoom in range(min(zoom_levels, max_zoom + 1)):
+        for (uid, info) in tileset_info.items():
+            if zoom > info.get("max_zoom", 0):
+                continue
+
+            if regions is None:
+                tile_ids = zoom_level_tiles(uid, info, zoom)
+            else:
+                (start, end) = regions[uid]
+                tile_ids = region_tiles(uid, info, zoom, start, end)
+
+            for i in range(0, len(tile_ids), batch_size):
+                yield tile_ids[i : i + batch_size]
+
+
+def warm_up_tilesets(
+    port,
+    uids,
+    zoom_levels=WARM_UP_ZOOM_LEVELS,
+    region=None,
+    time_budget=WARM_UP_TIME_BUDGET,
+    size_budget=None,
+    concurrency=WARM_UP_CONCURRENCY,
+    batch_size=WARM_UP_BATCH_SIZE,
+    url=None,
+):
+    """
+    Warm up an instance's tile cache (Redis and the operating system's
+    page cache) by requesting the tiles of the lowest resolution zoom
+    levels of a set of tilesets concurrently.
+
+    Requests stop being sent once the time or size budget is used up.
+
+    Parameters:
+    ----------
+    port: int
+        The port the instance is listening on
+    uids: [str]
+        The uids of the tilesets to warm up, or ["all"] for every
+        tileset on the instance
+    zoom_levels: int
+        The number of zoom levels to warm up
+    region: str
+        Only warm up tiles overlapping this region (chrom:start-end or
+        start-end)
+    time_budget: float
+        The maximum number of seconds to spend (None for no limit)
+    size_budget: float
+        The maximum number of megabytes of tiles to request (None for
+        no limit)
+    url: str
+        The API url of the server (defaults to the instance on port)
+
+    Returns:
+    --------
+    stats: dict
+        The number of tiles requested, their size, the number of
+        failed requests, the time taken and whether a budget ran out
+    """
+    url = url or api_url(port)
+    session = requests.Session()
+
+    if list(uids) == ["all"]:
+        uids = [tileset["uuid"] for tileset in iter_tilesets(port, session=session)]
+
+    tileset_info = get_tileset_info(session, url, uids)
+    stats = {"tiles": 0, "bytes": 0, "errors": 0, "elapsed": 0, "exhausted": None}
+
+    if not tileset_info:
+        return stats
+
+    regions = None
+    if region is not None:
+        (chrom, start, end) = parse_region(region)
+        regions = {}
+
+        for uid in tileset_info:
+            offset = 0 if chrom is None else get_chrom_offset(session, url, uid, chrom)
+            regions[uid] = (offset + start, offset + end)
+
+    local = threading.local()
+
+    def fetch(tile_ids):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+
+        return fetch_tiles(local.session, url, tile_ids)
+
+    def account(futures):
+        for future in futures:
+            (_, ok, size) = future.result()
+            stats["tiles"] += pending[future]
+            stats["bytes"] += size
+            stats["errors"] += 0 if ok else 1
+            del pending[future]
+
+    t1 = time.time()
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for tile_ids in warm_up_batches(tileset_info, zoom_levels, regions, batch_size):
+            if len(pending) >= 2 * concurrency:
+                (done, _) = wait(list(pending), return_when=FIRST_COMPLETED)
+                account(done)
+
+            if time_budget is not None and time.time() - t1 > time_budget:
+                stats["exhausted"] = "time"
+                break
+
+            if size_budget is not None and stats["bytes"] > size_budget * 2**20:
+                stats["exhausted"] = "size"
+                break
+
+            pending[executor.submit(fetch, tile_ids)] = len(tile_ids)
+
+        account(wait(list(pending)).done)
+
+    stats["elapsed"] = time.time() - t1
+    return stats
+
+
+def warm_up_and_report(port, uids, **kwargs):
+    """
+    Warm up the tile cache of a set of tilesets and report the outcome
+    on stderr. Errors are reported rather than raised because warming
+    up is never required for an instance to work.
+
+    Takes the same arguments as ``warm_up_tilesets``.
+    """
+    try:
+        stats = warm_up_tilesets(port, uids, **kwargs)
+    except (requests.exceptions.RequestException, ValueError) as ex:
+        sys.stderr.write("Error warming up the cache: {}\n".format(ex))
+        return None
+
+    sys.stderr.write(
+        "Warmed up {} tiles ({:.1f} MB, {} failed requests) in {:.2f}s{}\n".format(
+            stats["tiles"],
+            stats["bytes"] / 2**20,
+            stats["errors"],
+            stats["elapsed"],
+            (
+                ", stopped when the {} budget ran out".format(stats["exhausted"])
+                if stats["exhausted"]
+                else ""
+            ),
+        )
+    )
+
+    return stats
+
+
+@click.command()
+@click.argument("hg_name", nargs=-1)
+@click.option(
+    "-u",
+    "--uid",
+    "uids",
+    multiple=True,
+    default=["all"],
+    help="The uid of a tileset to warm up (can be repeated, defaults to all tilesets)",
+)
+@click.option(
+    "-z",
+    "--zoom-levels",
+    default=WARM_UP_ZOOM_LEVELS,
+    help="The number of lowest resolution zoom levels to warm up",
+)
+@click.option(
+    "--region",
+    default=None,
+    help="Only warm up tiles overlapping this region (chrom:start-end or start-end)",
+)
+@click.option(
+    "--time-budget",
+    default=WARM_UP_TIME_BUDGET,
+    type=float,
+    help="The maximum number of seconds to spend warming up",
+)
+@click.option(
+    "--size-budget",
+    default=None,
+    type=float,
+    help="The maximum number of megabytes of tiles to request",
+)
+@click.option(
+    "-c",
+    "--concurrency",
+    default=WARM_UP_CONCURRENCY,
+    help="The number of requests to send at once",
+)
+def warmup(hg_name, uids, zoom_levels, region, time_budget, size_budget, concurrency):
+    """
+    Warm up the tile cache of a running instance.
+    """
+    port = get_port(hg_name[0] if hg_name else "default")
+
+    warm_up_and_report(
+        port,
+        uids,
+        zoom_levels=zoom_levels,
+        region=region,
+        time_budget=time_budget,
+        size_budget=size_budget,
+        concurrency=concurrency,
+    )
@@ -0,0 +1,459 @@
+import click
+import os
+import os.path as op
+import sys
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from higlass_manage.common import fill_filetype_and_datatype
+from higlass_manage.common import get_temp_dir
+from higlass_manage.common import infer_filetype
+from higlass_manage.common import read_state_file
+from higlass_manage.common import recommend_filetype
+from higlass_manage.common import write_state_file
+from higlass_manage.common import StartError
+
+# how often to look for new files, in seconds
+WATCH_INTERVAL = 2
+# how long a file's size and modification time have to stay the same
+# before it is considered completely written, in seconds
+SETTLE_TIME = 10
+# files which are still being written or downloaded often look like this
+IGNORED_PREFIXES = (".", "~")
+IGNORED_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", ".swp")
+
+
+def watch_state_file(hg_name):
+    """
+    The state file recording the files ingested into an instance by
+    ``watch``
+    """
+    return "watch-{}.json".format(hg_name)
+
+
+def is_watched_file(path):
+    """
+    Check whether a file looks like a dataset that can be ingested
+    """
+    name = op.basename(path)
+
+    if name.startswith(IGNORED_PREFIXES) or name.endswith(IGNORED_SUFFIXES):
+        return False
+
+    return (infer_filetype(path) or recommend_filetype(path)) is not None
+
+
+def iter_files(directory, recursive=False):
+    if not recursive:
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                yield entry.path
+        return
+
+    for (dirpath, dirnames, filenames) in os.walk(directory):
+        # skip hidden directories
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+
+        for filename in filenames:
+            yield op.join(dirpath, filename)
+
+
+class PollingWatcher:
+    """
+    Find candidate files by listing the watched directory.
+    """
+
+    def __init__(self, directory, recursive=False):
+        self.directory = directory
+        self.recursive = recursive
+
+    def changes(self, timeout):
+        """
+        Wait for ``timeout`` seconds and return the files which may have
+        changed (every file in the directory).
+        """
+        time.sleep(timeout)
+        return set(iter_files(self.directory, self.recursive))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Find candidate files using inotify events so that the directory
+    doesn't have to be listed over and over again.
+    """
+
+    def __init__(self, directory, recursive=False):
+        import inotify_simple
+
+        self.flags = inotify_simple.flags
+        self.mask = (
+            self.flags.CLOSE_WRITE
+            | self.flags.MOVED_TO
+            | self.flags.CREATE
+            | self.flags.MODIFY
+        )
+        self.recursive = recursive
+        self.inotify = inotify_simple.INotify()
+        self.directories = {}
+
+        self.add_directory(directory)
+
+    def add_directory(self, directory):
+        self.directories[self.inotify.add_watch(directory, self.mask)] = directory
+
+        if self.recursive:
+            for entry in os.scandir(directory):
+                if entry.is_dir() and not entry.name.startswith("."):
+                    self.add_directory(entry.path)
+
+    def changes(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for files to change and return
+        the ones that did.
+        """
+        changed = set()
+
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            if event.wd not in self.directories:
+                continue
+
+            path = op.join(self.directories[event.wd], event.name)
+
+            if event.mask & self.flags.ISDIR:
+                if self.recursive and op.isdir(path):
+                    self.add_directory(path)
+                    changed |= set(iter_files(path, self.recursive))
+            else:
+                changed.add(path)
+
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+
+def get_watcher(directory, recursive=False, polling=False):
+    """
+    Watch a directory using inotify if the optional inotify_simple
+    package is installed and polling otherwise.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(directory, recursive)
+        except (ImportError, OSError):
+            pass
+
+    return PollingWatcher(directory, recursive)
+
+
+class FileDebouncer:
+    """
+    Hold back candidate files until their size and modification time
+    have stopped changing for ``settle_time`` seconds, so that files
+    are only ingested once they have been completely written.
+    """
+
+    def __init__(self, settle_time=SETTLE_TIME):
+        self.settle_time = settle_time
+        self.pending = {}
+
+    def update(self, path, now):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.pending.pop(path, None)
+            return
+
+        key = (stat.st_size, stat.st_mtime_ns)
+        if path not in self.pending or self.pending[path][0] != key:
+            self.pending[path] = (key, now)
+
+    def ready(self, now):
+        """
+        Return (and stop tracking) the non-empty files which haven't
+        changed for long enough, with their (size, mtime) keys.
+        """
+        ready = [
+            (path, key)
+            for (path, (key, since)) in self.pending.items()
+            if key[0] > 0 and now - since >= self.settle_time
+        ]
+
+        for (path, _) in ready:
+            del self.pending[path]
+
+        return ready
+
+
+def _watch(
+    directory,
+    hg_name,
+    assembly=None,
+    chromsizes_filename=None,
+    project_name=None,
+    jobs=2,
+    interval=WATCH_INTERVAL,
+    settle_time=SETTLE_TIME,
+    recursive=False,
+    polling=False,
+    once=False,
+):
+    """
+    Watch a directory and ingest the datasets that appear in it.
+
+    Every file that is ingested (or fails to be) is recorded in a state
+    file along with its size and modification time. Recorded files are
+    only ingested again if they change, including across restarts.
+
+    Parameters:
+    ----------
+    directory: str
+        The directory to watch
+    hg_name: str
+        The instance to ingest files into
+    jobs: int
+        The number of files to ingest at once
+    interval: float
+        How often to check for new files, in seconds
+    settle_time: float
+        How long a file has to stay unchanged before being ingested
+    recursive: bool
+        Watch subdirectories as well
+    polling: bool
+        Don't use inotify even if it's available
+    once: bool
+        Ingest the files already in the directory and return
+    """
+    from higlass_manage.ingest import _ingest
+    from higlass_manage.start import _start
+
+    directory = op.abspath(directory)
+    state_file = watch_state_file(hg_name)
+    record = read_state_file(state_file)
+    start_lock = threading.Lock()
+
+    def ensure_running():
+        # the instance can stop while the directory is watched and the
+        # ingests running at the same time must only start it once
+        with start_lock:
+            try:
+                get_temp_dir(hg_name)
+            except Exception:
+                print("HiGlass not running. Starting...")
+                _start(hg_name=hg_name, pull="if-missing")
+
+    ensure_running()
+
+    watcher = get_watcher(directory, recursive, polling or once)
+    debouncer = FileDebouncer(0 if once else settle_time)
+    sys.stderr.write(
+        "Watching {} using {}\n".format(
+            directory, "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+        )
+    )
+
+    def ingest_file(path):
+        (filetype, datatype) = fill_filetype_and_datatype(
+            path, infer_filetype(path) or recommend_filetype(path), None
+        )
+
+        if filetype is None:
+            return None
+
+        ensure_running()
+        return _ingest(
+            path,
+            hg_name,
+            filetype,
+            datatype,
+            assembly=assembly,
+            chromsizes_filename=chromsizes_filename,
+            project_name=project_name,
+        )
+
+    def is_new(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        entry = record.get(path)
+        return entry is None or [entry["size"], entry["mtime"]] != [
+            stat.st_size,
+            stat.st_mtime_ns,
+        ]
+
+    def finish(futures):
+        for future in futures:
+            (path, key) = running.pop(future)
+
+            try:
+                uid = future.result()
+            except Exception as ex:
+                sys.stderr.write("Error ingesting {}: {}\n".format(path, ex))
+                uid = None
+
+            record[path] = {
+                "size": key[0],
+                "mtime": key[1],
+                "uid": uid,
+                "ingested": time.time(),
+            }
+            write_state_file(state_file, record)
+
+            if uid is None:
+                sys.stderr.write("Failed to ingest {}\n".format(path))
+            else:
+                sys.stderr.write("Ingested {} (uid: {})\n".format(path, uid))
+
+    running = {}
+    queued = []
+    candidates = set(iter_files(directory, recursive))
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        try:
+            while True:
+                now = time.time()
+                waiting = set(path for (path, _) in list(running.values()) + queued)
+
+                # pending files are checked again even when nothing reports
+                # a change so that they get ingested once they settle
+                for path in candidates | set(debouncer.pending):
+                    if path in waiting:
+                        continue
+
+                    if is_watched_file(path) and is_new(path):
+                        debouncer.update(path, now)
+                    else:
+                        debouncer.pending.pop(path, None)
+
+                queued += debouncer.ready(now)
+
+                if once:
+                    # nothing waits for files to settle in once mode, so the
+                    # files that aren't ready are empty or still being written
+                    for path in list(debouncer.pending):
+                        sys.stderr.write(
+                            "Skipping {}: it is empty or still being written\n".format(
+                                path
+                            )
+                        )
+                        del debouncer.pending[path]
+
+                # only hand as many files to the pool as it can work on
+                while queued and len(running) < max(jobs, 1):
+                    (path, key) = queued.pop(0)
+                    running[executor.submit(ingest_file, path)] = (path, key)
+
+                if once and not (running or queued or debouncer.pending):
+                    break
+
+                if running:
+                    (done, _) = wait(
+                        list(running),
+                        timeout=None if once else 0,
+                        return_when=FIRST_COMPLETED,
+                    )
+                    finish(done)
+
+                candidates = set() if once else watcher.changes(interval)
+        except KeyboardInterrupt:
+            sys.stderr.write("Waiting for running ingests to finish\n")
+
+        finish(wait(list(running)).done)
+
+    watcher.close()
+
+
+@click.command()
+@click.argument("directory")
+@click.option(
+    "--hg-name",
+    default="default",
+    help="The name of the higlass container to import files to",
+)
+@click.option(
+    "--assembly", default=None, help="The assembly that the data is mapped to"
+)
+@click.option(
+    "--chromsizes-filename",
+    default=None,
+    help="A set of chromosome sizes to use for bed, bedpe and bedGraph files",
+)
+@click.option(
+    "--project-name",
+    default=None,
+    help="Group the ingested tilesets by specifying a project name",
+)
+@click.option(
+    "-j", "--jobs", default=2, type=int, help="The number of files to ingest at once"
+)
+@click.option(
+    "--interval",
+    default=WATCH_INTERVAL,
+    type=float,
+    help="How often to check for new files, in seconds",
+)
+@click.option(
+    "--settle-time",
+    default=SETTLE_TIME,
+    type=float,
+    help="How long a file has to stay unchanged before it is ingested, in seconds",
+)
+@click.option(
+    "-r", "--recursive", default=False, is_flag=True, help="Watch subdirectories too"
+)
+@click.option(
+    "--polling",
+    default=False,
+    is_flag=True,
+    help="Poll the directory instead of using inotify",
+)
+@click.option(
+    "--once",
+    default=False,
+    is_flag=True,
+    help="Ingest the new files currently in the directory and exit",
+)
+def watch(
+    directory,
+    hg_name,
+    assembly,
+    chromsizes_filename,
+    project_name,
+    jobs,
+    interval,
+    settle_time,
+    recursive,
+    polling,
+    once,
+):
+    """
+    Watch a directory and ingest the datasets written to it
+
+    Files are ingested once they have stopped changing for a while.
+    Ingested files are recorded so that they aren't ingested again
+    after a restart unless they change. inotify is used when the
+    inotify_simple package is installed.
+    """
+    try:
+        _watch(
+            directory,
+            hg_name,
+            assembly=assembly,
+            chromsizes_filename=chromsizes_filename,
+            project_name=project_name,
+            jobs=jobs,
+            interval=interval,
+            settle_time=settle_time,
+            recursive=recursive,
+            polling=polling,
+            once=once,
+        )
+    except StartError:
+        sys.exit(-1)
@@ -20,6 +20,7 @@ setup(
         "docker",
         "requests",
     ],
+    extras_require={"watch": ["inotify_simple"]},
     entry_points="""
         [console_scripts]
         higlass-manage=higlass_manage.cli:cli
@@ -11,6 +11,10 @@ die() { set +v; echo "$*" 1>&2 ; sleep 1; exit 1; }
 # directory that is relative to the home directory
 TMPDIR=$(mktemp --directory --tmpdir=${HOME})
 
+start unit-tests
+    python -m pytest -q tests
+end unit-tests
+
 start get-data
     ./get_test_data.sh
 end get-data
@@ -102,4 +106,28 @@ start cleanup
     higlass-manage stop test-hg-with-redis
 end cleanup
 
+start import-time
+    # commands are imported lazily: report how long importing each one
+    # takes and make sure none of them pulls in another command's
+    # heavy dependencies (clodius is only needed to aggregate files)
+    IMPORT_TIME_BUDGET_MS=${IMPORT_TIME_BUDGET_MS:-1500}
+    for command in version "list instances" "list tilesets" "create superuser" \
+                   "delete superuser" ingest start stop shell view update-viewconfs \
+                   logs up down metrics bench warmup watch; do
+        python -X importtime -c "from higlass_manage.cli import cli; cli()" \
+            ${command} --help 2> ${TMPDIR}/importtime.log > /dev/null
+        IMPORT_TIME_MS=$(awk -F'|' '/^import time: +[0-9]/ {sub(/import time:/, "", $1); total += $1} END {print int(total / 1000)}' ${TMPDIR}/importtime.log)
+        echo "${command}: ${IMPORT_TIME_MS} ms"
+
+        case "${command}" in
+            ingest|view) ;;
+            *)
+                grep -q " clodius$" ${TMPDIR}/importtime.log && die "${command} imports clodius"
+                [ ${IMPORT_TIME_MS} -le ${IMPORT_TIME_BUDGET_MS} ] || die "${command} takes ${IMPORT_TIME_MS} ms to import"
+                ;;
+        esac
+    done
+    python -X importtime -c "from higlass_manage.cli import cli; cli()" version 2>&1 | grep -q " docker$" && die "version imports docker"
+end import-time
+
 echo 'Passed all tests'
@@ -0,0 +1,39 @@
+import docker
+import pytest
+
+import higlass_manage.common as common
+
+from higlass_manage.api import Manager, StartError
+
+
+class FakeContainers:
+    def __init__(self, error):
+        self.error = error
+
+    def get(self, name):
+        raise self.error
+
+
+class FakeDockerClient:
+    def __init__(self, error):
+        self.containers = FakeContainers(error)
+
+
+def test_start_fails_when_docker_is_unreachable(monkeypatch, capsys):
+    client = docker.DockerClient(base_url="unix:///nonexistent.sock", version="1.41")
+    monkeypatch.setattr(common, "_docker_client", client)
+
+    with pytest.raises(StartError):
+        Manager().start("test")
+
+    assert "Error connecting to the Docker daemon" in capsys.readouterr().err
+
+
+def test_start_wraps_docker_errors(monkeypatch, capsys):
+    client = FakeDockerClient(docker.errors.APIError("no such network"))
+    monkeypatch.setattr(common, "_docker_client", client)
+
+    with pytest.raises(StartError):
+        Manager().start("test")
+
+    assert "no such network" in capsys.readouterr().err
@@ -0,0 +1,99 @@
+import json
+import socketserver
+import threading
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import docker
+import pytest
+
+from click.testing import CliRunner
+
+import higlass_manage.bench
+
+from higlass_manage.bench import bench
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """
+    Serve tileset info and empty tiles for any uid
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        uids = urllib.parse.parse_qs(url.query)["d"]
+
+        if url.path.endswith("/tileset_info/"):
+            body = {
+                uid: {
+                    "min_pos": [0],
+                    "max_pos": [2 ** 20],
+                    "max_width": 2 ** 20,
+                    "max_zoom": 4,
+                }
+                for uid in uids
+            }
+        else:
+            body = {uid: {"dense": ""} for uid in uids}
+
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("localhost", 0), TileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield "http://localhost:{}/api/v1".format(server.server_address[1])
+
+    server.shutdown()
+    server.server_close()
+
+
+def run_bench(*args):
+    result = CliRunner().invoke(bench, list(args))
+
+    assert result.exit_code == 0, result.output
+    return [line.split("\t") for line in result.stdout.splitlines()]
+
+
+def test_bench_against_a_server(server_url):
+    rows = run_bench("--url", server_url, "-u", "a", "-u", "b", "-n", "50")
+
+    assert rows[0][:4] == ["cache", "requests", "tiles", "errors"]
+    assert [row[:2] for row in rows[1:]] == [["first", "50"], ["warm", "50"]]
+    # no request failed
+    assert [row[3] for row in rows[1:]] == ["0", "0"]
+
+
+def test_bench_without_a_cache_to_flush(server_url, monkeypatch):
+    def no_docker():
+        raise docker.errors.DockerException("docker isn't running")
+
+    monkeypatch.setattr(higlass_manage.bench, "get_docker_client", no_docker)
+
+    rows = run_bench("--url", server_url, "-u", "a", "-n", "10", "--flush-cache")
+
+    # without flushing the cache the first pass can't be called cold
+    assert [row[0] for row in rows[1:]] == ["first", "warm"]
+
+
+def test_bench_unknown_tileset(server_url, monkeypatch):
+    monkeypatch.setattr(
+        higlass_manage.bench, "get_tileset_info", lambda session, url, uids: {}
+    )
+
+    result = CliRunner().invoke(bench, ["--url", server_url, "-u", "a"])
+
+    assert "Unknown tilesets: a" in result.output
@@ -0,0 +1,51 @@
+import hashlib
+import os
+
+import higlass_manage.cache as cache
+import higlass_manage.fingerprint as fingerprint
+
+from higlass_manage.cache import FileCache
+from higlass_manage.fingerprint import FINGERPRINT_DB
+
+
+def test_key_only_hashes_changed_files(tmp_path, monkeypatch):
+    path = tmp_path / "a.bed"
+    path.write_text("chr1\t0\t100\n")
+    calls = []
+
+    def counting_md5(path):
+        calls.append(path)
+        with open(path, "rb") as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+    monkeypatch.setattr(fingerprint, "md5", counting_md5)
+    file_cache = FileCache(str(tmp_path / "cache"), 2 ** 20)
+
+    key = file_cache.key(str(path), {"a": 1})
+    assert file_cache.key(str(path), {"a": 1}) == key
+    assert file_cache.key(str(path), {"a": 2}) != key
+    assert len(calls) == 1
+
+    path.write_text("chr1\t0\t200\n")
+    assert file_cache.key(str(path), {"a": 1}) != key
+    assert len(calls) == 2
+
+
+def test_evict_skips_vanished_entries(tmp_path, monkeypatch):
+    file_cache = FileCache(str(tmp_path / "cache"), 1000)
+    output = tmp_path / "output"
+
+    for (i, key) in enumerate(["a", "b", "c"]):
+        output.write_bytes(b"x" * 100)
+        file_cache.put(key, str(output))
+        os.utime(os.path.join(file_cache.cache_dir, key), (i, i))
+
+    file_cache.key(str(output), {})
+
+    # another process evicts an entry while this one lists the cache
+    listdir = os.listdir
+    monkeypatch.setattr(cache.os, "listdir", lambda path: listdir(path) + ["vanished"])
+    file_cache.max_size = 100
+    file_cache.evict()
+
+    assert sorted(listdir(file_cache.cache_dir)) == ["c", FINGERPRINT_DB]
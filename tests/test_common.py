@@ -0,0 +1,136 @@
+import pytest
+
+import higlass_manage.common as common
+
+from higlass_manage.common import forget_instance_info
+from higlass_manage.common import get_instance_info
+from higlass_manage.common import iter_tilesets
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """
+    Serve a paginated list of tilesets, recording the requests
+    """
+
+    def __init__(self, tilesets, paginate=True):
+        self.tilesets = tilesets
+        self.paginate = paginate
+        self.requests = []
+
+    def get(self, url, params, timeout):
+        self.requests.append((url, dict(params)))
+
+        if not self.paginate:
+            return FakeResponse({"count": len(self.tilesets), "results": self.tilesets})
+
+        (offset, limit) = (params["offset"], params["limit"])
+
+        # the server doesn't know the address it is reached at
+        next_url = None
+        if offset + limit < len(self.tilesets):
+            next_url = "http://internal:8000/api/v1/tilesets/?offset={}".format(
+                offset + limit
+            )
+
+        return FakeResponse(
+            {
+                "count": len(self.tilesets),
+                "next": next_url,
+                "results": self.tilesets[offset : offset + limit],
+            }
+        )
+
+
+def tilesets(n):
+    return [{"uuid": "uid-{}".format(i), "name": "t{}".format(i)} for i in range(n)]
+
+
+def test_iter_tilesets_pages_using_offsets():
+    session = FakeSession(tilesets(25))
+
+    uuids = [t["uuid"] for t in iter_tilesets(8989, session=session, page_size=10)]
+
+    assert uuids == ["uid-{}".format(i) for i in range(25)]
+    assert [url for (url, _) in session.requests] == [
+        "http://localhost:8989/api/v1/tilesets/"
+    ] * 3
+    assert [params["offset"] for (_, params) in session.requests] == [0, 10, 20]
+
+
+def test_iter_tilesets_without_pagination():
+    session = FakeSession(tilesets(25), paginate=False)
+
+    assert len(list(iter_tilesets(8989, session=session, page_size=10))) == 25
+    assert len(session.requests) == 1
+
+
+def test_iter_tilesets_filters_results():
+    session = FakeSession(tilesets(25))
+
+    names = [t["name"] for t in iter_tilesets(8989, session=session, name="t2")]
+
+    assert names == ["t2"] + ["t{}".format(i) for i in range(20, 25)]
+
+
+class FakeDockerAPI:
+    """
+    Inspect containers which are replaced with another port on every
+    inspection
+    """
+
+    def __init__(self):
+        self.inspections = 0
+
+    def inspect_container(self, name):
+        self.inspections += 1
+        return {
+            "State": {"Running": True},
+            "HostConfig": {
+                "PortBindings": {"80/tcp": [{"HostPort": str(8000 + self.inspections)}]}
+            },
+        }
+
+
+class FakeDockerClient:
+    def __init__(self):
+        self.api = FakeDockerAPI()
+
+
+@pytest.fixture
+def docker_client(monkeypatch):
+    client = FakeDockerClient()
+    monkeypatch.setattr(common, "_docker_client", client)
+    monkeypatch.setattr(common, "_instance_infos", {})
+
+    return client
+
+
+def test_instance_info_is_reused_for_a_while(docker_client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(common.time, "time", lambda: now[0])
+
+    assert get_instance_info("hg").port == "8001"
+    assert get_instance_info("hg").port == "8001"
+
+    now[0] += common.INSTANCE_INFO_TTL
+    assert get_instance_info("hg").port == "8002"
+    assert docker_client.api.inspections == 2
+
+
+def test_instance_info_can_be_refreshed(docker_client):
+    assert get_instance_info("hg").port == "8001"
+    assert get_instance_info("hg", max_age=0).port == "8002"
+
+    forget_instance_info("hg")
+    assert get_instance_info("hg").port == "8003"
@@ -0,0 +1,131 @@
+import hashlib
+import os
+
+import pytest
+
+import higlass_manage.fingerprint as fingerprint
+
+from higlass_manage.fingerprint import FingerprintIndex, sampled_digest
+
+
+@pytest.fixture
+def index(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+
+    with FingerprintIndex(str(data_dir)) as index:
+        yield index
+
+
+def write_file(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_sampled_digest_of_small_files(tmp_path):
+    a = write_file(tmp_path / "a", b"x" * 1000)
+    b = write_file(tmp_path / "b", b"x" * 999 + b"y")
+
+    assert sampled_digest(a) == sampled_digest(a)
+    assert sampled_digest(a) != sampled_digest(b)
+
+
+def test_sampled_digest_only_reads_samples(tmp_path):
+    data = bytearray(os.urandom(10000))
+    a = write_file(tmp_path / "a", bytes(data))
+
+    # a change between the sampled blocks isn't noticed...
+    data[150] ^= 0xFF
+    b = write_file(tmp_path / "b", bytes(data))
+    assert sampled_digest(a, 4, 100) == sampled_digest(b, 4, 100)
+
+    # ...but changes in the head, the tail or the size are
+    data[0] ^= 0xFF
+    c = write_file(tmp_path / "c", bytes(data))
+    d = write_file(tmp_path / "d", bytes(data) + b"x")
+    assert sampled_digest(a, 4, 100) != sampled_digest(c, 4, 100)
+    assert sampled_digest(c, 4, 100) != sampled_digest(d, 4, 100)
+
+
+def test_sampled_digest_with_one_sample(tmp_path):
+    data = bytearray(os.urandom(1000))
+    a = write_file(tmp_path / "a", bytes(data))
+
+    # only the head is sampled
+    data[500] ^= 0xFF
+    b = write_file(tmp_path / "b", bytes(data))
+    assert sampled_digest(a, 1, 100) == sampled_digest(b, 1, 100)
+
+    data[0] ^= 0xFF
+    c = write_file(tmp_path / "c", bytes(data))
+    assert sampled_digest(a, 1, 100) != sampled_digest(c, 1, 100)
+
+    with pytest.raises(ValueError):
+        sampled_digest(a, 0, 100)
+
+
+def test_md5_is_cached_until_the_file_changes(tmp_path, index, monkeypatch):
+    path = write_file(tmp_path / "a", b"contents")
+    calls = []
+
+    def counting_md5(path):
+        calls.append(path)
+        with open(path, "rb") as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+    monkeypatch.setattr(fingerprint, "md5", counting_md5)
+
+    assert index.md5(path) == hashlib.md5(b"contents").hexdigest()
+    assert index.md5(path) == hashlib.md5(b"contents").hexdigest()
+    assert len(calls) == 1
+
+    write_file(tmp_path / "a", b"changed contents")
+    assert index.md5(path) == hashlib.md5(b"changed contents").hexdigest()
+    assert len(calls) == 2
+
+
+def test_same_contents(tmp_path, index):
+    tileset = write_file(tmp_path / "tileset", b"x" * 1000)
+    same = write_file(tmp_path / "same", b"x" * 1000)
+    other = write_file(tmp_path / "other", b"x" * 999 + b"y")
+    shorter = write_file(tmp_path / "shorter", b"x" * 999)
+
+    assert index.same_contents(tileset, same, "uid")
+    assert not index.same_contents(tileset, other, "uid")
+    assert not index.same_contents(tileset, shorter, "uid")
+
+    # the tileset's checksum was recorded
+    assert index.tileset_md5("uid") == index.md5(tileset)
+
+
+def test_same_contents_uses_recorded_checksums(tmp_path, index):
+    local = write_file(tmp_path / "local", b"contents")
+    index.add_tileset("uid", index.md5(local))
+
+    # the tileset file isn't reachable from the host
+    assert index.same_contents(str(tmp_path / "missing"), local, "uid")
+    assert not index.same_contents(str(tmp_path / "missing"), local, "other-uid")
+
+
+def test_same_contents_matches_the_source_of_derived_tilesets(tmp_path, index):
+    tileset = write_file(tmp_path / "a.mcool", b"derived")
+    source = write_file(tmp_path / "a.cool", b"source")
+    other = write_file(tmp_path / "b.cool", b"other")
+
+    index.add_tileset("uid", index.md5(tileset))
+    index.add_source("uid", index.md5(source))
+
+    assert index.same_contents(tileset, source, "uid")
+    assert not index.same_contents(tileset, other, "uid")
+
+
+def test_index_persists(tmp_path):
+    data_dir = str(tmp_path)
+
+    with FingerprintIndex(data_dir) as index:
+        index.add_tileset("uid", "abc")
+        index.add_source("uid", "def")
+
+    with FingerprintIndex(data_dir) as index:
+        assert index.tileset_md5("uid") == "abc"
+        assert index.source_md5("uid") == "def"
@@ -0,0 +1,171 @@
+import os.path as op
+
+import pytest
+
+import higlass_manage.ingest as ingest
+
+from higlass_manage.fingerprint import FingerprintIndex
+
+
+@pytest.fixture
+def instance_dirs(tmp_path, monkeypatch):
+    """
+    Replace the instance's directories and the import into its container
+    """
+    data_dir = tmp_path / "data"
+    temp_dir = data_dir / "tmp"
+    temp_dir.mkdir(parents=True)
+
+    monkeypatch.setattr(ingest, "get_data_dir", lambda hg_name: str(data_dir))
+    monkeypatch.setattr(ingest, "get_temp_dir", lambda hg_name: str(temp_dir))
+    monkeypatch.setattr(
+        ingest, "import_file", lambda hg_name, to_import, *args: "uid-1"
+    )
+
+    return (str(data_dir), str(temp_dir))
+
+
+def make_cooler(filename, seed=0):
+    import cooler
+    import numpy as np
+    import pandas as pd
+
+    binsize = 1000
+    chromsizes = pd.Series({"chr1": 300000, "chr2": 200000})
+    bins = cooler.binnify(chromsizes, binsize)
+    n_bins = len(bins)
+
+    rng = np.random.RandomState(seed)
+    bin1 = rng.randint(0, n_bins, 2000)
+    bin2 = rng.randint(0, n_bins, 2000)
+    pixels = pd.DataFrame(
+        {"bin1_id": np.minimum(bin1, bin2), "bin2_id": np.maximum(bin1, bin2)}
+    )
+    pixels = pixels.groupby(["bin1_id", "bin2_id"]).size().reset_index(name="count")
+
+    cooler.create_cooler(str(filename), bins, pixels)
+    return str(filename)
+
+
+def test_zoomified_cooler_is_indexed_by_its_source(tmp_path, instance_dirs):
+    (data_dir, temp_dir) = instance_dirs
+    filename = make_cooler(tmp_path / "a.cool")
+    other = make_cooler(tmp_path / "b.cool", seed=1)
+
+    uid = ingest._ingest(filename, "test", "cooler", "matrix", aggregation_cache=False)
+    assert uid == "uid-1"
+
+    mcool = op.join(temp_dir, "a.mcool")
+    assert op.exists(mcool)
+
+    with FingerprintIndex(data_dir) as index:
+        assert index.source_md5(uid) == index.md5(filename)
+        assert index.same_contents(mcool, filename, uid)
+        assert not index.same_contents(mcool, other, uid)
+
+
+def test_files_ingested_as_is_have_no_source(tmp_path, instance_dirs):
+    (data_dir, _) = instance_dirs
+    filename = make_cooler(tmp_path / "a.cool")
+
+    uid = ingest._ingest(filename, "test", "cooler", "matrix", zoomify=False)
+
+    with FingerprintIndex(data_dir) as index:
+        assert index.source_md5(uid) is None
+        assert index.tileset_md5(uid) == index.md5(filename)
+
+
+def test_converted_bedgraph_is_indexed_by_its_source(tmp_path, instance_dirs):
+    (data_dir, temp_dir) = instance_dirs
+    chromsizes = tmp_path / "chromsizes.tsv"
+    chromsizes.write_text("chr1\t100000\nchr2\t50000\n")
+
+    filename = tmp_path / "a.bedGraph"
+    filename.write_text(
+        "".join(
+            "chr1\t{}\t{}\t{}\n".format(i * 100, (i + 1) * 100, i % 7)
+            for i in range(500)
+        )
+    )
+
+    uid = ingest._ingest(
+        str(filename),
+        "test",
+        None,
+        None,
+        chromsizes_filename=str(chromsizes),
+        aggregation_cache=False,
+    )
+    hitile = op.join(temp_dir, "a.hitile")
+    assert op.exists(hitile)
+
+    with FingerprintIndex(data_dir) as index:
+        assert index.source_md5(uid) == index.md5(str(filename))
+        assert index.same_contents(hitile, str(filename), uid)
+
+
+def test_ingest_many_only_reports_aggregated_files(
+    tmp_path, instance_dirs, monkeypatch, capsys
+):
+    cool = make_cooler(tmp_path / "a.cool")
+    bigwig = tmp_path / "b.bw"
+    bigwig.write_bytes(b"not really a bigwig")
+
+    monkeypatch.setattr(
+        ingest, "stage_import", lambda hg_name, path: (op.basename(path), False)
+    )
+    monkeypatch.setattr(
+        ingest,
+        "register_tilesets",
+        lambda hg_name, entries: (
+            (i, "uid-{}".format(i), None) for i in range(len(entries))
+        ),
+    )
+
+    results = ingest._ingest_many([cool, str(bigwig)], "test", aggregation_cache=False)
+
+    assert sorted(uid for (_, uid) in results) == ["uid-0", "uid-1"]
+
+    out = capsys.readouterr().out
+    assert "Aggregated {}".format(cool) in out
+    assert "Aggregated {}".format(bigwig) not in out
+    assert out.count("Registered 2 tilesets") == 1
+
+
+def test_zoomifying_doesnt_change_cached_outputs(tmp_path, instance_dirs, monkeypatch):
+    (_, temp_dir) = instance_dirs
+    monkeypatch.setenv("HIGLASS_MANAGE_HOME", str(tmp_path / "state"))
+
+    (tmp_path / "1").mkdir()
+    (tmp_path / "2").mkdir()
+    first = make_cooler(tmp_path / "1" / "a.cool")
+    second = make_cooler(tmp_path / "2" / "a.cool", seed=1)
+    mcool = op.join(temp_dir, "a.mcool")
+
+    ingest._ingest(first, "test", "cooler", "matrix")
+    first_contents = open(mcool, "rb").read()
+
+    # a different cooler with the same name is zoomified to the same path
+    ingest._ingest(second, "test", "cooler", "matrix")
+    assert open(mcool, "rb").read() != first_contents
+
+    ingest._ingest(first, "test", "cooler", "matrix")
+    assert open(mcool, "rb").read() == first_contents
+
+
+def test_expand_filenames(tmp_path):
+    for name in ["a.bw", "b.bw", "c[1].bw", "d.bed"]:
+        (tmp_path / name).write_text("x")
+
+    assert ingest.expand_filenames([str(tmp_path / "*.bw")]) == [
+        str(tmp_path / "a.bw"),
+        str(tmp_path / "b.bw"),
+        str(tmp_path / "c[1].bw"),
+    ]
+    assert ingest.expand_filenames([str(tmp_path / "c[1].bw")]) == [
+        str(tmp_path / "c[1].bw")
+    ]
+    assert ingest.expand_filenames([str(tmp_path / "missing.bw")]) == [
+        str(tmp_path / "missing.bw")
+    ]
+    assert len(ingest.expand_filenames([str(tmp_path)])) == 4
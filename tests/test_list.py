@@ -0,0 +1,81 @@
+import docker
+import pytest
+
+import higlass_manage.common as common
+
+from higlass_manage.list import describe_container, find_instances
+
+
+def container_summary(container_id, name, labels=None, port=None, data_dir=None):
+    return {
+        "Id": container_id,
+        "Names": ["/" + name],
+        "Labels": labels or {},
+        "Ports": [] if port is None else [{"PrivatePort": 80, "PublicPort": port}],
+        "Mounts": (
+            [] if data_dir is None else [{"Source": data_dir, "Destination": "/data"}]
+        ),
+        "Status": "Up 3 hours (healthy)",
+    }
+
+
+LABELLED = container_summary(
+    "1",
+    "higlass-manage-container-new",
+    labels={
+        "higlass-manage.name": "new",
+        "higlass-manage.role": "higlass",
+        "higlass-manage.port": "8989",
+        "higlass-manage.data-dir": "/data/new",
+    },
+)
+UNLABELLED = [
+    container_summary("2", "higlass-manage-container-old", port=8123, data_dir="/hg"),
+    container_summary("3", "higlass-manage-redis-old"),
+    # containers which only contain the prefix in their names
+    container_summary("4", "not-higlass-manage-container"),
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    A docker client listing a labelled and some unlabelled containers
+    """
+    client = docker.DockerClient(base_url="unix:///nonexistent.sock", version="1.41")
+
+    def containers(filters):
+        if "label" in filters:
+            return [LABELLED]
+
+        # the name filter matches substrings of the names
+        return [LABELLED] + UNLABELLED
+
+    monkeypatch.setattr(client.api, "containers", containers)
+    monkeypatch.setattr(common, "_docker_client", client)
+
+    return client
+
+
+def test_find_instances_includes_unlabelled_containers(client):
+    instances = [(role, name, c.id) for (role, name, c) in find_instances()]
+
+    assert instances == [
+        ("higlass", "new", "1"),
+        ("higlass", "old", "2"),
+        ("redis", "old", "3"),
+    ]
+
+
+def test_describe_unlabelled_container(client):
+    descriptions = {
+        c.id: describe_container(role, name, c.attrs)
+        for (role, name, c) in find_instances()
+    }
+
+    assert descriptions["1"]["port"] == "8989"
+    assert descriptions["1"]["data_dir"] == "/data/new"
+    assert descriptions["2"]["port"] == "8123"
+    assert descriptions["2"]["data_dir"] == "/hg"
+    assert descriptions["2"]["health"] == "healthy"
+    assert descriptions["3"]["port"] is None
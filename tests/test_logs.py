@@ -0,0 +1,247 @@
+import datetime
+import gzip
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from higlass_manage.logs import (
+    LogFilter,
+    follow,
+    get_log_segments,
+    iter_entries,
+    iter_entries_reversed,
+    iter_matching_entries,
+    parse_timestamp,
+    read_lines_reversed,
+    seek_to_time,
+    tail_entries,
+)
+
+START = datetime.datetime(2026, 10, 17, 8, 0, 0)
+
+
+def log_line(minute, level="INFO", message="message"):
+    timestamp = START + datetime.timedelta(minutes=minute)
+    return "{} {} {} {}\n".format(
+        timestamp.strftime("%Y-%m-%d %H:%M:%S"), level, message, minute
+    )
+
+
+def write_log(path, minutes, **kwargs):
+    data = "".join(log_line(minute, **kwargs) for minute in minutes)
+
+    if str(path).endswith(".gz"):
+        with gzip.open(str(path), "wt") as f:
+            f.write(data)
+    else:
+        path.write_text(data)
+
+
+def set_mtime(path, minute):
+    timestamp = (START + datetime.timedelta(minutes=minute)).timestamp()
+    os.utime(str(path), (timestamp, timestamp))
+
+
+@pytest.fixture
+def segments(tmp_path):
+    """
+    A log rotated twice: minutes 0-99 in hgs.log.2.gz, 100-199 in
+    hgs.log.1 and 200-299 in hgs.log
+    """
+    log_path = tmp_path / "hgs.log"
+
+    write_log(tmp_path / "hgs.log.2.gz", range(0, 100))
+    set_mtime(tmp_path / "hgs.log.2.gz", 99)
+    write_log(tmp_path / "hgs.log.1", range(100, 200))
+    set_mtime(tmp_path / "hgs.log.1", 199)
+    write_log(log_path, range(200, 300))
+    set_mtime(log_path, 299)
+
+    return get_log_segments(str(log_path))
+
+
+def minutes(entries):
+    return [int(entry[0].split()[-1]) for entry in entries]
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("2026-10-17 08:00:00,123 ERROR x") == START
+    assert parse_timestamp("[17/Oct/2026 08:00:00] ERROR x") == START
+    assert (
+        parse_timestamp(
+            "[pid: 12|app: 0|req: 5/9] 172.17.0.1 () {40 vars in 700 bytes} "
+            "[Sat Oct 17 08:00:00 2026] GET /api/v1/tiles/"
+        )
+        == START
+    )
+    assert parse_timestamp("Traceback (most recent call last):") is None
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 2 ** 16])
+def test_read_lines_reversed(block_size):
+    lines = ["first line\n", "\n", "ünïcode\n", "last line without newline"]
+    f = io.BytesIO("".join(lines).encode("utf8"))
+
+    assert list(read_lines_reversed(f, block_size)) == [
+        "last line without newline\n",
+        "ünïcode\n",
+        "\n",
+        "first line\n",
+    ]
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 64])
+def test_read_lines_reversed_keeps_empty_lines(block_size):
+    for data in ["", "\n", "a\n\n", "\na\n", "a\n\n\nb\n"]:
+        f = io.BytesIO(data.encode("utf8"))
+
+        assert list(read_lines_reversed(f, block_size)) == [
+            line + "\n" for line in reversed(data.splitlines())
+        ]
+
+
+def test_iter_entries_groups_continuation_lines():
+    lines = [
+        log_line(0),
+        log_line(1, "ERROR"),
+        "Traceback (most recent call last):\n",
+        "ValueError\n",
+        log_line(2),
+    ]
+
+    assert [len(entry) for entry in iter_entries(lines)] == [1, 3, 1]
+    assert [len(entry) for entry in iter_entries_reversed(reversed(lines))] == [
+        1,
+        3,
+        1,
+    ]
+    assert list(iter_entries_reversed(reversed(lines)))[1] == lines[1:4]
+
+
+@pytest.mark.parametrize("block_size", [16, 256, 2 ** 16])
+def test_seek_to_time(tmp_path, block_size):
+    path = tmp_path / "hgs.log"
+    write_log(path, range(1000))
+
+    with open(str(path), "rb") as f:
+        seek_to_time(f, START + datetime.timedelta(minutes=600), block_size)
+        first = int(f.readline().decode("utf8").split()[-1])
+
+    # the search stops within a block (and a partial line) of the first
+    # matching line
+    line_size = len(log_line(600))
+    assert first <= 600
+    assert (600 - first) * line_size <= block_size + line_size
+
+
+def test_log_filter():
+    entry = [log_line(5, "ERROR", "boom"), "Traceback (most recent call last):\n"]
+
+    assert not LogFilter().active
+    assert LogFilter().matches(entry)
+    assert LogFilter(since=START + datetime.timedelta(minutes=5)).matches(entry)
+    assert not LogFilter(since=START + datetime.timedelta(minutes=6)).matches(entry)
+    assert LogFilter(level="WARNING").matches(entry)
+    assert not LogFilter(level="CRITICAL").matches(entry)
+    assert LogFilter(pattern="Trace").matches(entry)
+    assert not LogFilter(pattern="missing").matches(entry)
+    assert not LogFilter(since=START).matches(["Traceback\n"])
+
+
+def test_get_log_segments_orders_rotated_segments(segments, tmp_path):
+    assert segments == [
+        str(tmp_path / "hgs.log.2.gz"),
+        str(tmp_path / "hgs.log.1"),
+        str(tmp_path / "hgs.log"),
+    ]
+
+
+def test_tail_entries_reads_older_segments_when_needed(segments):
+    assert minutes(tail_entries(segments, 3, LogFilter())) == [297, 298, 299]
+    assert minutes(tail_entries(segments, 150, LogFilter())) == list(range(150, 300))
+    assert minutes(tail_entries(segments, 250, LogFilter())) == list(range(50, 300))
+
+
+def test_tail_entries_with_filter(segments):
+    log_filter = LogFilter(pattern=r" (5|15|250)$")
+
+    assert minutes(tail_entries(segments, 10, log_filter)) == [5, 15, 250]
+
+
+def test_iter_matching_entries_since(segments):
+    log_filter = LogFilter(since=START + datetime.timedelta(minutes=150))
+
+    assert minutes(iter_matching_entries(segments, log_filter)) == list(range(150, 300))
+
+
+def test_iter_matching_entries_reads_compressed_segments(segments):
+    assert minutes(iter_matching_entries(segments, LogFilter())) == list(range(300))
+
+
+class Output:
+    """
+    Collect the text written by a follow thread
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.text = ""
+
+    def write(self, text):
+        with self.lock:
+            self.text += text
+
+    def flush(self):
+        pass
+
+    def wait_for(self, text, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if text in self.text:
+                    return self.text
+            time.sleep(0.01)
+
+        return self.text
+
+
+def start_follow(log_path, log_filter):
+    out = Output()
+    threading.Thread(
+        target=follow, args=(str(log_path), log_filter, 0.01, out), daemon=True
+    ).start()
+
+    # let follow find the current end of the log
+    time.sleep(0.1)
+    return out
+
+
+def test_follow_without_filter_prints_every_line(tmp_path):
+    log_path = tmp_path / "hgs.log"
+    write_log(log_path, range(3))
+    out = start_follow(log_path, LogFilter())
+
+    lines = "*** Starting uWSGI 2.0.18 ***\nspawned uWSGI worker 1 (pid: 12)\n"
+    with open(str(log_path), "a") as f:
+        f.write(lines)
+
+    assert out.wait_for("pid: 12") == lines
+
+
+def test_follow_with_filter_keeps_continuation_lines(tmp_path):
+    log_path = tmp_path / "hgs.log"
+    log_path.write_text("")
+    out = start_follow(log_path, LogFilter(level="ERROR"))
+
+    with open(str(log_path), "a") as f:
+        f.write(log_line(0, "INFO") + "info continuation\n")
+        f.write(log_line(1, "ERROR") + "Traceback (most recent call last):\n")
+        f.write(log_line(2, "INFO", "done"))
+
+    out.wait_for("Traceback")
+    time.sleep(0.1)
+
+    assert out.text == log_line(1, "ERROR") + "Traceback (most recent call last):\n"
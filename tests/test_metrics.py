@@ -0,0 +1,116 @@
+import time
+
+import higlass_manage.metrics as metrics
+
+from higlass_manage.metrics import LogLatencies, format_prometheus, quantile
+
+
+def test_quantile():
+    assert quantile([], 0.5) == 0.0
+    assert quantile([1, 2, 3, 4], 0.5) == 3
+    assert quantile([1, 2, 3, 4], 0.99) == 4
+
+
+def test_log_latencies_are_cumulative(tmp_path, monkeypatch):
+    log_path = tmp_path / "hg.log"
+    monkeypatch.setattr(
+        "higlass_manage.metrics.get_log_path", lambda hg_name: str(log_path)
+    )
+    line = (
+        "[pid: 12|app: 0|req: 5/9] 172.17.0.1 () {{40 vars in 700 bytes}} "
+        "GET /api/v1/tiles/?d=abc.0.0.0 => generated 1208 bytes in {} msecs "
+        "(HTTP/1.1 200)\n"
+    )
+    latencies = LogLatencies()
+
+    log_path.write_text(line.format(100) + line.format(300))
+    [tiles] = latencies.collect("hg").values()
+    assert (tiles["count"], tiles["mean"]) == (2, 0.2)
+
+    with open(str(log_path), "a") as f:
+        f.write(line.format(500))
+    [tiles] = latencies.collect("hg").values()
+    assert (tiles["count"], tiles["mean"]) == (1, 0.5)
+    assert tiles["total_count"] == 3
+    assert abs(tiles["total_seconds"] - 0.9) < 1e-9
+
+
+def test_format_prometheus_groups_families():
+    requests = {
+        "/api/v1/tiles/": {
+            "count": 2,
+            "mean": 0.2,
+            "quantiles": {"0.5": 0.3},
+            "total_count": 5,
+            "total_seconds": 1.5,
+        }
+    }
+    metrics = {
+        "a": {
+            "higlass": {"cpu_percent": 1.5, "memory_usage_bytes": 10},
+            "redis": {"cpu_percent": 0.5},
+            "redis_cache": {"keyspace_hits": 3.0},
+            "requests": requests,
+        },
+        "b": {"higlass": {"cpu_percent": 2.5}},
+    }
+
+    lines = format_prometheus(metrics).splitlines()
+
+    # every family is declared once, followed by all of its samples
+    types = [line for line in lines if line.startswith("# TYPE")]
+    assert len(types) == len(set(types)) == 4
+    assert "# TYPE higlass_container_cpu_percent gauge" in types
+    assert "# TYPE higlass_redis_keyspace_hits counter" in types
+    assert "# TYPE higlass_request_latency_seconds summary" in types
+
+    start = lines.index("# TYPE higlass_container_cpu_percent gauge")
+    assert lines[start - 1].startswith("# HELP higlass_container_cpu_percent ")
+    assert lines[start + 1 : start + 4] == [
+        'higlass_container_cpu_percent{instance="a",role="higlass"} 1.5',
+        'higlass_container_cpu_percent{instance="a",role="redis"} 0.5',
+        'higlass_container_cpu_percent{instance="b",role="higlass"} 2.5',
+    ]
+
+    assert (
+        'higlass_request_latency_seconds_count{endpoint="/api/v1/tiles/",instance="a"} 5'
+        in lines
+    )
+    assert (
+        'higlass_request_latency_seconds_sum{endpoint="/api/v1/tiles/",instance="a"} 1.5'
+        in lines
+    )
+
+
+class SlowContainer:
+    """
+    A container whose statistics take a while to sample, like docker's
+    """
+
+    def stats(self, stream=True):
+        time.sleep(0.5)
+        return {"memory_stats": {"usage": 10}}
+
+    def exec_run(self, command):
+        return (0, b"keyspace_hits:3\r\nkeyspace_misses:1\r\n")
+
+
+def test_containers_are_sampled_at_the_same_time(monkeypatch):
+    instances = [
+        ("higlass", "a", SlowContainer()),
+        ("redis", "a", SlowContainer()),
+        ("higlass", "b", SlowContainer()),
+        ("higlass", "c", SlowContainer()),
+    ]
+    monkeypatch.setattr(metrics, "find_instances", lambda: iter(instances))
+    monkeypatch.setattr(LogLatencies, "collect", lambda self, hg_name: {})
+
+    t1 = time.time()
+    collected = metrics.collect_metrics(LogLatencies())
+    assert time.time() - t1 < 1.5
+
+    assert sorted(collected) == ["a", "b", "c"]
+    assert collected["a"]["higlass"]["memory_usage_bytes"] == 10
+    assert collected["a"]["redis"]["memory_usage_bytes"] == 10
+    assert collected["a"]["redis_cache"]["hit_ratio"] == 0.75
+    assert "redis" not in collected["b"]
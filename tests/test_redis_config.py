@@ -0,0 +1,122 @@
+import pytest
+
+import higlass_manage.redis_config as redis_config
+
+from higlass_manage.redis_config import (
+    MEMORY_FRACTION_LABEL,
+    auto_maxmemory,
+    parse_memory,
+    rebalance_maxmemory,
+    redis_settings,
+    write_redis_conf,
+)
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("1000000", 1000000),
+        (42, 42),
+        ("8gb", 8 * 1024 ** 3),
+        ("500mb", 500 * 1024 ** 2),
+        ("2k", 2000),
+        (" 3 MB ", 3 * 1024 ** 2),
+    ],
+)
+def test_parse_memory(value, expected):
+    assert parse_memory(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "lots", "8tb", "-1gb", "1.5gb"])
+def test_parse_memory_rejects_invalid_sizes(value):
+    with pytest.raises(ValueError):
+        parse_memory(value)
+
+
+def test_auto_maxmemory_splits_memory_between_instances(monkeypatch):
+    monkeypatch.setattr(redis_config, "get_memory_limit", lambda: 8 * 1024 ** 3)
+
+    assert auto_maxmemory(1) == 4 * 1024 ** 3
+    assert auto_maxmemory(4) == 1024 ** 3
+    assert auto_maxmemory(4, fraction=1) == 2 * 1024 ** 3
+    assert auto_maxmemory(0) == auto_maxmemory(1)
+
+
+def test_redis_settings():
+    assert redis_settings(1024) == [
+        ("maxmemory", "1024"),
+        ("maxmemory-policy", "allkeys-lru"),
+    ]
+
+    settings = dict(redis_settings(1024, "allkeys-lfu", 10, 1, persistence=False))
+    assert settings["lfu-log-factor"] == "10"
+    assert settings["lfu-decay-time"] == "1"
+    assert settings["save"] == '""'
+    assert settings["appendonly"] == "no"
+
+
+def test_write_redis_conf_replaces_generated_directives(tmp_path):
+    template = tmp_path / "redis.conf"
+    template.write_text("# comment\n\nport 6379\nmaxmemory 2gb\nSAVE 900 1\n")
+    output = tmp_path / "out.conf"
+
+    write_redis_conf(str(template), str(output), redis_settings(1024))
+
+    assert output.read_text().splitlines() == [
+        "# comment",
+        "",
+        "port 6379",
+        "maxmemory 1024",
+        "maxmemory-policy allkeys-lru",
+    ]
+
+
+class FakeContainer:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.commands = []
+
+    def exec_run(self, command):
+        self.commands.append(command)
+        return (0, b"OK\n")
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self.all_containers = containers
+
+    def list(self, filters):
+        return [c for c in self.all_containers if filters["label"] in c.labels]
+
+
+class FakeAPI:
+    def __init__(self, containers):
+        self.all_containers = containers
+
+    def containers(self, filters, quiet):
+        return [{"Id": c.name} for c in self.all_containers]
+
+
+class FakeClient:
+    """
+    A docker client with a fixed set of running Redis containers
+    """
+
+    def __init__(self, containers):
+        self.containers = FakeContainers(containers)
+        self.api = FakeAPI(containers)
+
+
+def test_rebalance_maxmemory_resizes_automatic_instances(monkeypatch):
+    monkeypatch.setattr(redis_config, "get_memory_limit", lambda: 3000)
+
+    auto1 = FakeContainer("redis-a", {MEMORY_FRACTION_LABEL: "0.5"})
+    auto2 = FakeContainer("redis-b", {MEMORY_FRACTION_LABEL: "0.9"})
+    fixed = FakeContainer("redis-c", {})
+
+    resized = rebalance_maxmemory(FakeClient([auto1, auto2, fixed]))
+
+    assert resized == [("redis-a", 500), ("redis-b", 900)]
+    assert auto1.commands == ["redis-cli CONFIG SET maxmemory 500"]
+    assert fixed.commands == []
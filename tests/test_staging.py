@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import higlass_manage.staging as staging
+
+from higlass_manage.staging import copy_file
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src.bin"
+    path.write_bytes(os.urandom(100000))
+    return path
+
+
+def test_copy_file(src, tmp_path):
+    dst = tmp_path / "dst.bin"
+
+    copy_file(str(src), str(dst), chunk_size=4096)
+
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_copy_file_falls_back_when_copy_file_range_stops(src, tmp_path, monkeypatch):
+    copy_file_range = getattr(os, "copy_file_range", None)
+    calls = []
+
+    def stopping_copy_file_range(fd_in, fd_out, count):
+        calls.append(count)
+
+        # copy one chunk in the kernel and then claim to be at the end
+        if len(calls) == 1 and copy_file_range is not None:
+            return copy_file_range(fd_in, fd_out, count)
+
+        return 0
+
+    monkeypatch.setattr(
+        staging.os, "copy_file_range", stopping_copy_file_range, raising=False
+    )
+    dst = tmp_path / "dst.bin"
+
+    assert copy_file(str(src), str(dst), chunk_size=4096) == "copy"
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_copy_file_fails_on_short_copies(src, tmp_path, monkeypatch):
+    monkeypatch.delattr(staging.os, "copy_file_range", raising=False)
+    monkeypatch.setattr(staging.op, "getsize", lambda path: 200000)
+    dst = tmp_path / "dst.bin"
+
+    with pytest.raises(OSError):
+        copy_file(str(src), str(dst), chunk_size=4096)
+
+    assert not dst.exists()
@@ -0,0 +1,48 @@
+from higlass_manage.tiles import get_tileset_info
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """
+    Answer tileset_info requests, recording the uids of each request
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, params, timeout):
+        self.requests.append(params["d"])
+        return FakeResponse(
+            {
+                uid: {"error": "No such tileset"} if uid == "missing" else {"uid": uid}
+                for uid in params["d"]
+            }
+        )
+
+
+def test_get_tileset_info_requests_chunks():
+    session = FakeSession()
+    uids = ["uid-{}".format(i) for i in range(120)] + ["missing"]
+
+    tileset_info = get_tileset_info(session, "http://server/api/v1", uids)
+
+    assert [len(chunk) for chunk in session.requests] == [50, 50, 21]
+    assert sorted(tileset_info) == sorted(uids[:-1])
+    assert tileset_info["uid-70"] == {"uid": "uid-70"}
+
+
+def test_get_tileset_info_without_uids():
+    session = FakeSession()
+
+    assert get_tileset_info(session, "http://server/api/v1", []) == {}
+    assert session.requests == []
@@ -0,0 +1,61 @@
+import json
+import sqlite3
+
+from higlass_manage.update_viewconfs import rewrite_viewconfs, sqlite_uri
+
+
+def make_database(path, viewconfs):
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE tilesets_viewconf (uuid TEXT, viewconf TEXT)")
+    conn.executemany(
+        "INSERT INTO tilesets_viewconf VALUES (?, ?)",
+        [(uuid, json.dumps(viewconf)) for (uuid, viewconf) in viewconfs],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_sqlite_uri_escapes_paths(tmp_path):
+    directory = tmp_path / "data ?#dir"
+    directory.mkdir()
+    path = directory / "db.sqlite3"
+    make_database(path, [])
+
+    uri = sqlite_uri(str(path), "ro")
+    assert uri.startswith("file:///")
+    assert uri.endswith("/data%20%3F%23dir/db.sqlite3?mode=ro")
+
+    sqlite3.connect(uri, uri=True).execute("SELECT * FROM tilesets_viewconf")
+
+
+def test_rewrite_viewconfs_only_writes_changed_rows(tmp_path):
+    path = tmp_path / "db.sqlite3"
+    make_database(
+        path,
+        [
+            (
+                "a",
+                {
+                    "trackSourceServers": ["http://old.org/api/v1"],
+                    "views": [{"data": {"url": "http://old.org/file"}, "name": "é"}],
+                },
+            ),
+            ("b", {"trackSourceServers": ["http://new.org/api/v1"]}),
+        ],
+    )
+
+    conn = sqlite3.connect(sqlite_uri(str(path)), uri=True)
+    stats = rewrite_viewconfs(
+        conn,
+        [("http://old.org", "http://new.org"), ("http://new.org", "http://new.org")],
+    )
+
+    assert stats["candidates"] == 2
+    assert stats["rewritten"] == 1
+    assert stats["fields"] == {"http://old.org": 2, "http://new.org": 0}
+
+    [(viewconf,)] = conn.execute(
+        "SELECT viewconf FROM tilesets_viewconf WHERE uuid = 'a'"
+    ).fetchall()
+    assert "é" in viewconf
+    assert json.loads(viewconf)["views"][0]["data"]["url"] == "http://new.org/file"
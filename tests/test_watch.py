@@ -0,0 +1,157 @@
+import os
+import os.path as op
+import threading
+import time
+
+import pytest
+
+import higlass_manage.ingest
+import higlass_manage.watch as watch
+
+from higlass_manage.common import HiGlassNotRunningException
+from higlass_manage.common import read_state_file
+from higlass_manage.watch import FileDebouncer, is_watched_file, iter_files
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("HIGLASS_MANAGE_HOME", str(tmp_path / "state"))
+    return tmp_path / "state"
+
+
+@pytest.fixture
+def ingested(monkeypatch):
+    """
+    Replace ingestion with a stub recording the ingested files
+    """
+    calls = []
+
+    def fake_ingest(path, hg_name, filetype, datatype, **kwargs):
+        calls.append(path)
+        return "uid-{}".format(op.basename(path))
+
+    monkeypatch.setattr(higlass_manage.ingest, "_ingest", fake_ingest)
+    monkeypatch.setattr(watch, "get_temp_dir", lambda hg_name: "/tmp")
+
+    return calls
+
+
+def run_watch(directory, timeout=10, **kwargs):
+    thread = threading.Thread(
+        target=watch._watch, args=(str(directory), "test"), kwargs=kwargs, daemon=True
+    )
+    thread.start()
+    thread.join(timeout)
+
+    assert not thread.is_alive(), "watch --once didn't return"
+
+
+def test_is_watched_file():
+    assert is_watched_file("data/a.mcool")
+    assert is_watched_file("data/a.bed")
+    assert not is_watched_file("data/.a.mcool")
+    assert not is_watched_file("data/a.mcool.part")
+    assert not is_watched_file("data/notes.txt")
+
+
+def test_iter_files(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / ".hidden").mkdir()
+    for name in ["a.bw", "sub/b.bw", ".hidden/c.bw"]:
+        (tmp_path / name).write_text("x")
+
+    assert sorted(iter_files(str(tmp_path))) == [str(tmp_path / "a.bw")]
+    assert sorted(iter_files(str(tmp_path), recursive=True)) == [
+        str(tmp_path / "a.bw"),
+        str(tmp_path / "sub" / "b.bw"),
+    ]
+
+
+def test_debouncer_waits_for_files_to_settle(tmp_path):
+    path = tmp_path / "a.bw"
+    path.write_text("x")
+
+    debouncer = FileDebouncer(settle_time=10)
+    debouncer.update(str(path), now=0)
+    assert debouncer.ready(now=5) == []
+
+    # changing the file restarts the settle time
+    path.write_text("xx")
+    os.utime(str(path), ns=(1, 1))
+    debouncer.update(str(path), now=5)
+    assert debouncer.ready(now=12) == []
+
+    ready = debouncer.ready(now=15)
+    assert [p for (p, _) in ready] == [str(path)]
+    assert ready[0][1][0] == 2
+    assert debouncer.pending == {}
+
+
+def test_debouncer_holds_back_empty_and_missing_files(tmp_path):
+    empty = tmp_path / "empty.bw"
+    empty.write_text("")
+
+    debouncer = FileDebouncer(settle_time=0)
+    debouncer.update(str(empty), now=0)
+    debouncer.update(str(tmp_path / "missing.bw"), now=0)
+
+    assert debouncer.ready(now=100) == []
+    assert list(debouncer.pending) == [str(empty)]
+
+
+def test_watch_once_skips_empty_files(tmp_path, state_dir, ingested):
+    (tmp_path / "empty.bw").write_text("")
+    (tmp_path / "a.bw").write_text("x")
+
+    run_watch(tmp_path, once=True, polling=True)
+
+    assert ingested == [str(tmp_path / "a.bw")]
+    record = read_state_file(watch.watch_state_file("test"))
+    assert list(record) == [str(tmp_path / "a.bw")]
+
+
+def test_watch_once_only_ingests_changed_files(tmp_path, state_dir, ingested):
+    (tmp_path / "a.bw").write_text("x")
+    (tmp_path / "b.bw").write_text("x")
+
+    run_watch(tmp_path, once=True, polling=True)
+    assert sorted(ingested) == [str(tmp_path / "a.bw"), str(tmp_path / "b.bw")]
+
+    del ingested[:]
+    run_watch(tmp_path, once=True, polling=True)
+    assert ingested == []
+
+    (tmp_path / "b.bw").write_text("changed")
+    run_watch(tmp_path, once=True, polling=True)
+    assert ingested == [str(tmp_path / "b.bw")]
+
+
+def test_watch_starts_a_stopped_instance_once(
+    tmp_path, state_dir, ingested, monkeypatch
+):
+    import higlass_manage.start
+
+    # the instance is running when the watch starts and stops right after
+    checks = []
+    started = []
+
+    def fake_get_temp_dir(hg_name):
+        checks.append(hg_name)
+        if len(checks) > 1 and not started:
+            raise HiGlassNotRunningException()
+        return "/tmp"
+
+    def fake_start(hg_name, **kwargs):
+        time.sleep(0.1)
+        started.append(hg_name)
+
+    monkeypatch.setattr(watch, "get_temp_dir", fake_get_temp_dir)
+    monkeypatch.setattr(higlass_manage.start, "_start", fake_start)
+
+    for name in ["a.bw", "b.bw", "c.bw", "d.bw"]:
+        (tmp_path / name).write_text("x")
+
+    run_watch(tmp_path, once=True, polling=True, jobs=4)
+
+    assert started == ["test"]
+    assert len(ingested) == 4